@@ -23,7 +23,6 @@
 ## Hint: This is simply using python constructs whereby code blocks can be put in separate files, 
 ## be imported into the main program and referenced accordingly..
 
-import base64
 import pulumi
 from pulumi import Config, ResourceOptions
 from pulumi_tls import PrivateKey
@@ -32,11 +31,19 @@ import pulumi_azuread as azuread
 import pulumi_kubernetes as k8s
 from pulumi_kubernetes.helm.v3 import Chart, ChartOpts
 
+from creds_cache import get_kubeconfig
+import settings
+
 config = Config()
-k8s_version = config.get('k8sVersion') or '1.18.14'
-admin_username = config.get('adminUserName') or 'testuser'
-node_count = config.get_int('nodeCount') or 2
-node_size = config.get('nodeSize') or 'Standard_D2_v2'
+# Config values or defaults, checked before anything is declared. See settings.py for every config value, e.g.
+# credsVersion and credsCacheTtl for the kubeconfig cache.
+settings = settings.load()
+k8s_version = settings.k8s_version
+admin_username = settings.admin_username
+node_count = settings.node_count
+node_size = settings.node_size
+creds_version = settings.creds_version
+creds_cache_ttl = settings.creds_cache_ttl
 
 ## Exercise 1
 ## Suggestion: Take a look at the stack config file (e.g. Pulumi.dev.yaml) to confirm you stored the password as a secret.
@@ -95,20 +102,17 @@ k8s_cluster = containerservice.ManagedCluster('cluster',
 
 # Obtaining the kubeconfig from an Azure K8s cluster requires using the "list_managed_clsuter_user_credentials"
 # function.
-# That function requires passing values that are not be known until the resources are created.
-# Thus, the use of "apply()" to wait for those values before calling the function.
-creds = pulumi.Output.all(resource_group.name, k8s_cluster.name).apply(
-    lambda args:
-    containerservice.list_managed_cluster_user_credentials(
-        resource_group_name=args[0],
-        resource_name=args[1]))
-
-# The "list_managed_cluster_user_credentials" function returns an array of base64 encoded kubeconfigs.
-# So decode the kubeconfig for our cluster.
+# That function requires passing values that are not be known until the resources are created, and it is an ARM
+# round-trip. get_kubeconfig() waits for those values with "apply()", calls the function and decodes the base64
+# encoded kubeconfig it returns. The kubeconfig is cached on disk, so the function is only called again when the
+# cluster is new, the credential version changes or the cached entry expires.
+kubeconfig = get_kubeconfig(resource_group.name, k8s_cluster.name,
+    creds_version=creds_version,
+    ttl=creds_cache_ttl)
+
 ## Exercise 2/2a
 ## How to programmatically create a secret: Use `pulumi.Output.secret()`
-kubeconfig = pulumi.Output.secret(creds.kubeconfigs[0].value.apply(
-    lambda enc: base64.b64decode(enc).decode()))
+kubeconfig = pulumi.Output.secret(kubeconfig)
 ## How to get the unecrypted value from the stack outputs: `pulumi stack output kubeconfig --show-secret`
 pulumi.export('kubeconfig', kubeconfig)
 ## Exercise 2
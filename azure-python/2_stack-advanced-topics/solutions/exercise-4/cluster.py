@@ -2,13 +2,13 @@ from pulumi_azure_native import resources, containerservice
 import pulumi_azuread as azuread
 import pulumi_kubernetes as k8s
 from pulumi import Output
-import base64
 
 ## Exercise 4
 ## Move the config and stuff to a config.py file and import here.
 ## Also need to add "config." to the variables that are from the config.py file.
 ## E.g. "password" below is not referenced as "config.password"
 import config
+from creds_cache import get_kubeconfig
 
 resource_group = resources.ResourceGroup('rg')
 
@@ -57,20 +57,17 @@ k8s_cluster = containerservice.ManagedCluster('cluster',
 
 # Obtaining the kubeconfig from an Azure K8s cluster requires using the "list_managed_clsuter_user_credentials"
 # function.
-# That function requires passing values that are not be known until the resources are created.
-# Thus, the use of "apply()" to wait for those values before calling the function.
-creds = Output.all(resource_group.name, k8s_cluster.name).apply(
-    lambda args:
-    containerservice.list_managed_cluster_user_credentials(
-        resource_group_name=args[0],
-        resource_name=args[1]))
+# That function requires passing values that are not be known until the resources are created, and it is an ARM
+# round-trip. get_kubeconfig() waits for those values with "apply()", calls the function and decodes the base64
+# encoded kubeconfig it returns. The kubeconfig is cached on disk, so the function is only called again when the
+# cluster is new, the credential version changes or the cached entry expires.
+kubeconfig = get_kubeconfig(resource_group.name, k8s_cluster.name,
+    creds_version=config.creds_version,
+    ttl=config.creds_cache_ttl)
 
-# The "list_managed_cluster_user_credentials" function returns an array of base64 encoded kubeconfigs.
-# So decode the kubeconfig for our cluster.
 ## Exercise 2/2a
 ## How to programmatically create a secret: Use `pulumi.Output.secret()`
-kubeconfig = Output.secret(creds.kubeconfigs[0].value.apply(
-    lambda enc: base64.b64decode(enc).decode()))
+kubeconfig = Output.secret(kubeconfig)
 
 # The K8s provider which supplies the helm chart resource needs to know how to talk to the K8s cluster.
 # So, instantiate a K8s provider using the retrieved kubeconfig.
@@ -1,13 +1,20 @@
 from pulumi import Config
 from pulumi_tls import PrivateKey
 
+import settings
+
 ## Exercise 4
 ## Move the config and statically created data into a "config.py" file to be imported and used elsewhere.
 config = Config()
-k8s_version = config.get('k8sVersion') or '1.18.14'
-admin_username = config.get('adminUserName') or 'testuser'
-node_count = config.get_int('nodeCount') or 2
-node_size = config.get('nodeSize') or 'Standard_D2_v2'
+# Config values or defaults, checked before anything is declared. See settings.py for every config value, e.g.
+# credsVersion and credsCacheTtl for the kubeconfig cache.
+settings = settings.load()
+k8s_version = settings.k8s_version
+admin_username = settings.admin_username
+node_count = settings.node_count
+node_size = settings.node_size
+creds_version = settings.creds_version
+creds_cache_ttl = settings.creds_cache_ttl
 
 password = config.require_secret("password")
 
@@ -14,24 +14,40 @@
 # Doc: https://www.pulumi.com/docs/intro/concepts/resources/#protect
 # Doc: https://www.pulumi.com/docs/reference/cli/pulumi_state_unprotect/
 
-import base64
 import pulumi
 from pulumi import Config, ResourceOptions
 from pulumi_tls import PrivateKey
 from pulumi_azure_native import resources, containerservice
 import pulumi_azuread as azuread
 import pulumi_kubernetes as k8s
-from pulumi_kubernetes.helm.v3 import Chart, ChartOpts
-import pulumi_random as random
+from pulumi_kubernetes.helm.v3 import Chart, LocalChartOpts
+
+from apache_scaling import ApacheScaling
+from chart_cache import ChartCache
+from creds_cache import get_kubeconfig
+import settings
 
 # Config values or defaults
 config = Config()
-k8s_version = config.get('k8sVersion') or '1.18.14'
-admin_username = config.get('adminUserName') or 'testuser'
-node_count = config.get_int('nodeCount') or 2
-node_size = config.get('nodeSize') or 'Standard_D2_v2'
-password = config.get_secret("password")
+# Set the "timing" config value to true to record when each resource is declared, resolves its inputs and gets
+# its outputs. The timeline is written to timing.json and timing.txt when the program exits.
+if config.get_bool('timing'):
+    import timing
+    timing.install()
+
+# Checked before anything is declared. See settings.py for every config value, e.g. credsVersion and
+# credsCacheTtl for the kubeconfig cache.
+settings = settings.load()
+k8s_version = settings.k8s_version
+admin_username = settings.admin_username
+node_count = settings.node_count
+node_size = settings.node_size
+creds_version = settings.creds_version
+creds_cache_ttl = settings.creds_cache_ttl
+password = settings.password
 if not password:
+    # Provider packages are slow to import, so only load the ones this configuration uses.
+    import pulumi_random as random
     rando_password=random.RandomPassword('password',
         length=16,
         special=True,
@@ -92,31 +108,40 @@ k8s_cluster = containerservice.ManagedCluster('cluster',
 
 # Obtaining the kubeconfig from an Azure K8s cluster requires using the "list_managed_clsuter_user_credentials"
 # function.
-# That function requires passing values that are not be known until the resources are created.
-# Thus, the use of "apply()" to wait for those values before calling the function.
-creds = pulumi.Output.all(resource_group.name, k8s_cluster.name).apply(
-    lambda args:
-    containerservice.list_managed_cluster_user_credentials(
-        resource_group_name=args[0],
-        resource_name=args[1]))
-
-# The "list_managed_cluster_user_credentials" function returns an array of base64 encoded kubeconfigs.
-# So decode the kubeconfig for our cluster but mark it as a secret so Pulumi treats it accordingly.
-kubeconfig = pulumi.Output.secret(creds.kubeconfigs[0].value.apply(
-    lambda enc: base64.b64decode(enc).decode()))
+# That function requires passing values that are not be known until the resources are created, and it is an ARM
+# round-trip. get_kubeconfig() waits for those values with "apply()", calls the function and decodes the base64
+# encoded kubeconfig it returns. The kubeconfig is cached on disk, so the function is only called again when the
+# cluster is new, the credential version changes or the cached entry expires.
+kubeconfig = get_kubeconfig(resource_group.name, k8s_cluster.name,
+    creds_version=creds_version,
+    ttl=creds_cache_ttl,
+    offline_preview=settings.offline_preview)
+
+# Mark the kubeconfig as a secret so Pulumi treats it accordingly.
+kubeconfig = pulumi.Output.secret(kubeconfig)
 ### End of AKS Cluster Related Resources
 
 # The K8s provider which supplies the helm chart resource needs to know how to talk to the K8s cluster.
 # So, instantiate a K8s provider using the retrieved kubeconfig.
 k8s_provider = k8s.Provider('k8s-provider', kubeconfig=kubeconfig)
 
+# Replicas, resources and autoscaling of apache from the config (see apache_scaling.py).
+apache_scaling = ApacheScaling.from_config(config)
+
+# The chart is fetched into a local cache once and deployed from there (see chart_cache.py). Offline previews never
+# download it: a chart missing from the cache fails right away.
+apache_chart_path = ChartCache(offline=settings.offline_preview and pulumi.runtime.is_dry_run()).fetch(
+    chart='apache',
+    version='8.3.2',
+    repo='https://charts.bitnami.com/bitnami')
+
 # Create a chart resource to deploy apache using the k8s provider instantiated above.
 apache = Chart('apache-chart',
-    ChartOpts(
-        chart='apache',
-        version='8.3.2',
-        fetch_opts={'repo': 'https://charts.bitnami.com/bitnami'}),
+    LocalChartOpts(
+        path=apache_chart_path,
+        values=apache_scaling.chart_values()),
     opts=ResourceOptions(provider=k8s_provider))
+apache_scaling.autoscaler('apache-chart', k8s_version, ResourceOptions(provider=k8s_provider, depends_on=[apache]))
 
 # Get the helm-deployed apache service IP which isn't known until the chart is deployed.
 apache_service_ip = apache.get_resource('v1/Service', 'apache-chart').apply(
@@ -3,6 +3,11 @@
 
 from pulumi import ComponentResource, ResourceOptions
 
+# The kubeconfig is fetched with get_kubeconfig() from creds_cache.py. It caches the kubeconfig on disk and skips it
+# in offline previews, so the component takes these settings too:
+#   creds_version: str = '1', creds_cache_ttl: int = DEFAULT_TTL, offline_preview: bool = False
+from creds_cache import DEFAULT_TTL, get_kubeconfig
+
 class ClusterArgs:
     def __init__(self,
                  # name the arguments and their types (e.g. str, bool, etc)
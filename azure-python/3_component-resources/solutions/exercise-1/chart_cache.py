@@ -0,0 +1,127 @@
+# Content-addressed local cache for Helm chart archives.
+# Without it every preview and update downloads the chart tarball from the remote repo again.
+#
+# Layout under the cache directory (default .cache/charts):
+#   index.json              (repo, chart, version) -> sha256 digest of the chart archive
+#   blobs/<digest>.tgz      the chart archives, named by their digest
+#   unpacked/<digest>/      the extracted charts, used as local chart paths
+#
+# In offline mode nothing is downloaded and a chart that is not in the cache fails immediately.
+# To prepare an air-gapped runner, fill the cache while online and copy the directory over:
+#   python chart_cache.py pull apache 8.3.2 https://charts.bitnami.com/bitnami
+#
+# 3_component-resources and its solutions have copies of this file, so those projects work on their own;
+# tests/test_copies.py keeps the copies the same.
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+import urllib.parse
+import urllib.request
+
+DEFAULT_CACHE_DIR = os.path.join('.cache', 'charts')
+
+class ChartCache:
+    def __init__(self,
+                 cache_dir: str = None,
+                 offline: bool = False):
+
+        self.cache_dir = cache_dir or os.environ.get('CHART_CACHE_DIR') or DEFAULT_CACHE_DIR
+        self.offline = offline
+
+    # Returns the path of the extracted chart directory, downloading the chart first if needed.
+    def fetch(self, chart: str, version: str, repo: str) -> str:
+        return self.fetch_with_digest(chart, version, repo)[0]
+
+    # Same as fetch() but also returns the digest of the chart archive, which identifies the chart's content.
+    def fetch_with_digest(self, chart: str, version: str, repo: str) -> tuple:
+        key = f'{repo.rstrip("/")}/{chart}:{version}'
+        digest = self._read_index().get(key)
+
+        if digest is None or not os.path.exists(self._blob_path(digest)):
+            if self.offline:
+                raise FileNotFoundError(f'Helm chart {key} is not in the local chart cache ({self.cache_dir}) '
+                                        'and offline mode is on. Fill the cache while online first.')
+            digest = self._download(chart, version, repo)
+            self._write_index(key, digest)
+        elif self._sha256(self._blob_path(digest)) != digest:
+            raise ValueError(f'cached archive for Helm chart {key} does not match its digest {digest}')
+
+        return self._unpack(chart, digest), digest
+
+    def _download(self, chart: str, version: str, repo: str) -> str:
+        # PyYAML comes with pulumi_kubernetes. It is only needed to read the repo index on a cache miss.
+        import yaml
+        loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+        repo_url = repo.rstrip('/') + '/'
+        with urllib.request.urlopen(urllib.parse.urljoin(repo_url, 'index.yaml')) as resp:
+            index = yaml.load(resp, Loader=loader)
+
+        entry = next((e for e in index.get('entries', {}).get(chart, []) if str(e.get('version')) == str(version)), None)
+        if entry is None:
+            raise ValueError(f'Helm chart {chart} version {version} is not in the index of {repo}')
+
+        os.makedirs(os.path.join(self.cache_dir, 'blobs'), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.join(self.cache_dir, 'blobs'), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f, urllib.request.urlopen(urllib.parse.urljoin(repo_url, entry['urls'][0])) as resp:
+            shutil.copyfileobj(resp, f)
+
+        digest = self._sha256(tmp_path)
+        # The repo index publishes the archive digest, so a corrupted or tampered download is never cached.
+        if entry.get('digest') and entry['digest'] != digest:
+            os.remove(tmp_path)
+            raise ValueError(f'downloaded Helm chart {chart} {version} has digest {digest}, the repo index says {entry["digest"]}')
+
+        os.replace(tmp_path, self._blob_path(digest))
+        return digest
+
+    def _unpack(self, chart: str, digest: str) -> str:
+        chart_path = os.path.join(self.cache_dir, 'unpacked', digest, chart)
+        if not os.path.exists(chart_path):
+            tmp_dir = tempfile.mkdtemp(dir=self.cache_dir)
+            with tarfile.open(self._blob_path(digest)) as tar:
+                # Refuse archive members that would land outside the cache where Python supports it.
+                if hasattr(tarfile, 'data_filter'):
+                    tar.extractall(tmp_dir, filter='data')
+                else:
+                    tar.extractall(tmp_dir)
+            os.makedirs(os.path.dirname(chart_path), exist_ok=True)
+            os.replace(os.path.join(tmp_dir, chart), chart_path)
+            shutil.rmtree(tmp_dir)
+        return chart_path
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, 'blobs', f'{digest}.tgz')
+
+    def _read_index(self) -> dict:
+        try:
+            with open(os.path.join(self.cache_dir, 'index.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _write_index(self, key: str, digest: str):
+        index = self._read_index()
+        index[key] = digest
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(index, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, os.path.join(self.cache_dir, 'index.json'))
+
+    @staticmethod
+    def _sha256(path: str) -> str:
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        return h.hexdigest()
+
+if __name__ == '__main__':
+    if len(sys.argv) != 5 or sys.argv[1] != 'pull':
+        sys.exit('usage: python chart_cache.py pull <chart> <version> <repo-url>')
+    print(ChartCache().fetch(sys.argv[2], sys.argv[3], sys.argv[4]))
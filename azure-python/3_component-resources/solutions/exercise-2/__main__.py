@@ -19,19 +19,27 @@ from pulumi import Config, ResourceOptions
 from pulumi.resource import Resource
 from pulumi_azure_native import resources
 import pulumi_kubernetes as k8s
-from pulumi_kubernetes.helm.v3 import Chart, ChartOpts
-import pulumi_random as random
+from pulumi_kubernetes.helm.v3 import Chart, LocalChartOpts
 
 import cluster
+import settings
+from chart_cache import ChartCache
 
 # Config values or defaults
 config = Config()
-k8s_version = config.get('k8sVersion') or '1.18.14'
-admin_username = config.get('adminUserName') or 'testuser'
-node_count = config.get_int('nodeCount') or 2
-node_size = config.get('nodeSize') or 'Standard_D2_v2'
-password = config.get_secret("password")
+# Checked before anything is declared. See settings.py for every config value, e.g. credsVersion and
+# credsCacheTtl for the kubeconfig cache.
+settings = settings.load()
+k8s_version = settings.k8s_version
+admin_username = settings.admin_username
+node_count = settings.node_count
+node_size = settings.node_size
+creds_version = settings.creds_version
+creds_cache_ttl = settings.creds_cache_ttl
+password = settings.password
 if not password:
+    # Provider packages are slow to import, so only load the ones this configuration uses.
+    import pulumi_random as random
     rando_password=random.RandomPassword('password',
         length=16,
         special=True,
@@ -49,7 +57,10 @@ cluster = cluster.Cluster('k8scluster', cluster.ClusterArgs(
     node_count=node_count,
     node_size=node_size,
     k8s_version=k8s_version,
-    admin_username=admin_username),
+    admin_username=admin_username,
+    creds_version=creds_version,
+    creds_cache_ttl=creds_cache_ttl,
+    offline_preview=settings.offline_preview),
     # Exercise 2
     # Add opts=ResoureOptions(protect=True)
     # Run `pulumi up` and see protect flag added to cluster module children.
@@ -63,12 +74,16 @@ cluster = cluster.Cluster('k8scluster', cluster.ClusterArgs(
 # So, instantiate a K8s provider using the retrieved kubeconfig.
 k8s_provider = k8s.Provider('k8s-provider', kubeconfig=cluster.kubeconfig)
 
+# The chart is fetched into a local cache once and deployed from there (see chart_cache.py). Offline previews never
+# download it: a chart missing from the cache fails right away.
+apache_chart_path = ChartCache(offline=settings.offline_preview and pulumi.runtime.is_dry_run()).fetch(
+    chart='apache',
+    version='8.3.2',
+    repo='https://charts.bitnami.com/bitnami')
+
 # Create a chart resource to deploy apache using the k8s provider instantiated above.
 apache = Chart('apache-chart',
-    ChartOpts(
-        chart='apache',
-        version='8.3.2',
-        fetch_opts={'repo': 'https://charts.bitnami.com/bitnami'}),
+    LocalChartOpts(path=apache_chart_path),
     opts=ResourceOptions(provider=k8s_provider))
 
 # Get the helm-deployed apache service IP which isn't known until the chart is deployed.
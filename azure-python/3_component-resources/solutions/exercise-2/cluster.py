@@ -3,10 +3,8 @@
 
 import pulumi
 from pulumi import ComponentResource, ResourceOptions
-from pulumi_tls import PrivateKey
-import pulumi_azuread as azuread
-from pulumi_azure_native import containerservice
-import base64
+
+from creds_cache import DEFAULT_TTL, get_kubeconfig
 
 class ClusterArgs:
     def __init__(self,
@@ -17,6 +15,12 @@ class ClusterArgs:
                  node_size:str,
                  k8s_version:str,
                  admin_username: str,
+                 # Bump creds_version after rotating the cluster credentials to bypass the cached kubeconfig.
+                 # A creds_cache_ttl of 0 disables the kubeconfig cache.
+                 creds_version: str = '1',
+                 creds_cache_ttl: int = DEFAULT_TTL,
+                 # Previews use a placeholder kubeconfig instead of fetching credentials (see creds_cache.py).
+                 offline_preview: bool = False,
                  ):
 
         # Set the class args
@@ -26,6 +30,9 @@ class ClusterArgs:
         self.node_size = node_size
         self.k8s_version = k8s_version
         self.admin_username = admin_username
+        self.creds_version = creds_version
+        self.creds_cache_ttl = creds_cache_ttl
+        self.offline_preview = offline_preview
 
 class Cluster(ComponentResource):
     def __init__(self,
@@ -36,6 +43,12 @@ class Cluster(ComponentResource):
         # Leave this line. You can modify 'customer:resoure:Cluster' if you want
         super().__init__('custom:resource:Cluster', name, {}, opts)
 
+        # The provider packages are imported here rather than at the top of the module so that importing the module
+        # (e.g. for ClusterArgs) doesn't pay for loading them.
+        from pulumi_tls import PrivateKey
+        import pulumi_azuread as azuread
+        from pulumi_azure_native import containerservice
+
         # Create the resources. 
         # Be sure to set a ResourceOption(parent=self) and prefix anything you want to return as an output with "self."
         # Example:
@@ -95,18 +108,17 @@ class Cluster(ComponentResource):
 
         # Obtaining the kubeconfig from an Azure K8s cluster requires using the "list_managed_clsuter_user_credentials"
         # function.
-        # That function requires passing values that are not be known until the resources are created.
-        # Thus, the use of "apply()" to wait for those values before calling the function.
-        creds = pulumi.Output.all(args.resource_group_name, k8s_cluster.name).apply(
-            lambda args:
-            containerservice.list_managed_cluster_user_credentials(
-                resource_group_name=args[0],
-                resource_name=args[1]))
+        # That function requires passing values that are not be known until the resources are created, and it is an
+        # ARM round-trip. get_kubeconfig() waits for those values with "apply()", calls the function and decodes the
+        # base64 encoded kubeconfig it returns. The kubeconfig is cached on disk, so the function is only called again
+        # when the cluster is new, the credential version changes or the cached entry expires.
+        kubeconfig = get_kubeconfig(args.resource_group_name, k8s_cluster.name,
+            creds_version=args.creds_version,
+            ttl=args.creds_cache_ttl,
+            offline_preview=args.offline_preview)
 
-        # The "list_managed_cluster_user_credentials" function returns an array of base64 encoded kubeconfigs.
-        # So decode the kubeconfig for our cluster but mark it as a secret so Pulumi treats it accordingly.
-        self.kubeconfig = pulumi.Output.secret(creds.kubeconfigs[0].value.apply(
-            lambda enc: base64.b64decode(enc).decode()))
+        # Mark the kubeconfig as a secret so Pulumi treats it accordingly.
+        self.kubeconfig = pulumi.Output.secret(kubeconfig)
         ### End of Cluster Related Resources
 
         # End with this. It is used for display purposes.
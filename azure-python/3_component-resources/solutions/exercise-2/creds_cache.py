@@ -0,0 +1,155 @@
+# On-disk cache for the decoded kubeconfig returned by "list_managed_cluster_user_credentials".
+# Every preview and update otherwise makes a blocking ARM round-trip for credentials that rarely change.
+#
+# Entries are keyed by (resource group, cluster name, credential version) and expire after a TTL.
+# Bump the credential version (see the "credsVersion" config value) after rotating the cluster credentials.
+#
+# Entries are encrypted the same way the passphrase secrets provider encrypts stack secrets: with a key derived
+# from PULUMI_CONFIG_PASSPHRASE (or CREDS_CACHE_PASSPHRASE). If neither is set, the cache is disabled
+# so a kubeconfig is never written to disk in plaintext.
+#
+# get_kubeconfig() fetches a cluster's kubeconfig through the cache. The Cluster component uses it, and so do the
+# stage 2 and 3 programs. Each of those projects has its own copy of this file, so the project works on its own;
+# tests/test_copies.py keeps the copies the same as 4_stack-references/base_cluster/creds_cache.py.
+
+import base64
+import hashlib
+import json
+import os
+import time
+
+import pulumi
+
+DEFAULT_CACHE_DIR = os.path.join('.cache', 'creds')
+DEFAULT_TTL = 3600
+
+# Running totals across every cache instance in the program so the saving is visible in the logs.
+stats = {'hits': 0, 'misses': 0}
+
+# Stands in for the cluster's kubeconfig in offline previews. The credentials are secret, so unlike other invoke
+# results they are never recorded for replay.
+OFFLINE_KUBECONFIG = '''apiVersion: v1
+kind: Config
+clusters:
+- name: offline-preview
+  cluster:
+    server: https://offline-preview.invalid
+contexts:
+- name: offline-preview
+  context:
+    cluster: offline-preview
+    user: offline-preview
+current-context: offline-preview
+users:
+- name: offline-preview
+  user:
+    token: offline-preview
+'''
+
+class CredsCache:
+    def __init__(self,
+                 ttl: int = DEFAULT_TTL,
+                 cache_dir: str = None,
+                 passphrase: str = None):
+
+        self.ttl = ttl
+        self.cache_dir = cache_dir or os.environ.get('CREDS_CACHE_DIR') or DEFAULT_CACHE_DIR
+        self.passphrase = passphrase or os.environ.get('CREDS_CACHE_PASSPHRASE') or os.environ.get('PULUMI_CONFIG_PASSPHRASE')
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and bool(self.passphrase)
+
+    def get(self, resource_group_name: str, cluster_name: str, version: str):
+        if not self.enabled:
+            return None
+
+        path = self._path(resource_group_name, cluster_name, version)
+        kubeconfig = None
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+            payload = json.loads(self._fernet(entry['salt']).decrypt(entry['token'].encode()))
+            if time.time() - payload['fetched_at'] < self.ttl:
+                kubeconfig = payload['kubeconfig']
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            # A corrupt entry or a changed passphrase is just a miss.
+            pulumi.log.debug(f'ignoring unreadable kubeconfig cache entry {path}: {e}')
+
+        self._count('hit' if kubeconfig is not None else 'miss', resource_group_name, cluster_name)
+        return kubeconfig
+
+    def put(self, resource_group_name: str, cluster_name: str, version: str, kubeconfig: str) -> str:
+        if not self.enabled:
+            return kubeconfig
+
+        salt = base64.b64encode(os.urandom(16)).decode()
+        payload = json.dumps({'kubeconfig': kubeconfig, 'fetched_at': time.time()})
+        entry = {'salt': salt, 'token': self._fernet(salt).encrypt(payload.encode()).decode()}
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(resource_group_name, cluster_name, version)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        # Only the current user may read the cache entry.
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+        return kubeconfig
+
+    def _path(self, resource_group_name: str, cluster_name: str, version: str) -> str:
+        key = '\0'.join([resource_group_name, cluster_name, str(version)])
+        return os.path.join(self.cache_dir, hashlib.sha256(key.encode()).hexdigest() + '.json')
+
+    def _fernet(self, salt: str):
+        # Imported here so programs that never enable the cache don't pay for loading cryptography.
+        from cryptography.fernet import Fernet
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+
+        kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=base64.b64decode(salt), iterations=100_000)
+        return Fernet(base64.urlsafe_b64encode(kdf.derive(self.passphrase.encode())))
+
+    def _count(self, outcome: str, resource_group_name: str, cluster_name: str):
+        stats['hits' if outcome == 'hit' else 'misses'] += 1
+        pulumi.log.info(f'kubeconfig cache {outcome} for {resource_group_name}/{cluster_name} '
+                        f'({stats["hits"]} hits, {stats["misses"]} misses)')
+
+# The decoded kubeconfig of the cluster. "list_managed_cluster_user_credentials" is an ARM round-trip, so it is only
+# called when the cluster is new, the credential version changes or the cached entry expires. With offline_preview,
+# previews get OFFLINE_KUBECONFIG instead and make no call at all.
+# The result isn't marked as a secret; wrap it in pulumi.Output.secret().
+def get_kubeconfig(resource_group_name: pulumi.Input[str],
+                   cluster_name: pulumi.Input[str],
+                   creds_version: str = '1',
+                   ttl: int = DEFAULT_TTL,
+                   offline_preview: bool = False) -> pulumi.Output:
+    cache = CredsCache(ttl=ttl)
+
+    # The plain function blocks the Python event loop until ARM answers, holding up the registration of everything
+    # else (e.g. the Helm chart's resources). Awaiting the invoke instead lets those registrations carry on meanwhile.
+    async def fetch(resource_group_name, cluster_name):
+        from pulumi_azure_native import containerservice
+
+        creds = await pulumi.runtime.invoke_async('azure-native:containerservice:listManagedClusterUserCredentials',
+            {'resourceGroupName': resource_group_name, 'resourceName': cluster_name},
+            typ=containerservice.ListManagedClusterUserCredentialsResult)
+        # The function returns an array of base64 encoded kubeconfigs. So decode the kubeconfig for our cluster.
+        return cache.put(resource_group_name, cluster_name, creds_version,
+            base64.b64decode(creds.kubeconfigs[0].value).decode())
+
+    def get(rg_and_name):
+        resource_group_name, cluster_name = rg_and_name
+        if offline_preview and pulumi.runtime.is_dry_run():
+            return OFFLINE_KUBECONFIG
+        kubeconfig = cache.get(resource_group_name, cluster_name, creds_version)
+        if kubeconfig is None:
+            # "apply()" awaits the returned coroutine.
+            return fetch(resource_group_name, cluster_name)
+        return kubeconfig
+
+    # Obtaining the kubeconfig requires passing values that are not be known until the resources are created.
+    # Thus, the use of "apply()" to wait for those values before calling the function.
+    return pulumi.Output.all(resource_group_name, cluster_name).apply(get)
@@ -0,0 +1,97 @@
+# The stack config of the stage 2 and 3 programs, read once and checked before any resource is declared.
+#
+# Bad values otherwise only show up once Azure rejects them, minutes into an update. load() reads every config value,
+# checks its type and range, and raises one error listing every problem it found. The result is cached, so modules
+# that need the settings can call load() without reading the config again.
+#
+# This is the part of 4_stack-references/base_cluster/settings.py these programs use. Each project that needs it has
+# its own copy, so the project works on its own; tests/test_copies.py keeps the copies the same.
+
+import functools
+import re
+
+from pulumi import Config
+from pulumi.config import ConfigTypeError
+
+from creds_cache import DEFAULT_TTL
+
+K8S_VERSION = re.compile(r'^\d+\.\d+(\.\d+)?$')
+ADMIN_USERNAME = re.compile(r'^[a-z_][a-z0-9_-]{0,31}$')
+
+class Settings:
+    __slots__ = (
+        'k8s_version',
+        'admin_username',
+        'node_count',
+        'node_size',
+        'creds_version',
+        'creds_cache_ttl',
+        'offline_preview',
+        'password',
+    )
+
+    k8s_version: str
+    admin_username: str
+    node_count: int
+    node_size: str
+    creds_version: str
+    creds_cache_ttl: int
+    # Previews use a placeholder kubeconfig instead of fetching the cluster's credentials (see creds_cache.py).
+    offline_preview: bool
+    # A secret Output, or None if the password isn't set.
+    password: object
+
+    def __repr__(self) -> str:
+        return 'Settings(' + ', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__
+                                       if name != 'password') + ')'
+
+class _Reader:
+    def __init__(self, config: Config):
+        self.config = config
+        self.problems = []
+
+    def get(self, key: str, default=None, kind: str = 'str'):
+        try:
+            value = {'str': self.config.get, 'int': self.config.get_int, 'bool': self.config.get_bool}[kind](key)
+        except (ConfigTypeError, ValueError) as e:
+            self.problems.append(f'{key}: {e}')
+            return default
+        return default if value is None else value
+
+    def check(self, ok: bool, problem: str):
+        if not ok:
+            self.problems.append(problem)
+
+    def check_range(self, key: str, value: int, low: int, high: int):
+        self.check(value is None or low <= value <= high, f'{key} must be between {low} and {high}, got {value}')
+
+    def check_match(self, key: str, value: str, pattern, example: str):
+        self.check(value is None or bool(pattern.match(value)), f"{key} must look like '{example}', got '{value}'")
+
+@functools.lru_cache(maxsize=None)
+def load() -> Settings:
+    reader = _Reader(Config())
+    settings = Settings()
+
+    settings.k8s_version = reader.get('k8sVersion', '1.18.14')
+    reader.check_match('k8sVersion', settings.k8s_version, K8S_VERSION, '1.18.14')
+    settings.admin_username = reader.get('adminUserName', 'testuser')
+    reader.check_match('adminUserName', settings.admin_username, ADMIN_USERNAME, 'testuser')
+    settings.node_count = reader.get('nodeCount', 2, 'int')
+    reader.check_range('nodeCount', settings.node_count, 1, 100)
+    settings.node_size = reader.get('nodeSize', 'Standard_D2_v2')
+    reader.check(settings.node_size.startswith('Standard_'), f"nodeSize must be an Azure VM size like "
+                 f"'Standard_D2_v2', got '{settings.node_size}'")
+
+    # Bump credsVersion after rotating the cluster credentials to bypass the cached kubeconfig.
+    # Set credsCacheTtl to 0 to disable the kubeconfig cache.
+    settings.creds_version = reader.get('credsVersion', '1')
+    settings.creds_cache_ttl = reader.get('credsCacheTtl', DEFAULT_TTL, 'int')
+    reader.check_range('credsCacheTtl', settings.creds_cache_ttl, 0, 30 * 24 * 3600)
+
+    settings.offline_preview = reader.get('offlinePreview', False, 'bool')
+    settings.password = reader.config.get_secret('password')
+
+    if reader.problems:
+        raise ValueError('invalid stack config:\n' + '\n'.join(f'  - {p}' for p in reader.problems))
+    return settings
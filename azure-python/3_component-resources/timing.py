@@ -0,0 +1,64 @@
+# Opt-in registration timing for every resource in the program.
+# Turn it on with `pulumi config set timing true` (see __main__.py).
+#
+# A stack transformation sees each resource as it is declared. For each resource it records, in seconds since
+# install() was called:
+# - declared: when the program constructed the resource
+# - inputs:   when all of its input values were resolved (not recorded for values unknown during a preview)
+# - outputs:  when the engine answered the registration with the resource's outputs
+#
+# When the program exits, the timeline is written as JSON (timing.json) and as a summary table (timing.txt).
+
+import atexit
+import asyncio
+import json
+import time
+
+import pulumi
+
+_start = None
+_records = []
+
+def install(timeline_path: str = 'timing.json', summary_path: str = 'timing.txt'):
+    global _start
+    if _start is not None:
+        return
+    _start = time.perf_counter()
+    pulumi.runtime.register_stack_transformation(_record)
+    atexit.register(_write, timeline_path, summary_path)
+
+def _now() -> float:
+    return round(time.perf_counter() - _start, 4)
+
+def _record(args: pulumi.ResourceTransformationArgs):
+    record = {'type': args.type_, 'name': args.name, 'declared': _now(), 'inputs': None, 'outputs': None}
+    _records.append(record)
+
+    def mark(key):
+        def set_time(_):
+            record[key] = _now()
+        return set_time
+
+    pulumi.Output.from_input(args.props).apply(mark('inputs'))
+    # The resource's URN is only set once its constructor finishes, so hook it after the current step.
+    resource = args.resource
+    asyncio.get_event_loop().call_soon(lambda: resource.urn.apply(mark('outputs')))
+
+    # Leave the resource unchanged.
+    return None
+
+def _write(timeline_path: str, summary_path: str):
+    with open(timeline_path, 'w') as f:
+        json.dump(_records, f, indent=2)
+
+    lines = [f'{"declared":>9} {"inputs":>9} {"outputs":>9} {"register":>9}  resource']
+    for r in sorted(_records, key=lambda r: (r['outputs'] is None, r['outputs'] or 0)):
+        # Time the engine took to register the resource once its inputs were ready.
+        register = max(0, r['outputs'] - (r['inputs'] or r['declared'])) if r['outputs'] is not None else None
+        lines.append(f'{_fmt(r["declared"])} {_fmt(r["inputs"])} {_fmt(r["outputs"])} {_fmt(register)}  '
+                     f'{r["type"]}::{r["name"]}')
+    with open(summary_path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+def _fmt(seconds) -> str:
+    return f'{seconds:>9.3f}' if seconds is not None else f'{"-":>9}'
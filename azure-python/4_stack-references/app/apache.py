@@ -0,0 +1,175 @@
+# Deploys the apache Helm chart on a cluster and returns the IP of its LoadBalancer service.
+#
+# The "chartMode" config value selects how the chart is deployed:
+# - chart: render the chart on every run and manage each Kubernetes object as its own Pulumi resource (default).
+# - cached: same as chart, but reuse the rendered manifests while the chart, its options and the cluster's Kubernetes
+#   version are unchanged.
+# - release: install the chart as a Helm release. Pulumi then tracks one resource instead of every object,
+#   which keeps the state small and cuts per-resource engine overhead. Helm owns the objects in the cluster.
+#
+# With "offlinePreview" set, previews run without the network or the cluster: the chart must already be in the local
+# chart cache, and rendering it is answered from recorded results (see invoke_fixtures.py). Set "recordInvokes" on an
+# online update to record them, and "invokeFixtures" to use another fixture file than fixtures/invokes.json.
+# Both render the chart through CachedChart, which is Chart with a replaceable invoke. In release mode the Service
+# can't be read back offline, so the preview shows a placeholder IP.
+#
+# Replicas, resource requests and limits, and autoscaling come from the config too (see apache_scaling.py), as does
+# the apache server tuning profile (see apache_tuning.py). With "ingress" set, an nginx ingress controller that caches
+# apache's responses is deployed the same way, and its IP is returned instead (see ingress.py).
+#
+# The pulumi_kubernetes modules are large and slow to import, so each mode only imports the ones it uses.
+
+import pulumi
+from pulumi import Config, ResourceOptions
+import pulumi_kubernetes as k8s
+
+from apache_scaling import ApacheScaling
+from apache_tuning import ApacheTuning
+from chart_cache import ChartCache
+import ingress
+from invoke_fixtures import InvokeFixtures
+
+CHART = 'apache'
+CHART_VERSION = '8.3.2'
+CHART_REPO = 'https://charts.bitnami.com/bitnami'
+# Also the Helm release name, which the chart uses to name its Service.
+RELEASE_NAME = 'apache-chart'
+
+CHART_MODES = ('chart', 'cached', 'release')
+
+# base_cluster's default k8sVersion, for base_cluster stacks that don't export the version.
+DEFAULT_K8S_VERSION = '1.18.14'
+
+# k8s_version is the cluster's Kubernetes version, e.g. the base_cluster stack's k8sVersion output. Without it, the
+# "k8sVersion" config value or base_cluster's default stands in.
+#
+# The version also picks the API of the autoscaler and the ingress. Resources are declared up front, not inside an
+# apply, so that needs a plain string: k8s_version itself if it is one, else the "k8sVersion" config value, which should
+# then match the cluster.
+def deploy_apache(k8s_provider: k8s.Provider, config: Config, k8s_version: pulumi.Input[str] = None) -> pulumi.Output:
+    chart_mode = config.get('chartMode') or 'chart'
+    if chart_mode not in CHART_MODES:
+        raise ValueError(f"chartMode must be one of {', '.join(CHART_MODES)}, got '{chart_mode}'")
+    api_k8s_version = k8s_version if isinstance(k8s_version, str) else config.get('k8sVersion') or DEFAULT_K8S_VERSION
+    k8s_version = pulumi.Output.from_input(k8s_version).apply(lambda version: version or api_k8s_version)
+    scaling = ApacheScaling.from_config(config)
+    values = scaling.chart_values()
+    # The chart waits for the tuning ConfigMap it mounts.
+    depends_on = []
+    tuning = ApacheTuning.from_config(config)
+    if tuning is not None:
+        values.update(tuning.chart_values())
+        depends_on.append(tuning.config_map(ResourceOptions(provider=k8s_provider)))
+    ingress_cache = ingress.IngressCache.from_config(config)
+    if ingress_cache is not None:
+        # Only the ingress controller is exposed; it reaches apache inside the cluster.
+        values['service'] = {'type': 'ClusterIP'}
+
+    offline_preview = (config.get_bool('offlinePreview') or False) and pulumi.runtime.is_dry_run()
+    fixtures = InvokeFixtures(config.get('invokeFixtures'),
+        record=(config.get_bool('recordInvokes') or False) and not offline_preview,
+        replay=offline_preview)
+
+    apache, apache_service_ip = deploy_chart(k8s_provider, config, chart_mode, fixtures, k8s_version,
+        release_name=RELEASE_NAME,
+        chart=CHART,
+        version=CHART_VERSION,
+        repo=CHART_REPO,
+        values=values,
+        service_name=None if ingress_cache is not None else RELEASE_NAME,
+        depends_on=depends_on)
+    scaling.autoscaler(RELEASE_NAME, api_k8s_version, ResourceOptions(provider=k8s_provider, depends_on=[apache]))
+    if ingress_cache is None:
+        return apache_service_ip
+
+    namespace = ingress_cache.namespace(ResourceOptions(provider=k8s_provider))
+    controller, ingress_service_ip = deploy_chart(k8s_provider, config, chart_mode, fixtures, k8s_version,
+        release_name=ingress.RELEASE_NAME,
+        chart=ingress.CHART,
+        version=ingress.chart_version(api_k8s_version),
+        repo=ingress.CHART_REPO,
+        values=ingress_cache.chart_values(api_k8s_version),
+        namespace=ingress.NAMESPACE,
+        service_name=ingress.SERVICE_NAME,
+        depends_on=[namespace])
+    ingress_cache.ingress(RELEASE_NAME, api_k8s_version,
+        opts=ResourceOptions(provider=k8s_provider, depends_on=[apache, controller]))
+    return ingress_service_ip
+
+# Deploys a chart in the given chart mode. Returns the chart (or release) resource and, with service_name, the IP of
+# that LoadBalancer Service of the chart.
+def deploy_chart(k8s_provider: k8s.Provider,
+                 config: Config,
+                 chart_mode: str,
+                 fixtures: InvokeFixtures,
+                 k8s_version: pulumi.Input[str],
+                 release_name: str,
+                 chart: str,
+                 version: str,
+                 repo: str,
+                 values: dict,
+                 namespace: str = None,
+                 service_name: str = None,
+                 depends_on: list = None) -> tuple:
+
+    offline_preview = fixtures.replay
+    opts = ResourceOptions(provider=k8s_provider, depends_on=depends_on or [])
+
+    # The chart is fetched into a local, content-addressed cache once and deployed from there.
+    # Set chartOffline to true on air-gapped runners: a chart missing from the cache then fails immediately.
+    chart_offline = (config.get_bool('chartOffline') or False) or offline_preview
+    chart_path, chart_digest = ChartCache(offline=chart_offline).fetch_with_digest(
+        chart=chart,
+        version=version,
+        repo=repo)
+
+    if chart_mode == 'release':
+        from pulumi_kubernetes.core.v1 import Service
+        from pulumi_kubernetes.helm.v3 import Release, ReleaseArgs
+
+        release = Release(release_name, ReleaseArgs(
+            name=release_name,
+            chart=chart_path,
+            namespace=namespace,
+            values=values),
+            opts=opts)
+
+        if service_name is None:
+            return release, None
+        if offline_preview:
+            return release, pulumi.Output.from_input('offline-preview')
+
+        # The release doesn't expose the objects it created, so read the chart's Service back from the cluster.
+        # By default the release waits for its resources to be ready, so the load balancer IP is assigned by then.
+        service = Service.get(f'{service_name}-service',
+            pulumi.Output.concat(release.status.namespace, '/', service_name),
+            opts=ResourceOptions(provider=k8s_provider))
+        return release, service.status.load_balancer.ingress[0].ip
+
+    from pulumi_kubernetes.helm.v3 import Chart, LocalChartOpts
+
+    if chart_mode == 'cached' or fixtures.record or fixtures.replay:
+        from manifest_cache import CachedChart, ManifestCache
+
+        cache = None
+        if chart_mode == 'cached':
+            manifest_cache_max_mb = config.get_int('manifestCacheMaxMb') or 256
+            # Replayed results may be for other values, so an offline preview doesn't add them to the cache.
+            cache = ManifestCache(max_bytes=manifest_cache_max_mb * 1024 * 1024, read_only=offline_preview)
+        resource = CachedChart(release_name,
+            LocalChartOpts(path=chart_path, namespace=namespace, values=values),
+            chart_digest=chart_digest,
+            k8s_version=k8s_version,
+            cache=cache,
+            invoke=fixtures.invoke,
+            opts=opts)
+    else:
+        resource = Chart(release_name,
+            LocalChartOpts(path=chart_path, namespace=namespace, values=values),
+            opts=opts)
+
+    if service_name is None:
+        return resource, None
+    # Get the helm-deployed service IP which isn't known until the chart is deployed.
+    return resource, resource.get_resource('v1/Service', service_name, namespace).apply(
+        lambda res: res.status.load_balancer.ingress[0].ip)
@@ -0,0 +1,108 @@
+# Replicas, resource requests and limits, and autoscaling of the apache deployment, from the stack config.
+#
+# The chart deploys a single replica without requests or limits by default. Config values:
+# - apacheReplicas: number of replicas (the minimum when autoscaling), e.g. from `python -m tools.capacity plan`.
+# - apacheCpuRequest, apacheMemoryRequest, apacheCpuLimit, apacheMemoryLimit: Kubernetes quantities, e.g. 250m, 256Mi.
+# - apacheMaxReplicas: adds a HorizontalPodAutoscaler that scales the deployment between apacheReplicas and this
+#   on CPU use, targeting apacheTargetCpu percent (default 70) of the CPU request. Scaling on CPU needs a CPU
+#   request, so apacheCpuRequest defaults to 100m when autoscaling.
+# Replicas, requests and limits are passed to the chart as values; the autoscaler is a resource of its own. With the
+# autoscaler, the chart doesn't get the replica count: the autoscaler owns it, and every update would reset it.
+#
+# 3_component-resources has a copy of this file, so that project works on its own; tests/test_copies.py keeps the copy
+# the same.
+
+from pulumi import Config, ResourceOptions
+
+DEFAULT_TARGET_CPU = 70
+DEFAULT_AUTOSCALING_CPU_REQUEST = '100m'
+# autoscaling/v2 is served from Kubernetes 1.23 on; v2beta2, from 1.12 up to 1.25.
+AUTOSCALING_V2_SINCE = (1, 23)
+
+class ApacheScaling:
+    def __init__(self,
+                 replicas: int = None,
+                 cpu_request: str = None,
+                 memory_request: str = None,
+                 cpu_limit: str = None,
+                 memory_limit: str = None,
+                 # Setting max_replicas turns on the autoscaler.
+                 max_replicas: int = None,
+                 target_cpu: int = DEFAULT_TARGET_CPU,
+                 ):
+
+        if replicas is not None and replicas < 1:
+            raise ValueError(f'apacheReplicas must be at least 1, got {replicas}')
+        if max_replicas is not None and max_replicas < (replicas or 1):
+            raise ValueError(f'apacheMaxReplicas must be at least apacheReplicas ({replicas or 1}), got {max_replicas}')
+        if target_cpu <= 0:
+            raise ValueError(f'apacheTargetCpu must be a positive percentage of the CPU request, got {target_cpu}')
+        if target_cpu > 100:
+            raise ValueError(f'apacheTargetCpu must be a percentage between 1 and 100, got {target_cpu}')
+
+        self.replicas = replicas
+        self.cpu_request = cpu_request or (DEFAULT_AUTOSCALING_CPU_REQUEST if max_replicas else None)
+        self.memory_request = memory_request
+        self.cpu_limit = cpu_limit
+        self.memory_limit = memory_limit
+        self.max_replicas = max_replicas
+        self.target_cpu = target_cpu
+
+    @staticmethod
+    def from_config(config: Config) -> 'ApacheScaling':
+        target_cpu = config.get_int('apacheTargetCpu')
+        if target_cpu is None:
+            target_cpu = DEFAULT_TARGET_CPU
+        return ApacheScaling(
+            replicas=config.get_int('apacheReplicas'),
+            cpu_request=config.get('apacheCpuRequest'),
+            memory_request=config.get('apacheMemoryRequest'),
+            cpu_limit=config.get('apacheCpuLimit'),
+            memory_limit=config.get('apacheMemoryLimit'),
+            max_replicas=config.get_int('apacheMaxReplicas'),
+            target_cpu=target_cpu,
+        )
+
+    # Chart values for the replicas and resources. Empty when nothing is configured, so the chart's defaults apply.
+    def chart_values(self) -> dict:
+        values = {}
+        if self.replicas is not None and self.max_replicas is None:
+            values['replicaCount'] = self.replicas
+        requests = {k: v for k, v in (('cpu', self.cpu_request), ('memory', self.memory_request)) if v}
+        limits = {k: v for k, v in (('cpu', self.cpu_limit), ('memory', self.memory_limit)) if v}
+        if requests or limits:
+            values['resources'] = {k: v for k, v in (('requests', requests), ('limits', limits)) if v}
+        return values
+
+    # The HorizontalPodAutoscaler for the chart's Deployment, which is named after the release. None without
+    # max_replicas. Its API version is the one the cluster's Kubernetes version serves. The version is a plain string,
+    # e.g. the k8sVersion config value, so the autoscaler is declared up front and every preview shows it.
+    def autoscaler(self, deployment_name: str, k8s_version: str, opts: ResourceOptions = None):
+        if self.max_replicas is None:
+            return None
+        if tuple(int(part) for part in k8s_version.split('.')[:2]) >= AUTOSCALING_V2_SINCE:
+            from pulumi_kubernetes.autoscaling.v2 import HorizontalPodAutoscaler
+        else:
+            from pulumi_kubernetes.autoscaling.v2beta2 import HorizontalPodAutoscaler
+
+        return HorizontalPodAutoscaler(f'{deployment_name}-hpa',
+            spec={
+                'scale_target_ref': {
+                    'api_version': 'apps/v1',
+                    'kind': 'Deployment',
+                    'name': deployment_name,
+                },
+                'min_replicas': self.replicas or 1,
+                'max_replicas': self.max_replicas,
+                'metrics': [{
+                    'type': 'Resource',
+                    'resource': {
+                        'name': 'cpu',
+                        'target': {
+                            'type': 'Utilization',
+                            'average_utilization': self.target_cpu,
+                        },
+                    },
+                }],
+            },
+            opts=opts)
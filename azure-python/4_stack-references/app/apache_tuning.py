@@ -0,0 +1,182 @@
+# Apache server tuning profiles: MPM worker counts, KeepAlive, timeouts and compression.
+#
+# The "apacheProfile" config value picks a profile from PROFILES; "apacheTuning" overrides single settings of it, e.g.
+#   pulumi config set apacheProfile high-throughput
+#   pulumi config set --path 'apacheTuning.maxRequestWorkers' 2048
+# Overrides without a profile apply to the "default" profile, apache's own settings.
+# The profile is rendered to an apache config file in a ConfigMap, which the chart mounts into the server's vhosts
+# directory (the "vhostsConfigMap" chart value); the server includes that directory after its own settings, so the
+# profile's directives take precedence. The ConfigMap is named after a hash of the file, so a changed profile is a new
+# ConfigMap: the pods roll over to it while the old one stays mounted in the old pods until the update is done.
+#
+# - default: apache's settings, for overriding single ones.
+# - low-latency: keeps many idle workers ready so requests don't wait for new ones, holds connections open briefly,
+#   and doesn't compress, which costs CPU time on every response.
+# - high-throughput: more workers and longer-lived keep-alive connections, and compresses text so that more responses
+#   fit through the network.
+
+import hashlib
+import math
+
+from pulumi import ResourceOptions
+
+# The ConfigMap's name is this prefix and a hash of the file. The same profile always gets the same name, so the chart
+# values, and with them the cached and recorded renders, stay stable.
+CONFIG_MAP_PREFIX = 'apache-tuning'
+CONF_FILE = 'tuning.conf'
+DEFAULT_PROFILE = 'default'
+
+# Settings by config name, with the apache defaults.
+SETTINGS = {
+    'timeout': 60,
+    'keepAlive': True,
+    'keepAliveTimeout': 5,
+    # 0 means unlimited.
+    'maxKeepAliveRequests': 100,
+    'maxRequestWorkers': 400,
+    'threadsPerChild': 25,
+    'startWorkers': 75,
+    'minSpareWorkers': 75,
+    'maxSpareWorkers': 250,
+    # 0 means never recycle a worker process.
+    'maxConnectionsPerChild': 0,
+    'compression': False,
+    'compressionLevel': 6,
+}
+
+# Settings that may be 0, which means unlimited or never; the other numbers must be positive.
+ZERO_ALLOWED = ('maxKeepAliveRequests', 'maxConnectionsPerChild')
+
+PROFILES = {
+    'default': {},
+    'low-latency': {
+        'timeout': 30,
+        'keepAliveTimeout': 2,
+        'maxKeepAliveRequests': 500,
+        'maxRequestWorkers': 400,
+        'threadsPerChild': 25,
+        'startWorkers': 200,
+        'minSpareWorkers': 150,
+        'maxSpareWorkers': 400,
+        'compression': False,
+    },
+    'high-throughput': {
+        'timeout': 60,
+        'keepAliveTimeout': 15,
+        'maxKeepAliveRequests': 0,
+        'maxRequestWorkers': 1024,
+        'threadsPerChild': 64,
+        'startWorkers': 128,
+        'minSpareWorkers': 128,
+        'maxSpareWorkers': 512,
+        'compression': True,
+        'compressionLevel': 4,
+    },
+}
+
+# Response types compressed when compression is on.
+COMPRESSED_TYPES = 'text/html text/plain text/css text/xml application/javascript application/json image/svg+xml'
+
+class ApacheTuning:
+    def __init__(self,
+                 profile: str,
+                 # Settings that override the profile's, by config name.
+                 overrides: dict = None):
+
+        if profile not in PROFILES:
+            raise ValueError(f"apacheProfile must be one of {', '.join(PROFILES)}, got '{profile}'")
+        unknown = sorted(set(overrides or {}) - set(SETTINGS))
+        if unknown:
+            raise ValueError(f"apacheTuning has unknown settings {', '.join(unknown)}; known: {', '.join(SETTINGS)}")
+        for setting, value in (overrides or {}).items():
+            if isinstance(SETTINGS[setting], bool):
+                if not isinstance(value, bool):
+                    raise ValueError(f'apacheTuning.{setting} must be true or false, got {value!r}')
+            elif not isinstance(value, int) or isinstance(value, bool) or value < (0 if setting in ZERO_ALLOWED else 1):
+                kind = 'a whole number, 0 or more' if setting in ZERO_ALLOWED else 'a positive whole number'
+                raise ValueError(f'apacheTuning.{setting} must be {kind}, got {value!r}')
+
+        self.profile = profile
+        self.settings = {**SETTINGS, **PROFILES[profile], **(overrides or {})}
+        s = self.settings
+        if s['maxRequestWorkers'] < s['threadsPerChild']:
+            raise ValueError(f"apacheTuning.maxRequestWorkers ({s['maxRequestWorkers']}) must be at least "
+                             f"threadsPerChild ({s['threadsPerChild']})")
+        if not s['minSpareWorkers'] <= s['maxSpareWorkers']:
+            raise ValueError(f"apacheTuning.minSpareWorkers ({s['minSpareWorkers']}) must not exceed "
+                             f"maxSpareWorkers ({s['maxSpareWorkers']})")
+        if s['compressionLevel'] > 9:
+            raise ValueError(f"apacheTuning.compressionLevel must be between 1 and 9, got {s['compressionLevel']}")
+
+    # None without "apacheProfile" and "apacheTuning", so the chart's own configuration applies.
+    @staticmethod
+    def from_config(config) -> 'ApacheTuning':
+        profile = config.get('apacheProfile')
+        overrides = config.get_object('apacheTuning')
+        if profile is None and overrides is None:
+            return None
+        if overrides is not None and not isinstance(overrides, dict):
+            raise ValueError(f'apacheTuning must be an object of settings, got {overrides!r}')
+        return ApacheTuning(profile or DEFAULT_PROFILE, overrides)
+
+    def render(self) -> str:
+        s = self.settings
+        # The threaded MPMs (event, worker) count processes of threadsPerChild threads; prefork has a process per worker.
+        processes = math.ceil(s['maxRequestWorkers'] / s['threadsPerChild'])
+        lines = [
+            f'# Apache tuning profile "{self.profile}", rendered by apache_tuning.py.',
+            f'Timeout {s["timeout"]}',
+            f'KeepAlive {"On" if s["keepAlive"] else "Off"}',
+            f'KeepAliveTimeout {s["keepAliveTimeout"]}',
+            f'MaxKeepAliveRequests {s["maxKeepAliveRequests"]}',
+            '',
+        ]
+        for module in ('mpm_event_module', 'mpm_worker_module'):
+            lines += [
+                f'<IfModule {module}>',
+                f'    ServerLimit {processes}',
+                f'    StartServers {math.ceil(s["startWorkers"] / s["threadsPerChild"])}',
+                f'    ThreadsPerChild {s["threadsPerChild"]}',
+                f'    MinSpareThreads {s["minSpareWorkers"]}',
+                f'    MaxSpareThreads {s["maxSpareWorkers"]}',
+                f'    MaxRequestWorkers {processes * s["threadsPerChild"]}',
+                f'    MaxConnectionsPerChild {s["maxConnectionsPerChild"]}',
+                '</IfModule>',
+            ]
+        lines += [
+            '<IfModule mpm_prefork_module>',
+            f'    ServerLimit {s["maxRequestWorkers"]}',
+            f'    StartServers {s["startWorkers"]}',
+            f'    MinSpareServers {s["minSpareWorkers"]}',
+            f'    MaxSpareServers {s["maxSpareWorkers"]}',
+            f'    MaxRequestWorkers {s["maxRequestWorkers"]}',
+            f'    MaxConnectionsPerChild {s["maxConnectionsPerChild"]}',
+            '</IfModule>',
+        ]
+        if s['compression']:
+            lines += [
+                '',
+                '<IfModule mod_deflate.c>',
+                f'    AddOutputFilterByType DEFLATE {COMPRESSED_TYPES}',
+                f'    DeflateCompressionLevel {s["compressionLevel"]}',
+                '</IfModule>',
+            ]
+        return '\n'.join(lines) + '\n'
+
+    @property
+    def config_map_name(self) -> str:
+        return f'{CONFIG_MAP_PREFIX}-{hashlib.sha256(self.render().encode()).hexdigest()[:10]}'
+
+    def chart_values(self) -> dict:
+        return {'vhostsConfigMap': self.config_map_name}
+
+    # The ConfigMap with the rendered file. Deploy the chart after it; the pods can't start without it.
+    def config_map(self, opts: ResourceOptions = None):
+        from pulumi_kubernetes.core.v1 import ConfigMap
+
+        # A changed file changes the name, which replaces the ConfigMap: the new one is created before the chart is
+        # updated, and the old one deleted at the end of the update.
+        return ConfigMap(CONFIG_MAP_PREFIX,
+            metadata={'name': self.config_map_name},
+            data={CONF_FILE: self.render()},
+            opts=opts)
@@ -0,0 +1,110 @@
+# Claims a free cluster from a pool of pre-provisioned clusters, instead of waiting for a new one.
+#
+# The pool is a base_cluster stack with clusterCount set to the pool size. It exports "clusters" (the cluster names)
+# and "kubeconfigs" (cluster name to kubeconfig). An app stack with the "clusterPool" config value set to the pool's
+# stack name claims one of those clusters with a ClusterClaim resource and deploys to it. Destroying the app stack
+# deletes the claim and so releases the cluster for the next stack.
+#
+# Claims are files in the "clusterPoolClaimsDir" directory, one per claimed cluster, created atomically so two stacks
+# can't claim the same cluster. Stacks only see each other's claims through that directory, so it must be on storage
+# every stack of the pool can reach, e.g. an Azure Files share mounted on every machine that runs `pulumi up`. A
+# directory in the checkout would let stacks on other machines claim the same clusters. It must already exist, so
+# that an unmounted share fails the claim instead of claiming into an empty local directory. A relative path is
+# relative to the project directory. The claim keeps it as given and the provider resolves it when it claims or
+# releases a cluster, so the stack's state doesn't depend on where the project is checked out.
+
+import datetime
+import json
+import os
+
+import pulumi
+from pulumi.dynamic import CreateResult, DiffResult, Resource, ResourceProvider, UpdateResult
+
+class ClusterClaimProvider(ResourceProvider):
+    # The provider runs in the project directory, like the program.
+    @staticmethod
+    def _claims_dir(props: dict) -> str:
+        return os.path.abspath(props['claims_dir'])
+
+    def _pool_dir(self, props: dict) -> str:
+        return os.path.join(self._claims_dir(props), props['pool'].replace('/', '_'))
+
+    def _path(self, props: dict, cluster: str) -> str:
+        return os.path.join(self._pool_dir(props), f'{cluster}.json')
+
+    def create(self, props: dict) -> CreateResult:
+        for cluster in props['clusters']:
+            path = self._path(props, cluster)
+            os.makedirs(self._pool_dir(props), exist_ok=True)
+            try:
+                # O_EXCL: fails if another stack holds the claim.
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                continue
+            with os.fdopen(fd, 'w') as f:
+                json.dump({
+                    'claimant': props['claimant'],
+                    'claimed_at': datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                }, f)
+            return CreateResult(id_=f'{props["pool"]}/{cluster}', outs={**props, 'cluster': cluster})
+        raise Exception(f'no free cluster in pool {props["pool"]}: all {len(props["clusters"])} are claimed '
+                        f'(see {self._pool_dir(props)}); grow the pool or destroy an app stack')
+
+    def diff(self, id: str, olds: dict, news: dict) -> DiffResult:
+        replaces = ['pool'] if olds.get('pool') != news.get('pool') else []
+        # Only another directory needs a new claim, not the same one written differently (e.g. an older claim's
+        # absolute path).
+        if self._claims_dir(olds) != self._claims_dir(news):
+            replaces.append('claims_dir')
+        # The claimed cluster was removed from the pool.
+        if olds.get('cluster') not in news['clusters']:
+            replaces.append('clusters')
+        # Release the old claim before claiming again, or a stack could hold the last free cluster twice.
+        changes = bool(replaces) or any(olds.get(key) != news[key] for key in ('clusters', 'claims_dir'))
+        return DiffResult(changes=changes, replaces=replaces, delete_before_replace=True)
+
+    def update(self, id: str, olds: dict, news: dict) -> UpdateResult:
+        return UpdateResult(outs={**news, 'cluster': olds['cluster']})
+
+    def delete(self, id: str, props: dict):
+        path = self._path(props, props['cluster'])
+        try:
+            with open(path) as f:
+                claimant = json.load(f).get('claimant')
+        except FileNotFoundError:
+            return
+        # Only release our own claim; the file may have been removed and the cluster claimed by another stack.
+        if claimant == props['claimant']:
+            os.remove(path)
+
+class ClusterClaim(Resource):
+    # Name of the claimed cluster, one of the pool's "clusters".
+    cluster: pulumi.Output[str]
+
+    def __init__(self,
+                 name: str,
+                 pool: str,
+                 clusters: pulumi.Input[list],
+                 # Shared directory of the pool's claims, absolute or relative to the project directory.
+                 claims_dir: str,
+                 opts: pulumi.ResourceOptions = None):
+
+        if not os.path.isdir(claims_dir):
+            raise ValueError(f"clusterPoolClaimsDir '{claims_dir}' isn't a directory; it must be a shared directory "
+                             f"(e.g. a mounted file share) that every stack claiming from the pool can reach")
+        super().__init__(ClusterClaimProvider(), name, {
+            'pool': pool,
+            'clusters': clusters,
+            'claims_dir': claims_dir,
+            'claimant': f'{pulumi.get_project()}/{pulumi.get_stack()}',
+            'cluster': None,
+        }, opts)
+
+# Claims a cluster from the pool stack. Returns the claimed cluster's name, kubeconfig and Kubernetes version (None if
+# the pool stack doesn't export it).
+def claim_cluster(pool: str, claims_dir: str) -> tuple:
+    pool_stack = pulumi.StackReference(pool)
+    claim = ClusterClaim('cluster-claim', pool, pool_stack.require_output('clusters'), claims_dir)
+    kubeconfig = pulumi.Output.all(pool_stack.require_output('kubeconfigs'), claim.cluster).apply(
+        lambda args: args[0][args[1]])
+    return claim.cluster, kubeconfig, pool_stack.get_output('k8sVersion')
@@ -0,0 +1,186 @@
+# An nginx ingress controller in front of apache that caches its responses, from the stack config.
+#
+# With the "ingress" config value set to true, the ingress-nginx chart is deployed next to apache and exposed through
+# its LoadBalancer Service instead of apache's; Apache_URL then points at the controller. Config values:
+# - ingressCacheSize: most disk space the cached responses take, as an nginx size, e.g. 512m, 2g (default 1g).
+# - ingressCacheTtl: how long a 200, 301 or 302 response is served from the cache, e.g. 30s, 10m (default 10m).
+# - ingressGzipLevel: gzip level of text responses, 1 to 9 (default 5).
+# - ingressKeepaliveConnections: idle keep-alive connections to apache each controller worker keeps (default 320).
+# - ingressReplicas: number of controller replicas (default the chart's, 1).
+#
+# A cache miss is fetched from apache once (proxy_cache_lock) and expired responses are served while being refreshed
+# in the background, so apache sees a trickle of requests for cacheable content however many clients ask for it.
+# Every response carries an X-Cache-Status header (HIT, MISS, EXPIRED, ...) to check the cache with.
+#
+# nginx proxies over HTTP/1.1 only, so connections to apache are kept alive as an HTTP/1.1 pool; HTTP/2 is on for
+# clients connecting over TLS.
+#
+# The cluster's Kubernetes version picks the chart version and the Ingress API: networking.k8s.io/v1 and a current
+# chart from Kubernetes 1.19 on, networking.k8s.io/v1beta1 and the last chart that supports it before.
+
+import re
+
+from pulumi import Config, ResourceOptions
+
+CHART = 'ingress-nginx'
+CHART_VERSION = '4.12.1'
+# The last chart version for clusters older than INGRESS_V1_SINCE.
+LEGACY_CHART_VERSION = '3.23.0'
+CHART_REPO = 'https://kubernetes.github.io/ingress-nginx'
+RELEASE_NAME = 'ingress-nginx'
+NAMESPACE = 'ingress-nginx'
+# The chart names the controller's LoadBalancer Service after the release.
+SERVICE_NAME = f'{RELEASE_NAME}-controller'
+
+# The nginx cache zone. Its keys take 10 MB of shared memory, enough for about 80,000 responses.
+CACHE_ZONE = 'apache-cache'
+CACHE_KEYS_SIZE = '10m'
+# The controller's file system is read-only but for /tmp.
+CACHE_PATH = f'/tmp/nginx-cache/{CACHE_ZONE}'
+
+DEFAULT_CACHE_SIZE = '1g'
+DEFAULT_CACHE_TTL = '10m'
+DEFAULT_GZIP_LEVEL = 5
+DEFAULT_KEEPALIVE_CONNECTIONS = 320
+
+GZIP_TYPES = 'text/html text/plain text/css text/xml application/javascript application/json image/svg+xml'
+
+# networking.k8s.io/v1 is served from Kubernetes 1.19 on; v1beta1, from 1.14 up to 1.21.
+INGRESS_V1_SINCE = (1, 19)
+
+def _ingress_v1(k8s_version: str) -> bool:
+    return tuple(int(part) for part in k8s_version.split('.')[:2]) >= INGRESS_V1_SINCE
+
+# The ingress-nginx chart version for the cluster's Kubernetes version.
+def chart_version(k8s_version: str) -> str:
+    return CHART_VERSION if _ingress_v1(k8s_version) else LEGACY_CHART_VERSION
+
+class IngressCache:
+    def __init__(self,
+                 cache_size: str = DEFAULT_CACHE_SIZE,
+                 cache_ttl: str = DEFAULT_CACHE_TTL,
+                 gzip_level: int = DEFAULT_GZIP_LEVEL,
+                 keepalive_connections: int = DEFAULT_KEEPALIVE_CONNECTIONS,
+                 replicas: int = None,
+                 ):
+
+        if not re.fullmatch(r'\d+[kKmMgG]?', cache_size):
+            raise ValueError(f"ingressCacheSize must be an nginx size like 512m or 2g, got '{cache_size}'")
+        if not re.fullmatch(r'\d+[smhd]?', cache_ttl):
+            raise ValueError(f"ingressCacheTtl must be an nginx time like 30s or 10m, got '{cache_ttl}'")
+        if not 1 <= gzip_level <= 9:
+            raise ValueError(f'ingressGzipLevel must be between 1 and 9, got {gzip_level}')
+        if keepalive_connections < 1:
+            raise ValueError(f'ingressKeepaliveConnections must be at least 1, got {keepalive_connections}')
+        if replicas is not None and replicas < 1:
+            raise ValueError(f'ingressReplicas must be at least 1, got {replicas}')
+
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.gzip_level = gzip_level
+        self.keepalive_connections = keepalive_connections
+        self.replicas = replicas
+
+    # None unless "ingress" is true, so apache is exposed directly.
+    @staticmethod
+    def from_config(config: Config) -> 'IngressCache':
+        if not config.get_bool('ingress'):
+            return None
+        return IngressCache(
+            cache_size=config.get('ingressCacheSize') or DEFAULT_CACHE_SIZE,
+            cache_ttl=config.get('ingressCacheTtl') or DEFAULT_CACHE_TTL,
+            gzip_level=config.get_int('ingressGzipLevel') or DEFAULT_GZIP_LEVEL,
+            keepalive_connections=config.get_int('ingressKeepaliveConnections') or DEFAULT_KEEPALIVE_CONNECTIONS,
+            replicas=config.get_int('ingressReplicas'),
+        )
+
+    # Values of the ingress-nginx chart (see chart_version()). The controller's ConfigMap settings are all strings.
+    def chart_values(self, k8s_version: str) -> dict:
+        controller = {
+            'config': {
+                # Declares the cache; the Ingress turns it on for apache (see ingress()).
+                'http-snippet': f'proxy_cache_path {CACHE_PATH} levels=1:2 keys_zone={CACHE_ZONE}:{CACHE_KEYS_SIZE} '
+                                f'max_size={self.cache_size} inactive={self.cache_ttl} use_temp_path=off;',
+                # nginx only caches buffered responses, and the controller doesn't buffer by default.
+                'proxy-buffering': 'on',
+                'use-gzip': 'true',
+                'gzip-level': str(self.gzip_level),
+                'gzip-types': GZIP_TYPES,
+                'use-http2': 'true',
+                'keep-alive-requests': '10000',
+                'upstream-keepalive-connections': str(self.keepalive_connections),
+                'upstream-keepalive-requests': '10000',
+                'upstream-keepalive-timeout': '60',
+            },
+        }
+        if _ingress_v1(k8s_version):
+            # Current controllers ignore snippet annotations unless told otherwise, and the Ingress needs one.
+            controller['allowSnippetAnnotations'] = True
+            controller['config']['annotations-risk-level'] = 'Critical'
+        if self.replicas is not None:
+            controller['replicaCount'] = self.replicas
+        return {'controller': controller}
+
+    # The controller's namespace. Deploy the chart after it.
+    def namespace(self, opts: ResourceOptions = None):
+        from pulumi_kubernetes.core.v1 import Namespace
+
+        return Namespace(NAMESPACE, metadata={'name': NAMESPACE}, opts=opts)
+
+    # The Ingress routing every path to the apache Service through the cache, in the API the cluster's Kubernetes
+    # version serves. The controller validates Ingresses through a webhook, so deploy it after the controller.
+    def ingress(self, service_name: str, k8s_version: str, service_port: int = 80, opts: ResourceOptions = None):
+        annotations = {
+            'nginx.ingress.kubernetes.io/configuration-snippet': '\n'.join([
+                f'proxy_cache {CACHE_ZONE};',
+                f'proxy_cache_valid 200 301 302 {self.cache_ttl};',
+                'proxy_cache_use_stale error timeout updating http_500 http_502 http_503 http_504;',
+                'proxy_cache_background_update on;',
+                'proxy_cache_lock on;',
+                'add_header X-Cache-Status $upstream_cache_status;',
+            ]),
+        }
+
+        if _ingress_v1(k8s_version):
+            from pulumi_kubernetes.networking.v1 import Ingress
+
+            return Ingress(f'{service_name}-ingress',
+                metadata={'annotations': annotations},
+                spec={
+                    # The chart's IngressClass.
+                    'ingress_class_name': 'nginx',
+                    'rules': [{
+                        'http': {
+                            'paths': [{
+                                'path': '/',
+                                'path_type': 'Prefix',
+                                'backend': {
+                                    'service': {
+                                        'name': service_name,
+                                        'port': {'number': service_port},
+                                    },
+                                },
+                            }],
+                        },
+                    }],
+                },
+                opts=opts)
+
+        from pulumi_kubernetes.networking.v1beta1 import Ingress
+
+        return Ingress(f'{service_name}-ingress',
+            metadata={'annotations': {'kubernetes.io/ingress.class': 'nginx', **annotations}},
+            spec={
+                'rules': [{
+                    'http': {
+                        'paths': [{
+                            'path': '/',
+                            'backend': {
+                                'service_name': service_name,
+                                'service_port': service_port,
+                            },
+                        }],
+                    },
+                }],
+            },
+            opts=opts)
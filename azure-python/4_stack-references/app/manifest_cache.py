@@ -0,0 +1,145 @@
+# Cache of rendered Helm chart manifests.
+# A Chart renders its templates ("helm template") on every preview and update, even when nothing changed,
+# which takes seconds and a lot of memory for larger charts.
+#
+# Entries are keyed by the chart digest, every option the chart is rendered with (release name, namespace, values,
+# API versions, ...) and the cluster's Kubernetes version, and hold the rendered objects as JSON.
+# When the cache grows past its size limit, the least recently used entries are evicted.
+#
+# CachedChart is a drop-in replacement for Chart that uses the cache. It registers the same component type and
+# child resource names as Chart, so a stack can switch between the two without replacing anything.
+#
+# To do that it reuses private parts of pulumi_kubernetes (the helm template invoke, _parse_yaml_document, _skip_await
+# and _utilities), so requirements.txt pins pulumi-kubernetes to the version they were checked against, and
+# tests/test_manifest_cache.py fails if they change. Check them again before raising the pin.
+
+import copy
+import hashlib
+import json
+import os
+import tempfile
+
+import pulumi
+from pulumi import ResourceOptions
+from pulumi_kubernetes.helm.v3 import Chart, LocalChartOpts
+from pulumi_kubernetes import _utilities
+# The same parser and skip-await transformation Chart uses to turn rendered objects into resources.
+from pulumi_kubernetes.yaml.yaml import _parse_yaml_document, _skip_await
+
+DEFAULT_CACHE_DIR = os.path.join('.cache', 'manifests')
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+class ManifestCache:
+    def __init__(self,
+                 cache_dir: str = None,
+                 max_bytes: int = DEFAULT_MAX_BYTES,
+                 # Only read entries, e.g. when the rendered objects may not match the key (offline previews).
+                 read_only: bool = False):
+
+        self.cache_dir = cache_dir or os.environ.get('MANIFEST_CACHE_DIR') or DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+        self.read_only = read_only
+
+    # json_opts are the chart options as the helm template invoke gets them (LocalChartOpts.to_json()). The chart's
+    # local path is left out: it differs between machines, and the digest already identifies the chart.
+    @staticmethod
+    def key(chart_digest: str, json_opts: str, k8s_version: str) -> str:
+        opts = {k: v for k, v in json.loads(json_opts).items() if k != 'path'}
+        opts_hash = hashlib.sha256(json.dumps(opts, sort_keys=True).encode()).hexdigest()
+        return hashlib.sha256(f'{chart_digest}\0{opts_hash}\0{k8s_version}'.encode()).hexdigest()
+
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                objects = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        # Touch the entry so eviction sees it as recently used.
+        os.utime(path)
+        return objects
+
+    def put(self, key: str, objects: list) -> list:
+        if self.read_only:
+            return objects
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(objects, f)
+        os.replace(tmp_path, self._path(key))
+        self._evict()
+        return objects
+
+    def _evict(self):
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.json'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{key}.json')
+
+class CachedChart(Chart):
+    def __init__(self,
+                 release_name: str,
+                 config: LocalChartOpts,
+                 # Digest of the chart archive (see ChartCache.fetch_with_digest) and the cluster's Kubernetes version,
+                 # e.g. the base_cluster stack's k8sVersion output.
+                 chart_digest: str,
+                 k8s_version: pulumi.Input[str],
+                 # Without a cache the chart is rendered on every run, like Chart does.
+                 cache: ManifestCache = None,
+                 # Called as invoke(token, args, opts) to render the chart. Defaults to pulumi.runtime.invoke_async.
+                 invoke=None,
+                 opts: ResourceOptions = None):
+
+        # Same component type, name, aliases and options as Chart.__init__, which is deliberately not called because
+        # it always renders the chart.
+        if config.resource_prefix:
+            release_name = f'{config.resource_prefix}-{release_name}'
+        pulumi.ComponentResource.__init__(self,
+            'kubernetes:helm.sh/v3:Chart',
+            release_name,
+            {},
+            ResourceOptions.merge(opts or ResourceOptions(),
+                ResourceOptions(aliases=[pulumi.Alias(type_='kubernetes:helm.sh/v2:Chart')])))
+
+        invoke = invoke or pulumi.runtime.invoke_async
+        config.release_name = release_name
+        invoke_opts = pulumi.InvokeOptions(parent=self, provider=opts.provider if opts else None,
+            version=(opts.version if opts else None) or _utilities.get_version())
+        transformations = list(config.transformations or [])
+        if config.skip_await:
+            transformations.append(_skip_await)
+
+        async def render(json_opts, key):
+            rendered = await invoke('kubernetes:helm:template', {'jsonOpts': json_opts}, invoke_opts)
+            objects = (rendered.get('result') or []) if rendered else []
+            # Nothing is rendered while the cluster isn't known yet (e.g. the first preview). Don't cache that.
+            return cache.put(key, objects) if cache and objects else objects
+
+        def get_objects(json_opts_and_version):
+            json_opts, version = json_opts_and_version
+            key = ManifestCache.key(chart_digest, json_opts, version)
+            objects = cache.get(key) if cache else None
+            if objects is None:
+                # "apply()" awaits the returned coroutine.
+                return render(json_opts, key)
+            return objects
+
+        objects = pulumi.Output.all(config.to_json(), k8s_version).apply(get_objects)
+
+        # Register the Kubernetes resources the same way Chart does. The objects are copied because the parser
+        # modifies them.
+        self.resources = objects.apply(lambda objs: _parse_yaml_document(
+            copy.deepcopy(objs), ResourceOptions(parent=self), transformations))
+        self.register_outputs({'resources': self.resources})
+        self.ready = self.resources.apply(lambda x: list(x.values()))
@@ -1,20 +1,25 @@
 ## Exercise 1: See the `app` directory.
 
 import pulumi
-from pulumi import Config, ResourceOptions
-from pulumi_azure_native import resources
-import pulumi_random as random
+from pulumi import ResourceOptions
 
 import cluster
+import preflight
+import settings
 
-# Config values or defaults
-config = Config()
-k8s_version = config.get('k8sVersion') or '1.18.14'
-admin_username = config.get('adminUserName') or 'testuser'
-node_count = config.get_int('nodeCount') or 2
-node_size = config.get('nodeSize') or 'Standard_D2_v2'
-password = config.get_secret("password")
-if not password:
+# Config values or defaults, checked before anything is declared. See settings.py for every config value.
+settings = settings.load()
+# Check the Kubernetes version, VM sizes and quotas against the catalog (see preflight.py).
+# An adopted cluster already exists, so there is nothing to check.
+preflight_vcpus = {}
+if settings.preflight and not settings.adopt_cluster_name:
+    preflight_vcpus = preflight.check(settings)
+
+password = settings.password
+# Only the service principal identity of a new cluster needs a password.
+if not password and settings.identity_type == 'ServicePrincipal' and not settings.adopt_cluster_name:
+    # Provider packages are slow to import, so only load the ones this configuration uses.
+    import pulumi_random as random
     rando_password=random.RandomPassword('password',
         length=16,
         special=True,
@@ -22,18 +27,46 @@ if not password:
         )
     password=rando_password.result 
 
-# Resource Group
-resource_group = resources.ResourceGroup('rg')
-
-# Create a cluster resource using our custom component resource class
-cluster = cluster.Cluster('k8scluster', cluster.ClusterArgs(
-    resource_group_name=resource_group.name,
-    password=password,
-    node_count=node_count,
-    node_size=node_size,
-    k8s_version=k8s_version,
-    admin_username=admin_username,
-))
-
-# Export the kubeconfig 
-pulumi.export("kubeconfig", cluster.kubeconfig)
\ No newline at end of file
+cluster_args = cluster.ClusterArgs.from_settings(settings, resource_group_name=None, password=password)
+
+if settings.cluster_count > 1 or settings.fleet_regions:
+    import fleet
+
+    # Create a fleet of clusters using our custom component resource class
+    cluster_fleet = fleet.ClusterFleet('k8sfleet', fleet.ClusterFleetArgs(
+        cluster_count=settings.cluster_count,
+        regions=settings.fleet_regions,
+        cluster_args=cluster_args,
+    ))
+
+    # Export every kubeconfig, plus the first one under the name the app stack references.
+    # An app stack can also claim any one of the clusters, using the fleet as a pool (see app/cluster_claim.py).
+    pulumi.export("clusters", cluster_fleet.cluster_names)
+    pulumi.export("kubeconfigs", cluster_fleet.kubeconfigs)
+    pulumi.export("kubeconfig", cluster_fleet.clusters[0].kubeconfig)
+    pulumi.export("k8sVersion", cluster_fleet.k8s_version)
+    # Once the clusters exist, their vCPUs are part of the quota usage the next preflight check sees.
+    preflight.record_usage(preflight_vcpus, pulumi.Output.all(*[c.kubeconfig for c in cluster_fleet.clusters]))
+elif settings.adopt_cluster_name:
+    # Adopt the existing cluster: no resource group or cluster is created, the app stack just gets its kubeconfig.
+    cluster_args.resource_group_name = settings.adopt_resource_group_name
+    cluster = cluster.Cluster('k8scluster', cluster_args)
+
+    pulumi.export("kubeconfig", cluster.kubeconfig)
+    pulumi.export("k8sVersion", cluster.k8s_version)
+else:
+    from pulumi_azure_native import resources
+
+    # Resource Group
+    resource_group = resources.ResourceGroup('rg')
+    cluster_args.resource_group_name = resource_group.name
+
+    # Create a cluster resource using our custom component resource class
+    cluster = cluster.Cluster('k8scluster', cluster_args)
+
+    # Export the kubeconfig 
+    pulumi.export("kubeconfig", cluster.kubeconfig)
+    # The app stack renders its chart for this version (see app/apache.py).
+    pulumi.export("k8sVersion", cluster.k8s_version)
+    # Once the cluster exists, its vCPUs are part of the quota usage the next preflight check sees.
+    preflight.record_usage(preflight_vcpus, cluster.kubeconfig)
@@ -3,29 +3,14 @@
 
 import pulumi
 from pulumi import ComponentResource, ResourceOptions
-from pulumi_tls import PrivateKey
-import pulumi_azuread as azuread
-from pulumi_azure_native import containerservice
-import base64
 
-class ClusterArgs:
-    def __init__(self,
-                 # name the arguments and their types (e.g. str, bool, etc)
-                 resource_group_name: str,
-                 password:str,
-                 node_count:int,
-                 node_size:str,
-                 k8s_version:str,
-                 admin_username: str,
-                 ):
-
-        # Set the class args
-        self.resource_group_name = resource_group_name
-        self.password = password
-        self.node_count = node_count
-        self.node_size = node_size
-        self.k8s_version = k8s_version
-        self.admin_username = admin_username
+from creds_cache import get_kubeconfig
+# The argument classes live in cluster_args.py. ClusterArgs and NodePoolArgs are also used as cluster.ClusterArgs and
+# cluster.NodePoolArgs.
+from cluster_args import IDENTITY_TYPES, ClusterArgs, NodePoolArgs
+
+# Resource ID of a cluster, for adopting it.
+CLUSTER_ID = '/subscriptions/{}/resourceGroups/{}/providers/Microsoft.ContainerService/managedClusters/{}'
 
 class Cluster(ComponentResource):
     def __init__(self,
@@ -43,38 +28,115 @@ class Cluster(ComponentResource):
         # self.rg_name = resource_group.name
 
         ### AKS Cluster Related Resources
+        if args.adopt_cluster_name:
+            # Reading an existing cluster takes seconds, creating one 10 minutes or more.
+            k8s_cluster = self._adopt_cluster(name, args)
+            # Wait for the read, so a missing cluster is reported there rather than by the credentials call.
+            cluster_name = k8s_cluster.id.apply(lambda _: args.adopt_cluster_name)
+        else:
+            k8s_cluster = self._create_cluster(name, args)
+            cluster_name = k8s_cluster.name
+
+        # Obtaining the kubeconfig from an Azure K8s cluster requires using the "list_managed_clsuter_user_credentials"
+        # function, which get_kubeconfig() only calls when the decoded kubeconfig isn't cached on disk.
+        kubeconfig = get_kubeconfig(args.resource_group_name, cluster_name,
+            creds_version=args.creds_version,
+            ttl=args.creds_cache_ttl,
+            offline_preview=args.offline_preview)
+
+        # The version the cluster runs, which for an adopted cluster may not be k8s_version.
+        self.k8s_version = k8s_cluster.kubernetes_version
+
+        # Mark the kubeconfig as a secret so Pulumi treats it accordingly.
+        self.kubeconfig = pulumi.Output.secret(kubeconfig)
+        ### End of Cluster Related Resources
+
+        # End with this. It is used for display purposes.
+        self.register_outputs({})
+
+    # The provider packages are imported in the methods rather than at the top of the module so that code which only
+    # needs the argument classes (e.g. to validate config) doesn't pay for loading them.
+    def _create_cluster(self, name: str, args: ClusterArgs):
+        from pulumi_tls import PrivateKey
+        from pulumi_azure_native import containerservice
+
+        if args.identity_type not in IDENTITY_TYPES:
+            raise ValueError(f"identity_type must be one of {', '.join(IDENTITY_TYPES)}, got '{args.identity_type}'")
+
         generated_key_pair = PrivateKey(f'{name}-ssh-key',
             algorithm='RSA', rsa_bits=4096, opts=ResourceOptions(parent=self))
         ssh_public_key = generated_key_pair.public_key_openssh
 
-        ad_app = azuread.Application('app', display_name='app', opts=ResourceOptions(parent=self))
-        ad_sp = azuread.ServicePrincipal('service-principal',
-            application_id=ad_app.application_id,
-            opts=ResourceOptions(parent=self))
-        ad_sp_password = azuread.ServicePrincipalPassword('sp-pwd',
-            service_principal_id=ad_sp.id,
-            value=args.password,
-            end_date='2099-01-01T00:00:00Z',
-            opts=ResourceOptions(parent=self))
+        service_principal_profile = None
+        identity = None
+        if args.identity_type == 'ServicePrincipal':
+            import pulumi_azuread as azuread
 
-        k8s_cluster = containerservice.ManagedCluster(f'{name}-k8s',
+            # Child names are prefixed with the component name so several clusters can live in one stack.
+            # The aliases keep stacks created with the original, unprefixed names from replacing these resources.
+            ad_app = azuread.Application(f'{name}-app', display_name=f'{name}-app',
+                opts=ResourceOptions(parent=self, aliases=[pulumi.Alias(name='app')]))
+            ad_sp = azuread.ServicePrincipal(f'{name}-service-principal',
+                application_id=ad_app.application_id,
+                opts=ResourceOptions(parent=self, aliases=[pulumi.Alias(name='service-principal')]))
+            ad_sp_password = azuread.ServicePrincipalPassword(f'{name}-sp-pwd',
+                service_principal_id=ad_sp.id,
+                value=args.password,
+                end_date='2099-01-01T00:00:00Z',
+                opts=ResourceOptions(parent=self, aliases=[pulumi.Alias(name='sp-pwd')]))
+            service_principal_profile = {
+                'client_id': ad_app.application_id,
+                'secret': ad_sp_password.value,
+            }
+        elif args.identity_type == 'SystemAssigned':
+            identity = {'type': 'SystemAssigned'}
+        else:
+            identity_id = args.user_assigned_identity_id
+            if identity_id is None:
+                from pulumi_azure_native import managedidentity
+
+                identity_id = managedidentity.UserAssignedIdentity(f'{name}-identity',
+                    resource_group_name=args.resource_group_name,
+                    location=args.location,
+                    opts=ResourceOptions(parent=self)).id
+            identity = {
+                'type': 'UserAssigned',
+                # A map of identity resource ID to an empty object.
+                'user_assigned_identities': pulumi.Output.from_input(identity_id).apply(lambda id: {id: {}}),
+            }
+
+        agent_pool_profiles = [{
+            'count': pool.count,
+            'enable_auto_scaling': pool.enable_auto_scaling,
+            'max_count': pool.max_count,
+            'max_pods': pool.max_pods,
+            'min_count': pool.min_count,
+            'mode': pool.mode,
+            'name': pool.name,
+            'node_labels': {},
+            'os_disk_size_gb': pool.os_disk_size_gb,
+            'os_type': 'Linux',
+            'type': 'VirtualMachineScaleSets',
+            'vm_size': pool.vm_size,
+        } for pool in args.node_pools]
+
+        auto_scaler_profile = None
+        if any(pool.enable_auto_scaling for pool in args.node_pools):
+            auto_scaler_profile = {
+                'scan_interval': args.autoscaler_scan_interval,
+                'scale_down_delay_after_add': args.autoscaler_scale_down_delay,
+            }
+
+        return containerservice.ManagedCluster(f'{name}-k8s',
             resource_group_name=args.resource_group_name,
+            location=args.location,
             addon_profiles={
                 'KubeDashboard': {
                     'enabled': True,
                 },
             },
-            agent_pool_profiles=[{
-                'count': args.node_count,
-                'max_pods': 20,
-                'mode': 'System',
-                'name': 'agentpool',
-                'node_labels': {},
-                'os_disk_size_gb': 30,
-                'os_type': 'Linux',
-                'type': 'VirtualMachineScaleSets',
-                'vm_size': args.node_size,
-            }],
+            agent_pool_profiles=agent_pool_profiles,
+            auto_scaler_profile=auto_scaler_profile,
             dns_prefix=args.resource_group_name,
             enable_rbac=True,
             kubernetes_version=args.k8s_version,
@@ -86,28 +148,20 @@ class Cluster(ComponentResource):
                     }],
                 },
             },
-            node_resource_group='node-resource-group',
-            service_principal_profile={
-                'client_id': ad_app.application_id,
-                'secret': ad_sp_password.value,
-            },
+            node_resource_group=args.node_resource_group,
+            identity=identity,
+            service_principal_profile=service_principal_profile,
             opts=ResourceOptions(parent=self))
 
-        # Obtaining the kubeconfig from an Azure K8s cluster requires using the "list_managed_clsuter_user_credentials"
-        # function.
-        # That function requires passing values that are not be known until the resources are created.
-        # Thus, the use of "apply()" to wait for those values before calling the function.
-        creds = pulumi.Output.all(args.resource_group_name, k8s_cluster.name).apply(
-            lambda args:
-            containerservice.list_managed_cluster_user_credentials(
-                resource_group_name=args[0],
-                resource_name=args[1]))
-
-        # The "list_managed_cluster_user_credentials" function returns an array of base64 encoded kubeconfigs.
-        # So decode the kubeconfig for our cluster but mark it as a secret so Pulumi treats it accordingly.
-        self.kubeconfig = pulumi.Output.secret(creds.kubeconfigs[0].value.apply(
-            lambda enc: base64.b64decode(enc).decode()))
-        ### End of Cluster Related Resources
+    # Reads the existing cluster into the stack. Its resource ID needs the subscription, which comes from the
+    # provider's credentials.
+    def _adopt_cluster(self, name: str, args: ClusterArgs):
+        from pulumi_azure_native import containerservice
 
-        # End with this. It is used for display purposes.
-        self.register_outputs({})
+        async def cluster_id(resource_group_name, cluster_name):
+            client_config = await pulumi.runtime.invoke_async('azure-native:authorization:getClientConfig', {})
+            return CLUSTER_ID.format(client_config['subscriptionId'], resource_group_name, cluster_name)
+
+        return containerservice.ManagedCluster.get(f'{name}-k8s',
+            pulumi.Output.all(args.resource_group_name, args.adopt_cluster_name).apply(lambda a: cluster_id(*a)),
+            opts=ResourceOptions(parent=self))
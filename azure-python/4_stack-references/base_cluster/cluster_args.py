@@ -0,0 +1,124 @@
+# The arguments of the Cluster component (see cluster.py).
+#
+# They import no provider package, so code that only needs them, like settings.py, loads quickly. The stage 2 and 3
+# programs share settings.py, and their own cluster.py would hide this directory's from them.
+
+import pulumi
+
+from creds_cache import DEFAULT_TTL
+
+# How the cluster authenticates to Azure to manage its own resources (load balancers, disks, ...):
+# - ServicePrincipal: an AD application, service principal and password created per cluster.
+# - SystemAssigned: a managed identity Azure creates with the cluster.
+# - UserAssigned: a managed identity created beforehand (or by the component), which survives cluster rebuilds.
+# The managed identities need no AD calls or password, which takes several slow, eventually consistent steps
+# off the path to creating the cluster.
+IDENTITY_TYPES = ('ServicePrincipal', 'SystemAssigned', 'UserAssigned')
+
+# The node resource group of a single cluster, as the workshop has always named it.
+DEFAULT_NODE_RESOURCE_GROUP = 'node-resource-group'
+
+class NodePoolArgs:
+    def __init__(self,
+                 name: str,
+                 vm_size: str,
+                 # 'System' pools run the cluster's own pods. Every cluster needs at least one. Workloads go on 'User' pools.
+                 mode: str = 'User',
+                 count: int = 1,
+                 # Setting both min_count and max_count turns on the cluster autoscaler for the pool.
+                 # count is then the starting size.
+                 min_count: int = None,
+                 max_count: int = None,
+                 max_pods: int = 20,
+                 os_disk_size_gb: int = 30,
+                 ):
+
+        self.name = name
+        self.vm_size = vm_size
+        self.mode = mode
+        self.count = count
+        self.min_count = min_count
+        self.max_count = max_count
+        self.max_pods = max_pods
+        self.os_disk_size_gb = os_disk_size_gb
+
+    @property
+    def enable_auto_scaling(self) -> bool:
+        return self.min_count is not None and self.max_count is not None
+
+class ClusterArgs:
+    def __init__(self,
+                 # name the arguments and their types (e.g. str, bool, etc)
+                 resource_group_name: str,
+                 # Only used by the ServicePrincipal identity.
+                 password:str,
+                 node_count:int,
+                 node_size:str,
+                 k8s_version:str,
+                 admin_username: str,
+                 location: str = None,
+                 # Node pools. Defaults to a single system pool of node_count x node_size.
+                 node_pools: list = None,
+                 max_pods: int = 20,
+                 # Cluster autoscaler tuning, e.g. '10s' and '10m'. Only used when a pool autoscales.
+                 autoscaler_scan_interval: str = None,
+                 autoscaler_scale_down_delay: str = None,
+                 creds_version: str = '1',
+                 creds_cache_ttl: int = DEFAULT_TTL,
+                 # Previews use a placeholder kubeconfig instead of fetching credentials (see creds_cache.py).
+                 offline_preview: bool = False,
+                 # One of IDENTITY_TYPES.
+                 identity_type: str = 'ServicePrincipal',
+                 # Resource ID of the identity for UserAssigned. Without one the component creates an identity.
+                 user_assigned_identity_id: str = None,
+                 # Adopt this existing cluster in resource_group_name instead of creating one. The cluster is read into
+                 # the stack, not managed by it: the other arguments are ignored and destroying the stack leaves it be.
+                 adopt_cluster_name: str = None,
+                 # Resource group Azure puts the cluster's VMs, disks and load balancers in. It must be unique per
+                 # subscription, so several clusters need a name each (see ClusterFleet).
+                 # Changing it replaces the cluster.
+                 node_resource_group: pulumi.Input[str] = DEFAULT_NODE_RESOURCE_GROUP,
+                 ):
+
+        # Set the class args
+        self.resource_group_name = resource_group_name
+        self.password = password
+        self.node_count = node_count
+        self.node_size = node_size
+        self.k8s_version = k8s_version
+        self.admin_username = admin_username
+        self.location = location
+        self.node_pools = node_pools or [NodePoolArgs('agentpool', node_size,
+            mode='System', count=node_count, max_pods=max_pods)]
+        self.autoscaler_scan_interval = autoscaler_scan_interval
+        self.autoscaler_scale_down_delay = autoscaler_scale_down_delay
+        self.creds_version = creds_version
+        self.creds_cache_ttl = creds_cache_ttl
+        self.offline_preview = offline_preview
+        self.identity_type = identity_type
+        self.user_assigned_identity_id = user_assigned_identity_id
+        self.adopt_cluster_name = adopt_cluster_name
+        self.node_resource_group = node_resource_group
+
+    # Cluster arguments from the validated stack config (see settings.py).
+    @staticmethod
+    def from_settings(settings, resource_group_name: str, password: str, location: str = None) -> 'ClusterArgs':
+        return ClusterArgs(
+            resource_group_name=resource_group_name,
+            password=password,
+            node_count=settings.node_count,
+            node_size=settings.node_size,
+            k8s_version=settings.k8s_version,
+            admin_username=settings.admin_username,
+            location=location,
+            node_pools=settings.node_pools,
+            max_pods=settings.max_pods,
+            autoscaler_scan_interval=settings.autoscaler_scan_interval,
+            autoscaler_scale_down_delay=settings.autoscaler_scale_down_delay,
+            creds_version=settings.creds_version,
+            creds_cache_ttl=settings.creds_cache_ttl,
+            offline_preview=settings.offline_preview,
+            identity_type=settings.identity_type,
+            user_assigned_identity_id=settings.user_assigned_identity_id,
+            adopt_cluster_name=settings.adopt_cluster_name,
+        )
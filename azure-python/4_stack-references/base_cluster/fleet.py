@@ -0,0 +1,66 @@
+# A component resource that spreads N "Cluster" instances across regions in a single stack.
+# Each region gets its own resource group and the clusters are assigned to the regions round-robin.
+#
+# Nothing here waits on a cluster: the constructors only declare resources, so the engine registers and creates
+# all of the clusters concurrently.
+
+import copy
+
+import pulumi
+from pulumi import ComponentResource, ResourceOptions
+from pulumi_azure_native import resources
+
+from cluster import Cluster, ClusterArgs
+
+class ClusterFleetArgs:
+    def __init__(self,
+                 cluster_count: int,
+                 regions: list,
+                 # Settings shared by every cluster. Its resource_group_name and location are set per region.
+                 cluster_args: ClusterArgs,
+                 ):
+
+        self.cluster_count = cluster_count
+        self.regions = regions
+        self.cluster_args = cluster_args
+
+class ClusterFleet(ComponentResource):
+    def __init__(self,
+                 name: str,
+                 args: ClusterFleetArgs,
+                 opts: ResourceOptions = None):
+
+        super().__init__('custom:resource:ClusterFleet', name, {}, opts)
+
+        if args.cluster_count < 1:
+            raise ValueError(f'cluster_count must be at least 1, got {args.cluster_count}')
+        # An empty region list means every cluster goes in the provider's default location.
+        regions = args.regions or [None]
+
+        resource_groups = {}
+        for region in regions[:args.cluster_count]:
+            rg_name = f'{name}-rg-{region}' if region else f'{name}-rg'
+            resource_groups[region] = resources.ResourceGroup(rg_name,
+                location=region,
+                opts=ResourceOptions(parent=self))
+
+        self.clusters = []
+        kubeconfigs = {}
+        for i in range(args.cluster_count):
+            region = regions[i % len(regions)]
+            cluster_args = copy.copy(args.cluster_args)
+            cluster_args.resource_group_name = resource_groups[region].name
+            cluster_args.location = region
+            # Node resource groups are unique per subscription, so each cluster's is derived from its resource group.
+            cluster_args.node_resource_group = pulumi.Output.concat(resource_groups[region].name, f'-{name}-{i}-nodes')
+            cluster = Cluster(f'{name}-{i}', cluster_args, opts=ResourceOptions(parent=self))
+            self.clusters.append(cluster)
+            kubeconfigs[f'{name}-{i}'] = cluster.kubeconfig
+
+        self.cluster_names = list(kubeconfigs)
+        # The clusters share their settings, so they run the same Kubernetes version.
+        self.k8s_version = self.clusters[0].k8s_version
+        # Map of cluster name to kubeconfig.
+        self.kubeconfigs = pulumi.Output.secret(kubeconfigs)
+
+        self.register_outputs({})
@@ -0,0 +1,212 @@
+# Preflight checks of the cluster settings against a catalog of what each Azure region supports. Opt in with the
+# "preflight" config value.
+#
+# An unsupported Kubernetes version or VM size, or a node pool that doesn't fit the subscription's vCPU quota, is
+# otherwise only reported by Azure when the ManagedCluster is created, after the AD application and service
+# principal already exist. check() runs before any resource is declared and raises one error listing every problem.
+#
+# The catalog is a JSON file of Kubernetes versions, VM sizes (family, vCPUs and memory) and vCPU quotas per region.
+# Refresh it for your subscription when online (needs the Azure CLI, logged in):
+#   python preflight.py refresh eastus westus2
+# The refreshed catalog is written to .cache/catalog.json. PREFLIGHT_CATALOG points at another catalog file.
+#
+# Without a refreshed catalog, the snapshot that ships with the program (catalog.json) is used. It has no quotas,
+# and it is older than the versions and sizes Azure offers today, so with it, or any catalog older than MAX_AGE_DAYS,
+# an unknown version or VM size is only a warning.
+#
+# A refreshed catalog's quota usage includes the vCPUs of this stack's clusters as they were at refresh time, which an
+# update replaces rather than adds to. After an update, record_usage() notes the vCPUs the stack's node pools may
+# use (in .cache/preflight-<stack>.json), and check() subtracts them from the usage of catalogs refreshed since.
+
+import datetime
+import json
+import os
+import subprocess
+import sys
+
+import pulumi
+
+from cluster import ClusterArgs
+
+SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'catalog.json')
+REFRESHED_PATH = os.path.join('.cache', 'catalog.json')
+USAGE_PATH = os.path.join('.cache', 'preflight-{stack}.json')
+# Warn when the catalog is older than this.
+MAX_AGE_DAYS = 90
+
+# AKS requires system pool nodes with at least 2 vCPUs and 4 GB of memory.
+SYSTEM_POOL_MIN_VCPUS = 2
+SYSTEM_POOL_MIN_MEMORY_GB = 4
+
+def catalog_path() -> str:
+    if os.environ.get('PREFLIGHT_CATALOG'):
+        return os.environ['PREFLIGHT_CATALOG']
+    return REFRESHED_PATH if os.path.exists(REFRESHED_PATH) else SNAPSHOT_PATH
+
+def load_catalog(path: str = None) -> dict:
+    with open(path or catalog_path()) as f:
+        return json.load(f)
+
+# Whether the catalog may be missing versions and VM sizes Azure offers today.
+def is_stale(catalog: dict) -> bool:
+    fetched_at = datetime.datetime.fromisoformat(catalog['fetched_at'].replace('Z', '+00:00'))
+    age = datetime.datetime.now(datetime.timezone.utc) - fetched_at
+    return catalog.get('source') == 'snapshot' or age.days > MAX_AGE_DAYS
+
+# The vCPUs the stack's node pools used, by region and quota family, when they were last deployed, if that was before
+# the catalog was refreshed (and so is included in its usage). Empty otherwise.
+def own_usage(catalog: dict, stack: str = None) -> dict:
+    try:
+        with open(USAGE_PATH.format(stack=stack or pulumi.get_stack())) as f:
+            usage = json.load(f)
+    except FileNotFoundError:
+        return {}
+    if usage['recorded_at'] > catalog['fetched_at']:
+        return {}
+    return usage['vcpus']
+
+# Notes the vCPUs the stack's node pools may use (see check()) once `after` resolves, i.e. once the clusters exist.
+def record_usage(vcpus: dict, after: pulumi.Output, stack: str = None):
+    if not vcpus or pulumi.runtime.is_dry_run():
+        return
+
+    def write(_):
+        path = USAGE_PATH.format(stack=stack or pulumi.get_stack())
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({'recorded_at': datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                       'vcpus': vcpus}, f, indent=2)
+
+    after.apply(write)
+
+# Region -> number of clusters, placed the same way as ClusterFleet places them.
+def clusters_per_region(settings) -> dict:
+    regions = settings.fleet_regions or [settings.location]
+    counts = {}
+    for i in range(settings.cluster_count):
+        region = regions[i % len(regions)]
+        counts[region] = counts.get(region, 0) + 1
+    return counts
+
+# Returns the problems that fail the checks, the ones that are only warnings with this catalog, and the vCPUs the
+# node pools may use by region and quota family.
+def problems(settings, catalog: dict, own: dict = None) -> tuple:
+    found = []
+    warnings = []
+    vcpus = {}
+    # Availability in a stale catalog may be out of date, so it only warns.
+    unavailable = warnings if is_stale(catalog) else found
+    own = own or {}
+    pools = ClusterArgs.from_settings(settings, resource_group_name=None, password=None).node_pools
+    for region, clusters in clusters_per_region(settings).items():
+        if region is None:
+            pulumi.log.warn('preflight: no region set (azure-native:location), so regional checks are skipped')
+            continue
+        region = region.lower().replace(' ', '')
+        entry = catalog['regions'].get(region)
+        if entry is None:
+            pulumi.log.warn(f"preflight: region '{region}' is not in the catalog; refresh it with "
+                            f"`python preflight.py refresh {region}`")
+            continue
+
+        versions = entry['kubernetes_versions']
+        if settings.k8s_version not in versions:
+            unavailable.append(f"k8sVersion {settings.k8s_version} isn't available in {region}; "
+                         f"available: {', '.join(versions)}")
+
+        # vCPUs needed per quota family, counting autoscaling pools at their maximum size.
+        cores = {}
+        for pool in pools:
+            size = entry['vm_sizes'].get(pool.vm_size)
+            if size is None:
+                unavailable.append(f"node pool '{pool.name}': VM size {pool.vm_size} isn't available in {region}")
+                continue
+            if pool.mode == 'System' and (size['vcpus'] < SYSTEM_POOL_MIN_VCPUS
+                                          or size['memory_gb'] < SYSTEM_POOL_MIN_MEMORY_GB):
+                found.append(f"node pool '{pool.name}': system pools need at least {SYSTEM_POOL_MIN_VCPUS} vCPUs and "
+                             f"{SYSTEM_POOL_MIN_MEMORY_GB} GB of memory, {pool.vm_size} has {size['vcpus']} and "
+                             f"{size['memory_gb']} GB")
+            nodes = pool.max_count if pool.enable_auto_scaling else pool.count
+            needed = clusters * nodes * size['vcpus']
+            cores[size['family']] = cores.get(size['family'], 0) + needed
+            cores['cores'] = cores.get('cores', 0) + needed
+        vcpus[region] = cores
+
+        for family, needed in sorted(cores.items()):
+            quota = entry.get('quota', {}).get(family)
+            if quota is None:
+                continue
+            # The stack's current nodes are replaced, not added to, so their vCPUs count as available.
+            ours = min(own.get(region, {}).get(family, 0), quota['used'])
+            available = quota['limit'] - quota['used'] + ours
+            if needed > available:
+                what = 'total regional vCPUs' if family == 'cores' else f'{family} vCPUs'
+                used = f'{quota["used"]} of {quota["limit"]} used' + (f', {ours} by this stack' if ours else '')
+                found.append(f'{region} needs {needed} {what} but the quota has {available} left ({used})')
+    return found, warnings, vcpus
+
+# Returns the vCPUs the node pools may use by region and quota family, for record_usage().
+def check(settings, catalog: dict = None) -> dict:
+    path = catalog_path()
+    if catalog is None:
+        try:
+            catalog = load_catalog(path)
+        except FileNotFoundError:
+            pulumi.log.warn(f'preflight: no catalog at {path}, skipping the checks')
+            return {}
+
+    if is_stale(catalog):
+        pulumi.log.warn(f'preflight: the catalog ({path}) is a snapshot or older than {MAX_AGE_DAYS} days, so '
+                        f'unknown versions and VM sizes are only warnings; refresh it with '
+                        f'`python preflight.py refresh <region> ...`')
+
+    found, warnings, vcpus = problems(settings, catalog, own_usage(catalog))
+    for warning in warnings:
+        pulumi.log.warn(f'preflight: {warning}')
+    if found:
+        raise ValueError(f'preflight checks failed (catalog: {path}, set preflight to false to skip):\n' +
+                         '\n'.join(f'  - {p}' for p in found))
+    return vcpus
+
+def _az(*args):
+    return json.loads(subprocess.run(['az', *args, '--output', 'json'],
+                                     check=True, capture_output=True, text=True).stdout)
+
+# Builds a catalog for the regions from the Azure CLI.
+def refresh(regions: list, path: str = REFRESHED_PATH) -> dict:
+    catalog = {
+        'source': 'az',
+        'fetched_at': datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'regions': {},
+    }
+    for region in regions:
+        versions = _az('aks', 'get-versions', '--location', region)['orchestrators']
+        skus = _az('vm', 'list-skus', '--location', region, '--resource-type', 'virtualMachines', '--all', 'false')
+        usages = _az('vm', 'list-usage', '--location', region)
+
+        vm_sizes = {}
+        for sku in skus:
+            capabilities = {c['name']: c['value'] for c in sku.get('capabilities', [])}
+            vm_sizes[sku['name']] = {
+                'family': sku['family'],
+                'vcpus': int(capabilities.get('vCPUs', 0)),
+                'memory_gb': float(capabilities.get('MemoryGB', 0)),
+            }
+        catalog['regions'][region] = {
+            'kubernetes_versions': sorted({o['orchestratorVersion'] for o in versions},
+                                          key=lambda v: [int(p) for p in v.split('.')]),
+            'vm_sizes': vm_sizes,
+            'quota': {u['name']['value']: {'limit': int(u['limit']), 'used': int(u['currentValue'])} for u in usages},
+        }
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(catalog, f, indent=2)
+    return catalog
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3 or sys.argv[1] != 'refresh':
+        sys.exit('usage: python preflight.py refresh <region> [<region> ...]')
+    refreshed = refresh(sys.argv[2:])
+    for name, region in refreshed['regions'].items():
+        print(f'{name}: {len(region["kubernetes_versions"])} Kubernetes versions, {len(region["vm_sizes"])} VM sizes')
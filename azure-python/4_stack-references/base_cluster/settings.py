@@ -0,0 +1,207 @@
+# The base_cluster stack config, read once and checked before any resource is declared.
+#
+# Bad values otherwise only show up once Azure rejects them, minutes into an update. load() reads every config value,
+# checks its type and range, and raises one error listing every problem it found. The result is cached, so modules
+# that need the settings can call load() without reading the config again.
+
+import functools
+import re
+
+from pulumi import Config
+from pulumi.config import ConfigTypeError
+
+from cluster_args import IDENTITY_TYPES, NodePoolArgs
+from creds_cache import DEFAULT_TTL
+
+NODE_POOL_MODES = ('System', 'User')
+# AKS node pool names: lowercase letters and digits, starting with a letter, at most 12 characters.
+NODE_POOL_NAME = re.compile(r'^[a-z][a-z0-9]{0,11}$')
+K8S_VERSION = re.compile(r'^\d+\.\d+(\.\d+)?$')
+ADMIN_USERNAME = re.compile(r'^[a-z_][a-z0-9_-]{0,31}$')
+# Cluster autoscaler durations, e.g. '10s', '10m' or '1h'.
+DURATION = re.compile(r'^\d+[smh]$')
+
+class Settings:
+    __slots__ = (
+        'k8s_version',
+        'admin_username',
+        'node_count',
+        'node_size',
+        'max_pods',
+        'node_pools',
+        'autoscaler_scan_interval',
+        'autoscaler_scale_down_delay',
+        'creds_version',
+        'creds_cache_ttl',
+        'cluster_count',
+        'fleet_regions',
+        'location',
+        'preflight',
+        'offline_preview',
+        'identity_type',
+        'user_assigned_identity_id',
+        'adopt_cluster_name',
+        'adopt_resource_group_name',
+        'password',
+    )
+
+    k8s_version: str
+    admin_username: str
+    node_count: int
+    node_size: str
+    max_pods: int
+    # NodePoolArgs. Empty for the default single system pool.
+    node_pools: list
+    autoscaler_scan_interval: str
+    autoscaler_scale_down_delay: str
+    creds_version: str
+    creds_cache_ttl: int
+    cluster_count: int
+    fleet_regions: list
+    # The provider's default region (azure-native:location), where a single cluster is created.
+    location: str
+    # Check the settings against the catalog of supported versions, sizes and quotas (see preflight.py).
+    preflight: bool
+    # Previews use a placeholder kubeconfig instead of fetching the cluster's credentials (see cluster.py).
+    offline_preview: bool
+    # How the cluster authenticates to Azure, one of IDENTITY_TYPES (see cluster_args.py).
+    identity_type: str
+    user_assigned_identity_id: str
+    # An existing cluster to adopt instead of creating one (see cluster.py). Both are set or neither.
+    adopt_cluster_name: str
+    adopt_resource_group_name: str
+    # A secret Output, or None to generate a password. Only used by the ServicePrincipal identity.
+    password: object
+
+    def __repr__(self) -> str:
+        return 'Settings(' + ', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__
+                                       if name != 'password') + ')'
+
+class _Reader:
+    def __init__(self, config: Config):
+        self.config = config
+        self.problems = []
+
+    def get(self, key: str, default=None, kind: str = 'str'):
+        try:
+            value = {'str': self.config.get, 'int': self.config.get_int, 'bool': self.config.get_bool,
+                     'object': self.config.get_object}[kind](key)
+        except (ConfigTypeError, ValueError) as e:
+            self.problems.append(f'{key}: {e}')
+            return default
+        return default if value is None else value
+
+    def check(self, ok: bool, problem: str):
+        if not ok:
+            self.problems.append(problem)
+
+    def check_range(self, key: str, value: int, low: int, high: int):
+        self.check(value is None or low <= value <= high, f'{key} must be between {low} and {high}, got {value}')
+
+    def check_match(self, key: str, value: str, pattern, example: str):
+        self.check(value is None or bool(pattern.match(value)), f"{key} must look like '{example}', got '{value}'")
+
+@functools.lru_cache(maxsize=None)
+def load() -> Settings:
+    reader = _Reader(Config())
+    settings = Settings()
+
+    settings.k8s_version = reader.get('k8sVersion', '1.18.14')
+    reader.check_match('k8sVersion', settings.k8s_version, K8S_VERSION, '1.18.14')
+    settings.admin_username = reader.get('adminUserName', 'testuser')
+    reader.check_match('adminUserName', settings.admin_username, ADMIN_USERNAME, 'testuser')
+    settings.node_count = reader.get('nodeCount', 2, 'int')
+    reader.check_range('nodeCount', settings.node_count, 1, 100)
+    settings.node_size = reader.get('nodeSize', 'Standard_D2_v2')
+    reader.check(settings.node_size.startswith('Standard_'), f"nodeSize must be an Azure VM size like "
+                 f"'Standard_D2_v2', got '{settings.node_size}'")
+    settings.max_pods = reader.get('maxPods', 20, 'int')
+    reader.check_range('maxPods', settings.max_pods, 10, 250)
+
+    # Node pools, e.g. `pulumi config set --path 'nodePools[1].minCount' 1`. Each entry takes
+    # name, vmSize, mode ('System' or 'User'), count, minCount, maxCount and maxPods.
+    # Without nodePools the cluster gets one system pool of nodeCount x nodeSize nodes.
+    settings.node_pools = []
+    pools = reader.get('nodePools', [], 'object')
+    reader.check(isinstance(pools, list), 'nodePools must be a list')
+    for i, pool in enumerate(pools if isinstance(pools, list) else []):
+        key = f'nodePools[{i}]'
+        if not isinstance(pool, dict):
+            reader.check(False, f'{key} must be an object')
+            continue
+        for field, value in pool.items():
+            reader.check(field in ('name', 'vmSize', 'mode', 'count', 'minCount', 'maxCount', 'maxPods'),
+                         f'{key}.{field} is not a node pool setting')
+            reader.check(field not in ('count', 'minCount', 'maxCount', 'maxPods') or isinstance(value, int),
+                         f'{key}.{field} must be an integer, got {value!r}')
+        name, mode = pool.get('name'), pool.get('mode') or 'User'
+        reader.check(isinstance(name, str) and bool(NODE_POOL_NAME.match(name)),
+                     f'{key}.name must be 1-12 lowercase letters and digits starting with a letter, got {name!r}')
+        reader.check(mode in NODE_POOL_MODES, f"{key}.mode must be one of {', '.join(NODE_POOL_MODES)}, got {mode!r}")
+        min_count, max_count = pool.get('minCount'), pool.get('maxCount')
+        reader.check((min_count is None) == (max_count is None), f'{key} needs both minCount and maxCount to autoscale')
+        if isinstance(min_count, int) and isinstance(max_count, int):
+            reader.check(0 <= min_count <= max_count <= 1000,
+                         f'{key} needs 0 <= minCount <= maxCount <= 1000, got {min_count} and {max_count}')
+        reader.check_range(f'{key}.maxPods', pool.get('maxPods'), 10, 250)
+        settings.node_pools.append(NodePoolArgs(
+            name=name,
+            vm_size=pool.get('vmSize') or settings.node_size,
+            mode=mode,
+            count=pool.get('count') or min_count or 1,
+            min_count=min_count,
+            max_count=max_count,
+            max_pods=pool.get('maxPods') or settings.max_pods,
+        ))
+    reader.check(not settings.node_pools or any(p.mode == 'System' for p in settings.node_pools),
+                 'nodePools needs at least one System pool')
+    names = [p.name for p in settings.node_pools]
+    reader.check(len(names) == len(set(names)), 'nodePools names must be unique')
+
+    # Cluster autoscaler tuning for pools with minCount/maxCount, e.g. '10s' and '10m'.
+    settings.autoscaler_scan_interval = reader.get('autoscalerScanInterval')
+    reader.check_match('autoscalerScanInterval', settings.autoscaler_scan_interval, DURATION, '10s')
+    settings.autoscaler_scale_down_delay = reader.get('autoscalerScaleDownDelay')
+    reader.check_match('autoscalerScaleDownDelay', settings.autoscaler_scale_down_delay, DURATION, '10m')
+
+    # Bump credsVersion after rotating the cluster credentials to bypass the cached kubeconfig.
+    # Set credsCacheTtl to 0 to disable the kubeconfig cache.
+    settings.creds_version = reader.get('credsVersion', '1')
+    settings.creds_cache_ttl = reader.get('credsCacheTtl', DEFAULT_TTL, 'int')
+    reader.check_range('credsCacheTtl', settings.creds_cache_ttl, 0, 30 * 24 * 3600)
+
+    # Set clusterCount above 1 to build a fleet of clusters, spread round-robin across the fleetRegions list.
+    # e.g. `pulumi config set --path 'fleetRegions[0]' eastus`
+    settings.cluster_count = reader.get('clusterCount', 1, 'int')
+    reader.check_range('clusterCount', settings.cluster_count, 1, 100)
+    settings.fleet_regions = reader.get('fleetRegions', [], 'object')
+    reader.check(isinstance(settings.fleet_regions, list) and all(isinstance(r, str) for r in settings.fleet_regions),
+                 'fleetRegions must be a list of region names')
+
+    settings.location = Config('azure-native').get('location')
+    settings.preflight = reader.get('preflight', False, 'bool')
+    settings.offline_preview = reader.get('offlinePreview', False, 'bool')
+
+    # Managed identities (SystemAssigned or UserAssigned) replace the per-cluster AD application and password.
+    # e.g. `pulumi config set identityType UserAssigned` and optionally `pulumi config set userAssignedIdentityId <id>`
+    settings.identity_type = reader.get('identityType', 'ServicePrincipal')
+    reader.check(settings.identity_type in IDENTITY_TYPES,
+                 f"identityType must be one of {', '.join(IDENTITY_TYPES)}, got '{settings.identity_type}'")
+    settings.user_assigned_identity_id = reader.get('userAssignedIdentityId')
+    reader.check(settings.user_assigned_identity_id is None or settings.identity_type == 'UserAssigned',
+                 'userAssignedIdentityId is only used with identityType UserAssigned')
+
+    # Adopt an existing cluster rather than creating one, e.g. to rebuild the app stack on a cluster that is still around.
+    # `pulumi config set adoptClusterName <cluster>` and `pulumi config set adoptResourceGroupName <resource group>`
+    settings.adopt_cluster_name = reader.get('adoptClusterName')
+    settings.adopt_resource_group_name = reader.get('adoptResourceGroupName')
+    reader.check((settings.adopt_cluster_name is None) == (settings.adopt_resource_group_name is None),
+                 'adoptClusterName and adoptResourceGroupName must be set together')
+    reader.check(settings.adopt_cluster_name is None or (settings.cluster_count == 1 and not settings.fleet_regions),
+                 'adoptClusterName adopts a single cluster and cannot be combined with clusterCount or fleetRegions')
+
+    settings.password = reader.config.get_secret('password')
+
+    if reader.problems:
+        raise ValueError('invalid stack config:\n' + '\n'.join(f'  - {p}' for p in reader.problems))
+    return settings
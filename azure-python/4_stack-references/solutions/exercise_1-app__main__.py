@@ -2,33 +2,36 @@
 # Doc: https://www.pulumi.com/docs/intro/concepts/stack/#stackreferences
 
 import pulumi
-from pulumi import ResourceOptions
 import pulumi_kubernetes as k8s
-from pulumi_kubernetes.helm.v3 import Chart, ChartOpts
+
+import apache
 
 ## Exercise 1
 # Using config data to get the name of the base stack.
 # The Pulumi automation API or other methods could be used to automate the config value.
 config = pulumi.Config()
-base_cluster_stack_name = config.require("base_cluster_stack")
-base_cluster_stack = pulumi.StackReference(base_cluster_stack_name)
-kubeconfig = base_cluster_stack.get_output("kubeconfig")
+cluster_pool = config.get("clusterPool")
+if cluster_pool:
+    # Claim a pre-provisioned cluster from a pool stack instead (see cluster_claim.py).
+    import cluster_claim
+    claimed_cluster, kubeconfig, k8s_version = cluster_claim.claim_cluster(cluster_pool,
+        config.require("clusterPoolClaimsDir"))
+    pulumi.export('Claimed_Cluster', claimed_cluster)
+else:
+    base_cluster_stack_name = config.require("base_cluster_stack")
+    base_cluster_stack = pulumi.StackReference(base_cluster_stack_name)
+    kubeconfig = base_cluster_stack.get_output("kubeconfig")
+    # The cluster's Kubernetes version, which the chart is rendered for.
+    k8s_version = base_cluster_stack.get_output("k8sVersion")
 
 # The K8s provider which supplies the helm chart resource needs to know how to talk to the K8s cluster.
 # So, instantiate a K8s provider using the retrieved kubeconfig.
 k8s_provider = k8s.Provider('k8s-provider', kubeconfig=kubeconfig)
 
-# Create a chart resource to deploy apache using the k8s provider instantiated above.
-apache = Chart('apache-chart',
-    ChartOpts(
-        chart='apache',
-        version='8.3.2',
-        fetch_opts={'repo': 'https://charts.bitnami.com/bitnami'}),
-    opts=ResourceOptions(provider=k8s_provider))
-
-# Get the helm-deployed apache service IP which isn't known until the chart is deployed.
-apache_service_ip = apache.get_resource('v1/Service', 'apache-chart').apply(
-    lambda res: res.status.load_balancer.ingress[0].ip)
+# Deploy apache using the k8s provider instantiated above.
+# See apache.py for the ways the chart can be deployed (the "chartMode" config value).
+# The helm-deployed apache service IP isn't known until the chart is deployed.
+apache_service_ip = apache.deploy_apache(k8s_provider, config, k8s_version)
 
 # Correct option using "concat()"
 pulumi.export('Apache_URL', pulumi.Output.concat('http://', apache_service_ip)) 
\ No newline at end of file
@@ -0,0 +1,36 @@
+# The apache autoscaler (app/apache_scaling.py) as the app deploys it: one HorizontalPodAutoscaler, declared up front
+# with the API version the configured Kubernetes version serves.
+
+import pytest
+
+from tools.harness import run_isolated
+
+def deploy_app(config: dict, preview: bool = False) -> dict:
+    return run_isolated({
+        'program': '4_stack-references/solutions/exercise_1-app__main__.py',
+        'project_dir': '4_stack-references/app',
+        'config': config,
+        'preview': preview,
+    })
+
+def autoscalers(result: dict) -> dict:
+    assert result['status'] == 'ok', result['error']
+    return {t: n for t, n in result['resources_by_type'].items() if t.endswith(':HorizontalPodAutoscaler')}
+
+@pytest.mark.parametrize('k8s_version, api', [('1.18.14', 'v2beta2'), ('1.22.6', 'v2beta2'), ('1.23.0', 'v2'),
+                                              ('1.29.2', 'v2')])
+@pytest.mark.parametrize('preview', [False, True])
+def test_api_version_follows_k8s_version(k8s_version: str, api: str, preview: bool):
+    assert autoscalers(deploy_app({'apacheMaxReplicas': 4, 'k8sVersion': k8s_version}, preview)) == {
+        f'kubernetes:autoscaling/{api}:HorizontalPodAutoscaler': 1}
+
+def test_no_max_replicas_no_autoscaler():
+    assert autoscalers(deploy_app({})) == {}
+
+@pytest.mark.parametrize('target_cpu', [0, -5, 101])
+def test_target_cpu_out_of_range_is_rejected(target_cpu: int):
+    result = deploy_app({'apacheMaxReplicas': 4, 'apacheTargetCpu': target_cpu})
+
+    assert result['status'] == 'error'
+    assert 'apacheTargetCpu must be' in result['error']
+    assert f'got {target_cpu}' in result['error']
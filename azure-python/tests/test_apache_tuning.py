@@ -0,0 +1,59 @@
+# The apache tuning profiles (app/apache_tuning.py) as the app deploys them: a ConfigMap with the rendered apache
+# config, mounted by the chart's Deployment through the "vhostsConfigMap" chart value.
+
+import pytest
+
+from tools.harness import run_isolated
+
+CONFIG_MAP = 'kubernetes:core/v1:ConfigMap'
+DEPLOYMENT = 'kubernetes:apps/v1:Deployment'
+
+def deploy_app(config: dict, chart_mode: str = 'chart') -> dict:
+    result = run_isolated({
+        'program': '4_stack-references/solutions/exercise_1-app__main__.py',
+        'project_dir': '4_stack-references/app',
+        'config': {'chartMode': chart_mode, **config},
+        'capture': [CONFIG_MAP, DEPLOYMENT],
+    })
+    assert result['status'] == 'ok', result['error']
+    return result
+
+def tuning_conf(result: dict) -> tuple:
+    [config_map] = [c for c in result['captured'][CONFIG_MAP] if c['name'] == 'apache-tuning']
+    [deployment] = result['captured'][DEPLOYMENT]
+    name = config_map['inputs']['metadata']['name']
+    volumes = deployment['inputs']['spec']['template']['spec']['volumes']
+    assert volumes == [{'name': 'vhosts', 'configMap': {'name': name}}]
+    return name, config_map['inputs']['data']['tuning.conf'].splitlines()
+
+@pytest.mark.parametrize('profile, directives, compressed', [
+    ('default', ['Timeout 60', 'KeepAliveTimeout 5', 'MaxKeepAliveRequests 100', '    ThreadsPerChild 25',
+                 '    MaxRequestWorkers 400', '    StartServers 75'], False),
+    ('low-latency', ['Timeout 30', 'KeepAliveTimeout 2', 'MaxKeepAliveRequests 500', '    ThreadsPerChild 25',
+                     '    MinSpareThreads 150', '    StartServers 200'], False),
+    ('high-throughput', ['Timeout 60', 'KeepAliveTimeout 15', 'MaxKeepAliveRequests 0', '    ThreadsPerChild 64',
+                         '    MaxRequestWorkers 1024', '    DeflateCompressionLevel 4'], True),
+])
+@pytest.mark.parametrize('chart_mode', ['chart', 'cached'])
+def test_profile_is_rendered_and_mounted(profile: str, directives: list, compressed: bool, chart_mode: str):
+    name, conf = tuning_conf(deploy_app({'apacheProfile': profile}, chart_mode))
+
+    assert name.startswith('apache-tuning-')
+    assert conf[0] == f'# Apache tuning profile "{profile}", rendered by apache_tuning.py.'
+    for directive in directives:
+        assert directive in conf
+    assert ('<IfModule mod_deflate.c>' in conf) == compressed
+
+def test_overrides_change_the_config_map_name():
+    profile_name, _ = tuning_conf(deploy_app({'apacheProfile': 'low-latency'}))
+    name, conf = tuning_conf(deploy_app({'apacheProfile': 'low-latency', 'apacheTuning': {'keepAliveTimeout': 3}}))
+
+    assert 'KeepAliveTimeout 3' in conf
+    assert name != profile_name
+
+def test_no_profile_keeps_the_chart_configuration():
+    result = deploy_app({})
+
+    assert 'apache-tuning' not in [c['name'] for c in result['captured'].get(CONFIG_MAP, [])]
+    [deployment] = result['captured'][DEPLOYMENT]
+    assert deployment['inputs']['spec']['template']['spec'].get('volumes', []) == []
@@ -0,0 +1,116 @@
+# The local Helm chart cache (app/chart_cache.py) against a chart repo served from a local HTTP server: a miss
+# downloads and checks the archive, a hit uses the cached copy, and archives that don't match their digest are refused.
+
+import gzip
+import hashlib
+import importlib.util
+import io
+import json
+import os
+import tarfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+spec = importlib.util.spec_from_file_location(
+    'chart_cache', os.path.join(ROOT, '4_stack-references', 'app', 'chart_cache.py'))
+chart_cache = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(chart_cache)
+
+CHART = 'apache'
+VERSION = '8.3.2'
+
+def chart_archive(chart: str, version: str) -> bytes:
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb', mtime=0) as gz, tarfile.open(fileobj=gz, mode='w') as tar:
+        chart_yaml = f'apiVersion: v2\nname: {chart}\nversion: {version}\n'.encode()
+        info = tarfile.TarInfo(f'{chart}/Chart.yaml')
+        info.size = len(chart_yaml)
+        tar.addfile(info, io.BytesIO(chart_yaml))
+    return buf.getvalue()
+
+ARCHIVE = chart_archive(CHART, VERSION)
+DIGEST = hashlib.sha256(ARCHIVE).hexdigest()
+
+# A chart repo with one chart. Its index.yaml publishes `digest` for the archive; requests lists the paths asked for.
+class Repo:
+    def __init__(self):
+        self.digest = DIGEST
+        self.requests = []
+        repo = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                repo.requests.append(self.path)
+                if self.path == '/index.yaml':
+                    # JSON is YAML too.
+                    body = json.dumps({'apiVersion': 'v1', 'entries': {CHART: [{
+                        'version': VERSION, 'digest': repo.digest, 'urls': [f'{CHART}-{VERSION}.tgz']}]}}).encode()
+                elif self.path == f'/{CHART}-{VERSION}.tgz':
+                    body = ARCHIVE
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+
+@pytest.fixture
+def repo():
+    repo = Repo()
+    yield repo
+    repo.server.shutdown()
+
+def test_miss_downloads_and_hit_reuses(repo, tmp_path):
+    cache = chart_cache.ChartCache(cache_dir=str(tmp_path))
+
+    path, digest = cache.fetch_with_digest(CHART, VERSION, repo.url)
+    assert digest == DIGEST
+    assert path == str(tmp_path / 'unpacked' / DIGEST / CHART)
+    with open(os.path.join(path, 'Chart.yaml')) as f:
+        assert f'version: {VERSION}' in f.read()
+    with open(tmp_path / 'index.json') as f:
+        assert json.load(f) == {f'{repo.url}/{CHART}:{VERSION}': DIGEST}
+    assert repo.requests == ['/index.yaml', f'/{CHART}-{VERSION}.tgz']
+
+    # A hit doesn't ask the repo, even in offline mode.
+    assert chart_cache.ChartCache(cache_dir=str(tmp_path), offline=True).fetch(CHART, VERSION, repo.url) == path
+    assert cache.fetch(CHART, VERSION, repo.url + '/') == path
+    assert len(repo.requests) == 2
+
+def test_offline_miss_fails(repo, tmp_path):
+    with pytest.raises(FileNotFoundError, match='is not in the local chart cache'):
+        chart_cache.ChartCache(cache_dir=str(tmp_path), offline=True).fetch(CHART, VERSION, repo.url)
+    assert repo.requests == []
+
+def test_unknown_version_fails(repo, tmp_path):
+    with pytest.raises(ValueError, match='is not in the index'):
+        chart_cache.ChartCache(cache_dir=str(tmp_path)).fetch(CHART, '0.0.1', repo.url)
+
+def test_download_not_matching_the_index_digest_is_refused(repo, tmp_path):
+    repo.digest = '0' * 64
+    with pytest.raises(ValueError, match='the repo index says'):
+        chart_cache.ChartCache(cache_dir=str(tmp_path)).fetch(CHART, VERSION, repo.url)
+
+    assert os.listdir(tmp_path / 'blobs') == []
+    assert not os.path.exists(tmp_path / 'index.json')
+
+def test_cached_archive_not_matching_its_digest_is_refused(repo, tmp_path):
+    cache = chart_cache.ChartCache(cache_dir=str(tmp_path))
+    cache.fetch(CHART, VERSION, repo.url)
+    with open(tmp_path / 'blobs' / f'{DIGEST}.tgz', 'ab') as f:
+        f.write(b'tampered')
+
+    with pytest.raises(ValueError, match='does not match its digest'):
+        cache.fetch(CHART, VERSION, repo.url)
@@ -0,0 +1,52 @@
+# Claiming clusters from a pool (app/cluster_claim.py): the claims directory is kept as given and resolved by the
+# provider, relative to the directory it runs in.
+
+import importlib.util
+import json
+import os
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+spec = importlib.util.spec_from_file_location(
+    'cluster_claim', os.path.join(ROOT, '4_stack-references', 'app', 'cluster_claim.py'))
+cluster_claim = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(cluster_claim)
+
+POOL = 'org/base_cluster/pool'
+CLUSTERS = ['k8sfleet-0', 'k8sfleet-1']
+
+@pytest.fixture
+def provider(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.mkdir('claims')
+    return cluster_claim.ClusterClaimProvider()
+
+def props(claimant: str, claims_dir: str = 'claims') -> dict:
+    return {'pool': POOL, 'clusters': CLUSTERS, 'claims_dir': claims_dir, 'claimant': claimant, 'cluster': None}
+
+def test_relative_claims_dir_is_kept_and_resolved(provider, tmp_path):
+    first = provider.create(props('app/a'))
+    second = provider.create(props('app/b'))
+
+    assert [first.outs['cluster'], second.outs['cluster']] == CLUSTERS
+    assert first.outs['claims_dir'] == 'claims'
+    with open(tmp_path / 'claims' / 'org_base_cluster_pool' / 'k8sfleet-0.json') as f:
+        assert json.load(f)['claimant'] == 'app/a'
+    with pytest.raises(Exception, match='no free cluster'):
+        provider.create(props('app/c'))
+
+    provider.delete(first.id, first.outs)
+    assert provider.create(props('app/c')).outs['cluster'] == 'k8sfleet-0'
+
+def test_same_directory_written_differently_is_not_a_new_claim(provider, tmp_path):
+    olds = provider.create(props('app/a', str(tmp_path / 'claims'))).outs
+
+    diff = provider.diff('id', olds, props('app/a'))
+    assert diff.changes
+    assert diff.replaces == []
+    assert provider.update('id', olds, props('app/a')).outs == {**props('app/a'), 'cluster': 'k8sfleet-0'}
+
+    os.mkdir('other')
+    assert provider.diff('id', olds, props('app/a', 'other')).replaces == ['claims_dir']
@@ -0,0 +1,41 @@
+# The stage 2 and 3 projects keep their own copies of modules from other projects (the kubeconfig cache, the settings
+# loader, the chart cache and the apache scaling), so every project works on its own, e.g. with `pulumi new`. The
+# copies must not drift from the originals.
+
+import glob
+import os
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ORIGINALS = [
+    os.path.join('4_stack-references', 'base_cluster', 'creds_cache.py'),
+    # base_cluster's settings.py is the full loader; the stage 2 and 3 copies are the part those programs use.
+    os.path.join('2_stack-advanced-topics', 'settings.py'),
+    os.path.join('4_stack-references', 'app', 'chart_cache.py'),
+    os.path.join('4_stack-references', 'app', 'apache_scaling.py'),
+]
+
+def copies() -> list:
+    pairs = []
+    for original in ORIGINALS:
+        paths = glob.glob(os.path.join(ROOT, '[0-9]_*', '**', os.path.basename(original)), recursive=True)
+        pairs += [(os.path.relpath(path, ROOT), original) for path in sorted(paths)
+                  if os.path.relpath(path, ROOT) != original and '4_stack-references' not in path]
+    return pairs
+
+def read(path: str) -> str:
+    with open(os.path.join(ROOT, path)) as f:
+        return f.read()
+
+def test_every_module_has_copies():
+    assert {original for _, original in copies()} == set(ORIGINALS)
+
+@pytest.mark.parametrize('copy, original', copies())
+def test_copy_matches_original(copy: str, original: str):
+    assert read(copy) == read(original), f'{copy} differs from {original}'
+
+# A project that reaches into another one's directory breaks when it is used on its own.
+def test_no_module_path_changes():
+    for path in glob.glob(os.path.join(ROOT, '[1-3]_*', '**', '*.py'), recursive=True):
+        assert 'sys.path' not in read(path), f'{os.path.relpath(path, ROOT)} changes the module path'
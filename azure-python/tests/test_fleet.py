@@ -0,0 +1,33 @@
+# A ClusterFleet of 20 clusters across two regions in one stack: every cluster gets its own uniquely named children,
+# and the clusters are registered, and fetch their kubeconfigs, concurrently.
+
+from tools.harness import run_isolated
+
+CLUSTERS = 20
+REGIONS = ['eastus', 'westus']
+CREDS_SECONDS = 0.2
+
+def test_twenty_cluster_fleet():
+    result = run_isolated({
+        'program': '4_stack-references/base_cluster/__main__.py',
+        'config': {'clusterCount': CLUSTERS, 'fleetRegions': REGIONS},
+        'creds_seconds': CREDS_SECONDS,
+    })
+    assert result['status'] == 'ok', result['error']
+    assert result['duplicate_names'] == []
+
+    by_type = result['resources_by_type']
+    assert by_type['custom:resource:ClusterFleet'] == 1
+    # One resource group per region.
+    assert by_type['azure-native:resources:ResourceGroup'] == len(REGIONS)
+    for typ in ('custom:resource:Cluster', 'azure-native:containerservice:ManagedCluster',
+                'tls:index/privateKey:PrivateKey', 'azuread:index/application:Application',
+                'azuread:index/servicePrincipal:ServicePrincipal',
+                'azuread:index/servicePrincipalPassword:ServicePrincipalPassword'):
+        assert by_type[typ] == CLUSTERS, typ
+    assert result['resources'] == 1 + len(REGIONS) + 6 * CLUSTERS
+    assert result['invokes_by_token'] == {'azure-native:containerservice:listManagedClusterUserCredentials': CLUSTERS}
+
+    # Fetched one after the other, no two invokes would be in flight at once. How many are is capped by the size of
+    # the SDK's thread pool, so don't expect all of them.
+    assert result['peak_invokes_by_token']['azure-native:containerservice:listManagedClusterUserCredentials'] > 1
@@ -0,0 +1,39 @@
+# Managed identities replace the per-cluster AD application, service principal and password (and the generated
+# password) with the cluster's own identity, or one user-assigned identity.
+
+import pytest
+
+from tools.harness import run_isolated
+
+AAD_TYPES = [
+    'azuread:index/application:Application',
+    'azuread:index/servicePrincipal:ServicePrincipal',
+    'azuread:index/servicePrincipalPassword:ServicePrincipalPassword',
+]
+USER_ASSIGNED_IDENTITY = 'azure-native:managedidentity:UserAssignedIdentity'
+IDENTITY_ID = '/subscriptions/s/resourceGroups/rg/providers/Microsoft.ManagedIdentity/userAssignedIdentities/bench'
+
+def run_base_cluster(config: dict) -> dict:
+    result = run_isolated({'program': '4_stack-references/base_cluster/__main__.py', 'config': config})
+    assert result['status'] == 'ok', result['error']
+    return result
+
+@pytest.fixture(scope='module')
+def service_principal() -> dict:
+    return run_base_cluster({'identityType': 'ServicePrincipal'})
+
+@pytest.mark.parametrize('config, identities', [
+    ({'identityType': 'SystemAssigned'}, 0),
+    # Without an id, the cluster gets a new user-assigned identity.
+    ({'identityType': 'UserAssigned'}, 1),
+    ({'identityType': 'UserAssigned', 'userAssignedIdentityId': IDENTITY_ID}, 0),
+])
+def test_managed_identity_drops_the_service_principal(service_principal: dict, config: dict, identities: int):
+    managed = run_base_cluster(config)
+
+    for typ in AAD_TYPES:
+        assert service_principal['resources_by_type'][typ] == 1
+        assert typ not in managed['resources_by_type']
+    assert not any(typ.startswith('random:') for typ in managed['resources_by_type'])
+    assert managed['resources_by_type'].get(USER_ASSIGNED_IDENTITY, 0) == identities
+    assert managed['resources'] == service_principal['resources'] - len(AAD_TYPES) + identities
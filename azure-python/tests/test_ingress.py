@@ -0,0 +1,57 @@
+# The ingress cache (app/ingress.py) as the app deploys it: the Ingress API and the controller's chart values follow
+# the configured Kubernetes version.
+
+import pytest
+
+from tools.harness import run_isolated
+
+INGRESS_V1 = 'kubernetes:networking.k8s.io/v1:Ingress'
+INGRESS_V1BETA1 = 'kubernetes:networking.k8s.io/v1beta1:Ingress'
+RELEASE = 'kubernetes:helm.sh/v3:Release'
+
+def deploy_app(k8s_version: str) -> dict:
+    result = run_isolated({
+        'program': '4_stack-references/solutions/exercise_1-app__main__.py',
+        'project_dir': '4_stack-references/app',
+        'config': {'ingress': True, 'k8sVersion': k8s_version, 'chartMode': 'release'},
+        'capture': [INGRESS_V1, INGRESS_V1BETA1, RELEASE],
+    })
+    assert result['status'] == 'ok', result['error']
+    return result
+
+def controller_values(result: dict) -> dict:
+    [release] = [r for r in result['captured'][RELEASE] if r['name'] == 'ingress-nginx']
+    return release['inputs']['values']['controller']
+
+@pytest.mark.parametrize('k8s_version', ['1.19.0', '1.24.9', '1.30.4'])
+def test_v1_ingress_from_1_19(k8s_version: str):
+    result = deploy_app(k8s_version)
+
+    assert INGRESS_V1BETA1 not in result['captured']
+    [ingress] = result['captured'][INGRESS_V1]
+    spec = ingress['inputs']['spec']
+    assert spec['ingressClassName'] == 'nginx'
+    [path] = spec['rules'][0]['http']['paths']
+    assert path['pathType'] == 'Prefix'
+    assert path['backend'] == {'service': {'name': 'apache-chart', 'port': {'number': 80}}}
+    assert 'kubernetes.io/ingress.class' not in ingress['inputs']['metadata']['annotations']
+
+    controller = controller_values(result)
+    assert controller['allowSnippetAnnotations'] is True
+    assert controller['config']['annotations-risk-level'] == 'Critical'
+
+@pytest.mark.parametrize('k8s_version', ['1.16.15', '1.18.14'])
+def test_v1beta1_ingress_before_1_19(k8s_version: str):
+    result = deploy_app(k8s_version)
+
+    assert INGRESS_V1 not in result['captured']
+    [ingress] = result['captured'][INGRESS_V1BETA1]
+    annotations = ingress['inputs']['metadata']['annotations']
+    assert annotations['kubernetes.io/ingress.class'] == 'nginx'
+    assert 'proxy_cache apache-cache;' in annotations['nginx.ingress.kubernetes.io/configuration-snippet']
+    [path] = ingress['inputs']['spec']['rules'][0]['http']['paths']
+    assert path['backend'] == {'serviceName': 'apache-chart', 'servicePort': 80}
+
+    controller = controller_values(result)
+    assert 'allowSnippetAnnotations' not in controller
+    assert 'annotations-risk-level' not in controller['config']
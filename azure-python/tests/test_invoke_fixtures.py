@@ -0,0 +1,79 @@
+# Recorded invoke results (app/invoke_fixtures.py): an online run records the chart renders, and an offline preview
+# answers them from the recording instead of invoking "helm template".
+
+import asyncio
+import importlib.util
+import json
+import os
+
+import pytest
+
+from tools.harness import run_isolated
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+spec = importlib.util.spec_from_file_location(
+    'invoke_fixtures', os.path.join(ROOT, '4_stack-references', 'app', 'invoke_fixtures.py'))
+invoke_fixtures = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(invoke_fixtures)
+
+TEMPLATE = 'kubernetes:helm:template'
+CAPTURE = ['kubernetes:core/v1:Service', 'kubernetes:apps/v1:Deployment', 'kubernetes:core/v1:ConfigMap']
+
+def deploy_app(config: dict, preview: bool, cache_dir: str) -> dict:
+    result = run_isolated({
+        'program': '4_stack-references/solutions/exercise_1-app__main__.py',
+        'project_dir': '4_stack-references/app',
+        'config': config,
+        'preview': preview,
+        'chart_objects': 3,
+        'capture': CAPTURE,
+        # The same chart path on both runs, so the recorded arguments match.
+        'cache_dir': cache_dir,
+    })
+    assert result['status'] == 'ok', result['error']
+    return result
+
+def test_offline_preview_replays_the_recording(tmp_path):
+    path = str(tmp_path / 'invokes.json')
+    cache_dir = str(tmp_path / 'cache')
+    recorded = deploy_app({'recordInvokes': True, 'invokeFixtures': path}, False, cache_dir)
+    assert recorded['invokes_by_token'][TEMPLATE] == 1
+    with open(path) as f:
+        [entry] = json.load(f)[TEMPLATE].values()
+    assert len(entry['result']['result']) == 3
+
+    replayed = deploy_app({'offlinePreview': True, 'invokeFixtures': path}, True, cache_dir)
+    assert TEMPLATE not in replayed['invokes_by_token']
+    assert replayed['resources_by_type'] == recorded['resources_by_type']
+    assert replayed['captured'] == recorded['captured']
+
+def template_args(release: str, values: dict = None) -> dict:
+    return {'jsonOpts': json.dumps({'release_name': release, 'path': f'/charts/{release}', 'values': values or {}})}
+
+def replay(fixtures: dict, token: str, args: dict, tmp_path) -> dict:
+    path = tmp_path / 'invokes.json'
+    path.write_text(json.dumps(fixtures))
+    return asyncio.run(invoke_fixtures.InvokeFixtures(str(path), replay=True).invoke(token, args))
+
+def entry(args: dict, result: dict, recorded_at: str) -> tuple:
+    return invoke_fixtures.InvokeFixtures.key(args), {'args': args, 'result': result, 'recorded_at': recorded_at}
+
+def test_replay_prefers_the_same_arguments_then_the_latest_of_the_release(tmp_path):
+    old = entry(template_args('apache-chart', {'replicaCount': 1}), {'result': ['old']}, '2024-01-01T00:00:00Z')
+    new = entry(template_args('apache-chart', {'replicaCount': 2}), {'result': ['new']}, '2024-02-01T00:00:00Z')
+    other = entry(template_args('ingress-nginx'), {'result': ['other']}, '2024-03-01T00:00:00Z')
+    fixtures = {TEMPLATE: dict([old, new, other])}
+
+    same = template_args('apache-chart', {'replicaCount': 1})
+    assert replay(fixtures, TEMPLATE, same, tmp_path) == {'result': ['old']}
+    similar = template_args('apache-chart', {'replicaCount': 3})
+    assert replay(fixtures, TEMPLATE, similar, tmp_path) == {'result': ['new']}
+
+def test_replay_without_a_recording(tmp_path):
+    [service] = replay({}, TEMPLATE, template_args('ingress-nginx'), tmp_path)['result']
+    assert service['kind'] == 'Service'
+    assert service['metadata']['name'] == 'ingress-nginx-controller'
+
+    with pytest.raises(KeyError, match='no recording of azure-native:authorization:getClientConfig'):
+        replay({}, 'azure-native:authorization:getClientConfig', {}, tmp_path)
@@ -0,0 +1,20 @@
+# The Cluster component awaits the credentials invoke instead of blocking the event loop on it, so the clusters of a
+# fleet fetch their kubeconfigs at the same time. Runs base_cluster under the mocks harness with a slow invoke.
+
+from tools.harness import run_isolated
+
+BASE_CLUSTER = {
+    'program': '4_stack-references/base_cluster/__main__.py',
+    'config': {'clusterCount': 4},
+}
+# Keeps each invoke in flight long enough for the others to start.
+CREDS_SECONDS = 0.5
+CREDS = 'azure-native:containerservice:listManagedClusterUserCredentials'
+
+def test_slow_credentials_invokes_overlap():
+    result = run_isolated({**BASE_CLUSTER, 'creds_seconds': CREDS_SECONDS})
+    assert result['status'] == 'ok', result['error']
+    assert result['invokes_by_token'][CREDS] == 4
+
+    # One after the other, only one invoke would be in flight at a time.
+    assert result['peak_invokes_by_token'][CREDS] == 4
@@ -0,0 +1,61 @@
+# The load test against its local HTTP server stand-in (tools/loadtest.py).
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from tools import loadtest
+
+DELAY_MS = 5
+
+@pytest.fixture(scope='module')
+def url() -> str:
+    return loadtest.local_server(DELAY_MS)
+
+def test_parse_mix():
+    assert loadtest.parse_mix(['/=8', 'icons/apache_pb.png=2', '/other']) == (
+        ['/', '/icons/apache_pb.png', '/other'], [8.0, 2.0, 1.0])
+
+def test_report_per_path(url: str):
+    result = loadtest.load_test(url, mix=['/=8', '/missing=2'], concurrency=4, duration=1, warmup=0.2)
+    total, ok, missing = result['total'], result['paths']['/'], result['paths']['/missing']
+
+    assert total['requests'] == ok['requests'] + missing['requests']
+    assert ok['requests'] > 2 * missing['requests'] > 0
+    # 404s count as errors and aren't in the latencies or the throughput.
+    assert ok['errors'] == 0
+    assert missing['error_kinds'] == {'HTTP 404': missing['requests']}
+    assert missing['p50_ms'] is None and missing['rps'] == 0
+    assert total['rps'] == ok['rps'] > 0
+    assert DELAY_MS <= ok['p50_ms'] <= ok['p95_ms'] <= ok['p99_ms'] <= ok['max_ms']
+    assert result['options']['mix'] == {'/': 8.0, '/missing': 2.0}
+
+@pytest.mark.parametrize('method, path', [
+    # Neither has a body; waiting for one would time every request out.
+    ('GET', '/empty'),
+    ('HEAD', '/'),
+])
+def test_bodyless_responses(url: str, method: str, path: str):
+    result = loadtest.load_test(url, mix=[path], concurrency=2, duration=0.5, warmup=0, timeout=1, method=method)
+    assert result['total']['requests'] > 0
+    assert result['total']['errors'] == 0
+    assert result['total']['mb_per_second'] == 0
+
+def test_write_report(url: str, tmp_path):
+    result = loadtest.load_test(url, concurrency=1, duration=0.3, warmup=0)
+    loadtest.write_report(str(tmp_path), result)
+
+    with open(tmp_path / 'report.json') as f:
+        assert json.load(f) == result
+    lines = (tmp_path / 'report.txt').read_text().splitlines()
+    assert lines[0] == f'{url}: 1 connections for 0.3s'
+    assert lines[-1].startswith('total ')
+
+# The tool runs on load generators that don't have the Pulumi SDK; only a stack target needs it.
+def test_imports_without_pulumi():
+    modules = subprocess.run([sys.executable, '-c', 'import sys, tools.loadtest; print(*sys.modules)'],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), capture_output=True, text=True, check=True).stdout.split()
+    assert [m for m in modules if m.split('.')[0] == 'pulumi'] == []
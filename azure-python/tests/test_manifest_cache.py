@@ -0,0 +1,60 @@
+# CachedChart (app/manifest_cache.py) reuses private parts of pulumi_kubernetes to register the same resources as
+# Chart. These tests fail if the pinned pulumi-kubernetes changes them, or if the two charts stop matching.
+
+import importlib.metadata
+import inspect
+import os
+import re
+
+from tools.harness import run_isolated
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def pinned_version() -> str:
+    with open(os.path.join(ROOT, '4_stack-references', 'app', 'requirements.txt')) as f:
+        [version] = re.findall(r'^pulumi-kubernetes==(\S+)$', f.read(), re.MULTILINE)
+    return version
+
+def test_pinned_version_is_installed():
+    assert importlib.metadata.version('pulumi-kubernetes') == pinned_version()
+
+def test_chart_internals_are_unchanged():
+    from pulumi_kubernetes import _utilities
+    from pulumi_kubernetes.helm.v3 import helm
+    from pulumi_kubernetes.yaml.yaml import _parse_yaml_document, _skip_await
+
+    assert list(inspect.signature(_parse_yaml_document).parameters)[:3] == ['objects', 'opts', 'transformations']
+    assert list(inspect.signature(_skip_await).parameters) == ['obj', 'opts']
+    assert isinstance(_utilities.get_version(), str)
+
+    # Chart renders and registers its objects the way CachedChart does.
+    parse_chart = inspect.getsource(helm._parse_chart)
+    assert "invoke('kubernetes:helm:template', {'jsonOpts': opts}" in parse_chart
+    assert 'transformations.append(_skip_await)' in parse_chart
+    assert '_parse_yaml_document(x, opts, transformations)' in parse_chart
+    chart_init = inspect.getsource(helm.Chart.__init__)
+    assert '"kubernetes:helm.sh/v3:Chart"' in chart_init
+    assert 'pulumi.Alias(type_="kubernetes:helm.sh/v2:Chart")' in chart_init
+    assert 'release_name = f"{config.resource_prefix}-{release_name}"' in chart_init
+
+CAPTURE = ['kubernetes:core/v1:Service', 'kubernetes:apps/v1:Deployment', 'kubernetes:core/v1:ConfigMap']
+
+def deploy_app(chart_mode: str) -> dict:
+    result = run_isolated({
+        'program': '4_stack-references/solutions/exercise_1-app__main__.py',
+        'project_dir': '4_stack-references/app',
+        'config': {'chartMode': chart_mode, 'apacheProfile': 'low-latency'},
+        'capture': CAPTURE,
+    })
+    assert result['status'] == 'ok', result['error']
+    return result
+
+# The registered objects, in a stable order.
+def registered(result: dict) -> dict:
+    return {t: sorted(objects, key=lambda o: o['name']) for t, objects in result['captured'].items()}
+
+def test_cached_chart_registers_what_chart_does():
+    cached, chart = deploy_app('cached'), deploy_app('chart')
+
+    assert cached['resources_by_type'] == chart['resources_by_type']
+    assert registered(cached) == registered(chart)
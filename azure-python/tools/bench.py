@@ -0,0 +1,171 @@
+# Evaluation benchmark for every workshop program, run offline under Pulumi mocks (see harness.py).
+#
+# For each exercise program and solution it records wall time, peak memory, and resource and invoke counts,
+# so regressions show up as numbers. Run from the azure-python directory:
+#   python -m tools.bench
+#   python -m tools.bench --only 4_ --clusters 20 --node-pools 4 --chart-objects 200 --json bench.json
+#   python -m tools.bench --compare bench.json
+#
+# The scaling options feed config to the programs that read it (base_cluster: clusterCount, nodePools) and make the
+# mocked chart render more objects. Programs that are intentionally incomplete exercises report an error.
+#
+# Two modes compare the app's chart modes (app/apache.py) instead:
+#   python -m tools.bench --cold-warm --chart-objects 200 --template-seconds 2
+#     previews the app in cached mode twice with the same caches: cold (renders the chart and fills the manifest
+#     cache), then warm (reuses the rendered objects). --template-seconds stands in for the time "helm template" takes.
+#   python -m tools.bench --chart-vs-release --chart-objects 200
+#     updates the app in chart and in release mode and compares the resources registered, the state they add and
+#     the evaluation time.
+
+import argparse
+import json
+import shutil
+import statistics
+import tempfile
+
+from tools.harness import run_isolated
+
+# (label, program, project directory). The project directory is where the program runs and imports from.
+PROGRAMS = [
+    ('1 basics', '1_stack-basics/__main__.py', '1_stack-basics'),
+    ('1 basics ex-1', '1_stack-basics/solutions/exercise-1__main__.py', '1_stack-basics'),
+    ('1 basics ex-2', '1_stack-basics/solutions/exercise-2__main__.py', '1_stack-basics'),
+    ('1 basics ex-3', '1_stack-basics/solutions/exercise-3__main__.py', '1_stack-basics'),
+    ('2 advanced', '2_stack-advanced-topics/__main__.py', '2_stack-advanced-topics'),
+    ('2 advanced ex-1', '2_stack-advanced-topics/solutions/exercise-1__main__.py', '2_stack-advanced-topics'),
+    ('2 advanced ex-2', '2_stack-advanced-topics/solutions/exercise-2__main__.py', '2_stack-advanced-topics'),
+    ('2 advanced ex-3', '2_stack-advanced-topics/solutions/exercise-3__main__.py', '2_stack-advanced-topics'),
+    ('2 advanced ex-4', '2_stack-advanced-topics/solutions/exercise-4/__main__.py', '2_stack-advanced-topics/solutions/exercise-4'),
+    ('3 components', '3_component-resources/__main__.py', '3_component-resources'),
+    ('3 components ex-1', '3_component-resources/solutions/exercise-1/__main__.py', '3_component-resources/solutions/exercise-1'),
+    ('3 components ex-2', '3_component-resources/solutions/exercise-2/__main__.py', '3_component-resources/solutions/exercise-2'),
+    ('4 base_cluster', '4_stack-references/base_cluster/__main__.py', '4_stack-references/base_cluster'),
+    ('4 app', '4_stack-references/app/__main__.py', '4_stack-references/app'),
+    ('4 app ex-1', '4_stack-references/solutions/exercise_1-app__main__.py', '4_stack-references/app'),
+]
+
+# The program the chart mode comparisons run.
+APP_PROGRAM = ('4_stack-references/solutions/exercise_1-app__main__.py', '4_stack-references/app')
+
+def scaling_config(args) -> dict:
+    config = {}
+    if args.clusters > 1:
+        config['clusterCount'] = args.clusters
+    if args.node_pools > 0:
+        config['nodePools'] = [{'name': 'system', 'mode': 'System', 'count': 1}] + [
+            {'name': f'user{i}', 'minCount': 1, 'maxCount': 5} for i in range(1, args.node_pools)]
+    if args.chart_mode:
+        config['chartMode'] = args.chart_mode
+    return config
+
+def bench(args, baselines: dict = None) -> list:
+    results = []
+    for label, program, project_dir in PROGRAMS:
+        if args.only and not any(o in label or o in program for o in args.only):
+            continue
+        runs = [run_isolated({
+            'program': program,
+            'project_dir': project_dir,
+            'config': scaling_config(args),
+            'preview': args.preview,
+            'chart_objects': args.chart_objects,
+        }) for _ in range(args.repeat)]
+        result = runs[-1]
+        if result['status'] == 'ok':
+            result['seconds'] = round(statistics.median(r['seconds'] for r in runs), 4)
+            result['peak_rss_mb'] = max(r['peak_rss_mb'] for r in runs)
+        result['label'] = label
+        results.append(result)
+        print_row(result, (baselines or {}).get(label))
+    return results
+
+# Runs the app with the given config once per (label, config, preview) in runs, and prints a row for each.
+# All runs share the programs' caches.
+def bench_app(args, runs: list) -> list:
+    program, project_dir = APP_PROGRAM
+    cache_dir = tempfile.mkdtemp(prefix='bench-cache-')
+    results = []
+    try:
+        for label, config, preview in runs:
+            result = run_isolated({
+                'program': program,
+                'project_dir': project_dir,
+                'config': config,
+                'preview': preview,
+                'chart_objects': args.chart_objects,
+                'template_seconds': args.template_seconds,
+                'cache_dir': cache_dir,
+            })
+            result['label'] = label
+            results.append(result)
+            print_app_row(result)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    return results
+
+HEADER = f'{"program":<20} {"status":<6} {"seconds":>8} {"peak MB":>8} {"resources":>9} {"invokes":>7}'
+APP_HEADER = f'{"run":<20} {"status":<6} {"seconds":>8} {"resources":>9} {"invokes":>7} {"state KB":>9}'
+
+def print_row(result: dict, baseline: dict = None):
+    if result['status'] != 'ok':
+        print(f'{result["label"]:<20} {"error":<6} {result["error"]}')
+        return
+    row = (f'{result["label"]:<20} {"ok":<6} {result["seconds"]:>8.3f} {result["peak_rss_mb"]:>8.1f} '
+           f'{result["resources"]:>9} {result["invokes"]:>7}')
+    if baseline and baseline.get('status') == 'ok':
+        delta = (result['seconds'] - baseline['seconds']) / baseline['seconds'] * 100 if baseline['seconds'] else 0
+        row += (f'   time {delta:+.0f}%  resources {result["resources"] - baseline["resources"]:+d}'
+                f'  invokes {result["invokes"] - baseline["invokes"]:+d}')
+    print(row, flush=True)
+
+def print_app_row(result: dict):
+    if result['status'] != 'ok':
+        print(f'{result["label"]:<20} {"error":<6} {result["error"]}')
+        return
+    print(f'{result["label"]:<20} {"ok":<6} {result["seconds"]:>8.3f} {result["resources"]:>9} {result["invokes"]:>7} '
+          f'{result["state_kb"]:>9.1f}', flush=True)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark workshop program evaluation under Pulumi mocks.')
+    parser.add_argument('--only', nargs='*', help='only run programs whose label or path contains one of these')
+    parser.add_argument('--repeat', type=int, default=1, help='runs per program; the median time is reported')
+    parser.add_argument('--preview', action='store_true', help='evaluate as a preview instead of an update')
+    parser.add_argument('--clusters', type=int, default=1, help='clusterCount for base_cluster')
+    parser.add_argument('--node-pools', type=int, default=0, help='number of node pools for base_cluster')
+    parser.add_argument('--chart-objects', type=int, default=2, help='objects the mocked chart renders')
+    parser.add_argument('--chart-mode', help='chartMode for the app programs (chart, cached, release)')
+    parser.add_argument('--template-seconds', type=float, default=0,
+                        help='time the mocked "helm template" takes to render a chart')
+    parser.add_argument('--cold-warm', action='store_true',
+                        help='compare a cold and a warm preview of the app in cached mode')
+    parser.add_argument('--chart-vs-release', action='store_true',
+                        help='compare updating the app in chart and in release mode')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--compare', help='show the change against results saved with --json')
+    args = parser.parse_args()
+
+    baselines = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baselines = {r['label']: r for r in json.load(f)}
+
+    if args.cold_warm or args.chart_vs_release:
+        runs = []
+        if args.cold_warm:
+            runs += [('cached cold preview', {'chartMode': 'cached'}, True),
+                     ('cached warm preview', {'chartMode': 'cached'}, True)]
+        if args.chart_vs_release:
+            runs += [('chart update', {'chartMode': 'chart'}, False),
+                     ('release update', {'chartMode': 'release'}, False)]
+        print(APP_HEADER)
+        results = bench_app(args, runs)
+    else:
+        print(HEADER)
+        results = bench(args, baselines)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
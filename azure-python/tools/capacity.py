@@ -0,0 +1,191 @@
+# Sizes the cluster and the apache deployment for a target request rate and latency budget.
+#
+# The plan is based on a table of apache throughput per node by VM size. tools/throughput.json ships placeholder
+# figures, which are guesses and not measurements; load-test results replace them as they are recorded (see
+# loadtest.py). Record a load test of a deployment with its
+# node size, node count and apache replica count:
+#   python -m tools.capacity record loadtest-report/report.json --node-size Standard_D2_v2 --nodes 2 --replicas 2
+# Measurements are added to the local table (--table, default throughput-table.json). A size with measurements is
+# planned from them only; the placeholders are used for the other sizes, and a plan based on them says so.
+#
+# To plan, give the target and the budget for a latency percentile:
+#   python -m tools.capacity plan --rps 5000 --latency-ms 50 --percentile 95
+# A size is only considered if measurements at or under the budget, with at most --max-error-rate of the requests
+# failed, exist for it; its capacity per node is the median of their throughput. Every size gets enough nodes for the target plus --headroom; the plan with the fewest vCPUs in
+# total wins, and ties go to fewer nodes. The plan is printed as config commands for base_cluster (nodeCount,
+# nodeSize) and the app (apacheReplicas), and written with --json.
+
+import argparse
+import datetime
+import json
+import math
+import os
+import statistics
+import sys
+
+SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'throughput.json')
+DEFAULT_TABLE = 'throughput-table.json'
+PERCENTILES = (50, 95, 99)
+# The source of the shipped figures.
+PLACEHOLDER = 'placeholder'
+# A few timeouts at high load don't make a measurement unusable.
+DEFAULT_MAX_ERROR_RATE = 0.01
+
+def load_table(path: str) -> dict:
+    with open(SNAPSHOT_PATH) as f:
+        sizes = json.load(f)['sizes']
+    try:
+        with open(path) as f:
+            measured = json.load(f)['sizes']
+    except FileNotFoundError:
+        measured = {}
+    for size, entry in measured.items():
+        sizes[size] = {'vcpus': entry.get('vcpus') or sizes.get(size, {}).get('vcpus'),
+                       'measurements': entry['measurements']}
+    return sizes
+
+def record(report_path: str, table_path: str, node_size: str, nodes: int, replicas: int, vcpus: int = None) -> dict:
+    with open(report_path) as f:
+        report = json.load(f)
+    total = report['total']
+    if not total['requests'] or total['p50_ms'] is None:
+        raise ValueError(f'{report_path} has no successful requests')
+    measurement = {
+        'source': report['url'],
+        'recorded_at': report.get('recorded_at') or
+                       datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'rps_per_node': round(total['rps'] / nodes, 1),
+        'p50_ms': total['p50_ms'],
+        'p95_ms': total['p95_ms'],
+        'p99_ms': total['p99_ms'],
+        'error_rate': round(total['errors'] / total['requests'], 4),
+        'concurrency': report['options']['concurrency'],
+        'nodes': nodes,
+        'replicas': replicas,
+    }
+
+    try:
+        with open(table_path) as f:
+            table = json.load(f)
+    except FileNotFoundError:
+        table = {'sizes': {}}
+    entry = table['sizes'].setdefault(node_size, {'vcpus': vcpus, 'measurements': []})
+    if vcpus:
+        entry['vcpus'] = vcpus
+    entry['measurements'].append(measurement)
+    with open(table_path, 'w') as f:
+        json.dump(table, f, indent=2)
+    return measurement
+
+# One candidate plan per VM size, best first. Sizes that can't meet the budget come last with the reason.
+def plan(sizes: dict, rps: float, latency_ms: float, percentile: int, headroom: float,
+         min_nodes: int, max_nodes: int, min_replicas: int, max_error_rate: float = DEFAULT_MAX_ERROR_RATE) -> list:
+    target = rps * (1 + headroom)
+    candidates = []
+    for size, entry in sorted(sizes.items()):
+        candidate = {'node_size': size, 'vcpus': entry.get('vcpus')}
+        usable = [m for m in entry['measurements'] if (m.get('error_rate') or 0) <= max_error_rate]
+        within = [m for m in usable if m[f'p{percentile}_ms'] <= latency_ms]
+        if not usable:
+            candidate['problem'] = f'every measurement has more than {max_error_rate:.1%} errors'
+            candidates.append(candidate)
+            continue
+        if not within:
+            best = min(m[f'p{percentile}_ms'] for m in usable)
+            candidate['problem'] = f'p{percentile} is {best:g} ms at best'
+            candidates.append(candidate)
+            continue
+
+        per_node = statistics.median(m['rps_per_node'] for m in within)
+        nodes = max(min_nodes, math.ceil(target / per_node))
+        # Keep the replicas per node of the measurements, and at least one per node.
+        replicas_per_node = max(1.0, statistics.median(m['replicas'] / m['nodes'] for m in within))
+        candidate.update({
+            'rps_per_node': per_node,
+            'measured': any(m['source'] != PLACEHOLDER for m in within),
+            'node_count': nodes,
+            'replicas': max(min_replicas, math.ceil(nodes * replicas_per_node)),
+            'total_vcpus': nodes * (entry.get('vcpus') or 0),
+            'capacity_rps': round(nodes * per_node),
+        })
+        if nodes > max_nodes:
+            candidate['problem'] = f'needs {nodes} nodes, more than {max_nodes}'
+        candidates.append(candidate)
+
+    return sorted(candidates, key=lambda c: ('problem' in c, c.get('total_vcpus', 0), c.get('node_count', 0)))
+
+def print_plan(candidates: list, rps: float, latency_ms: float, percentile: int, headroom: float):
+    print(f'Target: {rps:g} req/s (+{headroom:.0%} headroom) with p{percentile} <= {latency_ms:g} ms')
+    print(f'{"node size":<18} {"vCPUs":>5} {"req/s/node":>10} {"nodes":>5} {"replicas":>8} {"vCPUs total":>11}  source')
+    for c in candidates:
+        if 'rps_per_node' not in c:
+            print(f'{c["node_size"]:<18} {c["vcpus"] or "?":>5}  {c["problem"]}')
+            continue
+        source = 'measured' if c['measured'] else PLACEHOLDER
+        print(f'{c["node_size"]:<18} {c["vcpus"] or "?":>5} {c["rps_per_node"]:>10g} {c["node_count"]:>5} '
+              f'{c["replicas"]:>8} {c["total_vcpus"]:>11}  {source}' + (f'; {c["problem"]}' if 'problem' in c else ''))
+
+    best = candidates[0] if candidates and 'problem' not in candidates[0] else None
+    if best is None:
+        print('\nNo VM size meets the target; relax the latency budget or raise --max-nodes.')
+        return None
+    print(f'\nPlan: {best["node_count"]} x {best["node_size"]} ({best["capacity_rps"]} req/s), '
+          f'{best["replicas"]} apache replicas')
+    if not best['measured']:
+        print(f'  Based on placeholder figures for {best["node_size"]}, not measurements: record a load test of it '
+              f'before relying on this plan.')
+    print(f'  (cd 4_stack-references/base_cluster && pulumi config set nodeSize {best["node_size"]} '
+          f'&& pulumi config set nodeCount {best["node_count"]})')
+    print(f'  (cd 4_stack-references/app && pulumi config set apacheReplicas {best["replicas"]})')
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description='Size the cluster and apache for a target request rate.')
+    parser.add_argument('--table', default=DEFAULT_TABLE, help='local table of measured throughput')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    plan_parser = commands.add_parser('plan', help='plan the node size, node count and apache replicas')
+    plan_parser.add_argument('--rps', type=float, required=True, help='target requests per second')
+    plan_parser.add_argument('--latency-ms', type=float, required=True, help='latency budget in milliseconds')
+    plan_parser.add_argument('--percentile', type=int, choices=PERCENTILES, default=95, help='percentile of the budget')
+    plan_parser.add_argument('--headroom', type=float, default=0.3, help='capacity to add on top of the target')
+    plan_parser.add_argument('--min-nodes', type=int, default=2, help='fewest nodes, for availability')
+    plan_parser.add_argument('--max-nodes', type=int, default=100, help='most nodes (nodeCount allows up to 100)')
+    plan_parser.add_argument('--min-replicas', type=int, default=2, help='fewest apache replicas')
+    plan_parser.add_argument('--max-error-rate', type=float, default=DEFAULT_MAX_ERROR_RATE,
+                             help='ignore measurements with more of the requests failed, e.g. 0.01 for 1%%')
+    plan_parser.add_argument('--sizes', nargs='*', help='only consider these VM sizes')
+    plan_parser.add_argument('--json', help='write the plan to this file')
+
+    record_parser = commands.add_parser('record', help='add a load test result to the table')
+    record_parser.add_argument('report', help='report.json written by tools.loadtest')
+    record_parser.add_argument('--node-size', required=True, help='VM size of the nodes under test')
+    record_parser.add_argument('--nodes', type=int, required=True, help='number of nodes serving apache')
+    record_parser.add_argument('--replicas', type=int, required=True, help='number of apache replicas')
+    record_parser.add_argument('--vcpus', type=int, help='vCPUs of the VM size, if it is new to the table')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        try:
+            m = record(args.report, args.table, args.node_size, args.nodes, args.replicas, args.vcpus)
+        except ValueError as e:
+            sys.exit(f'error: {e}')
+        print(f'{args.node_size}: {m["rps_per_node"]:g} req/s per node at p95 {m["p95_ms"]:g} ms, added to {args.table}')
+        return
+
+    sizes = load_table(args.table)
+    if args.sizes:
+        sizes = {s: e for s, e in sizes.items() if s in args.sizes}
+    candidates = plan(sizes, args.rps, args.latency_ms, args.percentile, args.headroom,
+                      args.min_nodes, args.max_nodes, args.min_replicas, args.max_error_rate)
+    best = print_plan(candidates, args.rps, args.latency_ms, args.percentile, args.headroom)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'plan': best and {
+                'base_cluster': {'nodeSize': best['node_size'], 'nodeCount': best['node_count']},
+                'app': {'apacheReplicas': best['replicas']},
+            }, 'candidates': candidates}, f, indent=2)
+    sys.exit(0 if best else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,317 @@
+# Critical-path analysis of a workshop program's resource dependency graph.
+#
+# The program is run once under Pulumi mocks (see harness.py) while a stack transformation records every resource
+# and what it waits for:
+# - input:<property>  an input property is an output of another resource
+# - depends_on        an explicit dependsOn option
+# - provider          the resource's explicit provider
+# - parent            a custom resource parent (component parents don't delay their children)
+# A dependency on a component resource waits for everything in the component, and what a component waits for gates
+# the resources inside it, so both are expanded to the component's custom resources.
+#
+# Each resource is weighted by how long resources of its type take to create. The defaults below are rough figures
+# for a cold deployment; --weights overrides them with a JSON file mapping resource type to seconds, or to a list of
+# observed durations (the median is used). The report then shows:
+# - the critical path and its estimated wall-clock time, against the time if everything ran one after another
+# - for each explicit dependsOn on the critical path, how much removing it would shorten the deployment, and the
+#   same for the dependencies that carry data (inputs, the provider, a parent), which can only go by restructuring
+# - explicit dependsOn edges that are already implied by other dependencies, and can be removed as noise
+#
+# Run from the azure-python directory:
+#   python -m tools.critical_path 3_component-resources/__main__.py
+#   python -m tools.critical_path 4_stack-references/solutions/exercise_1-app__main__.py \
+#       --project-dir 4_stack-references/app --weights weights.json --dot app.dot
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+
+import pulumi
+
+from tools.harness import run_program
+
+# Rough creation times in seconds by resource type. Types not listed use DEFAULT_WEIGHT, components take no time.
+WEIGHTS = {
+    'azure-native:resources:ResourceGroup': 2,
+    'tls:index/privateKey:PrivateKey': 1,
+    'random:index/randomPassword:RandomPassword': 1,
+    'azuread:index/application:Application': 10,
+    'azuread:index/servicePrincipal:ServicePrincipal': 10,
+    'azuread:index/servicePrincipalPassword:ServicePrincipalPassword': 15,
+    'azure-native:managedidentity:UserAssignedIdentity': 5,
+    'azure-native:containerservice:ManagedCluster': 420,
+    'pulumi:pulumi:StackReference': 1,
+    'pulumi:providers:kubernetes': 1,
+    'kubernetes:core/v1:ConfigMap': 1,
+    'kubernetes:core/v1:Service': 60,
+    'kubernetes:apps/v1:Deployment': 45,
+    'kubernetes:helm.sh/v3:Release': 90,
+}
+DEFAULT_WEIGHT = 5
+
+class Capture:
+    def __init__(self):
+        # Resource key -> {'type', 'name', 'label', 'component', 'parent'}. The key is 'type::name' prefixed with the
+        # parent's key and '/', like a URN with the parent names in it: children of different parents may share a name.
+        # The label is the names alone, for display.
+        self.nodes = {}
+        # (dependency key, dependent key) -> set of edge kinds
+        self.edges = {}
+        self._keys = {}
+        self._pending = []
+
+    def install(self):
+        pulumi.runtime.register_stack_transformation(self._record)
+
+    def _record(self, args: pulumi.ResourceTransformationArgs):
+        # Parents are registered before their children, so the parent's key is known.
+        parent_key = self._keys.get(id(args.opts.parent))
+        key = f'{parent_key}/{args.type_}::{args.name}' if parent_key else f'{args.type_}::{args.name}'
+        resource = args.resource
+        self._keys[id(resource)] = key
+        self.nodes[key] = {
+            'type': args.type_,
+            'name': args.name,
+            'label': f'{self.nodes[parent_key]["label"]}/{args.name}' if parent_key else args.name,
+            'component': not isinstance(resource, pulumi.CustomResource),
+            'parent': args.opts.parent,
+        }
+
+        opts = args.opts
+        depends_on = opts.depends_on if isinstance(opts.depends_on, list) else [opts.depends_on]
+        for dep in depends_on:
+            if isinstance(dep, pulumi.Resource):
+                self._pending.append((key, 'depends_on', self._resolved({dep})))
+        if isinstance(opts.provider, pulumi.Resource):
+            self._pending.append((key, 'provider', self._resolved({opts.provider})))
+        for prop, value in (args.props or {}).items():
+            self._pending.append((key, f'input:{prop}', pulumi.Output.from_input(value).resources()))
+
+        # Leave the resource unchanged.
+        return None
+
+    @staticmethod
+    async def _resolved(resources):
+        return resources
+
+    # Resolves the recorded dependencies once the program has run, and returns the graph.
+    def graph(self, loop):
+        deps = loop.run_until_complete(asyncio.gather(*(d for _, _, d in self._pending), return_exceptions=True))
+        for (key, kind, _), resources in zip(self._pending, deps):
+            if isinstance(resources, BaseException):
+                continue
+            for resource in resources:
+                dep_key = self._keys.get(id(resource))
+                if dep_key and dep_key != key:
+                    self.edges.setdefault((dep_key, key), set()).add(kind)
+
+        for key, node in self.nodes.items():
+            parent_key = self._keys.get(id(node['parent']))
+            node['parent'] = parent_key
+            if parent_key and not self.nodes[parent_key]['component']:
+                self.edges.setdefault((parent_key, key), set()).add('parent')
+
+        return expand_components(self.nodes, self.edges)
+
+# Replaces dependencies on and of components with dependencies on and of their custom resources, and drops the
+# components.
+def expand_components(nodes: dict, edges: dict):
+    children = {}
+    for key, node in nodes.items():
+        if node['parent']:
+            children.setdefault(node['parent'], []).append(key)
+
+    def members(key):
+        if not nodes[key]['component']:
+            return [key]
+        return [m for child in children.get(key, []) for m in members(child)]
+
+    custom = {k: n for k, n in nodes.items() if not n['component']}
+    expanded = {}
+    for (dep, key), kinds in edges.items():
+        for dep_member in members(dep):
+            for member in members(key):
+                if dep_member != member:
+                    expanded.setdefault((dep_member, member), set()).update(kinds)
+    return custom, expanded
+
+def load_weights(path: str = None) -> dict:
+    weights = dict(WEIGHTS)
+    if path:
+        with open(path) as f:
+            for typ, value in json.load(f).items():
+                weights[typ] = statistics.median(value) if isinstance(value, list) else value
+    return weights
+
+# Earliest finish time of every resource if each starts as soon as its dependencies are done.
+def schedule(nodes: dict, edges, weights: dict):
+    preds = {key: [] for key in nodes}
+    for dep, key in edges:
+        preds[key].append(dep)
+
+    finish = {}
+    via = {}
+
+    def visit(key):
+        if key not in finish:
+            start = 0
+            for dep in preds[key]:
+                if visit(dep) > start:
+                    start, via[key] = finish[dep], dep
+            finish[key] = start + weights.get(nodes[key]['type'], DEFAULT_WEIGHT)
+        return finish[key]
+
+    for key in nodes:
+        visit(key)
+    return finish, via
+
+def critical_path(nodes: dict, edges, weights: dict):
+    finish, via = schedule(nodes, edges, weights)
+    if not finish:
+        return [], 0
+    key = max(finish, key=finish.get)
+    path = [key]
+    while path[-1] in via:
+        path.append(via[path[-1]])
+    return list(reversed(path)), finish[key]
+
+# Kinds of dependencies that carry something the dependent needs: removing one breaks the program.
+def required(kinds: set) -> bool:
+    return any(kind != 'depends_on' for kind in kinds)
+
+# How much shorter the deployment gets without each dependency on the critical path.
+def removal_savings(nodes: dict, edges: dict, path: list, makespan: float, weights: dict) -> list:
+    savings = []
+    for edge in zip(path, path[1:]):
+        without = [e for e in edges if e != edge]
+        _, shorter = critical_path(nodes, without, weights)
+        savings.append((edge, makespan - shorter))
+    return sorted(savings, key=lambda s: -s[1])
+
+# Explicit dependsOn edges already implied by a longer chain of other dependencies.
+def redundant_depends_on(edges: dict) -> list:
+    succs = {}
+    for dep, key in edges:
+        succs.setdefault(dep, set()).add(key)
+
+    def reachable(start, target, skip):
+        stack, seen = [start], set()
+        while stack:
+            node = stack.pop()
+            for nxt in succs.get(node, ()):
+                if (node, nxt) == skip or nxt in seen:
+                    continue
+                if nxt == target:
+                    return True
+                seen.add(nxt)
+                stack.append(nxt)
+        return False
+
+    return [edge for edge, kinds in edges.items()
+            if kinds == {'depends_on'} and reachable(edge[0], edge[1], edge)]
+
+def edge_entry(nodes: dict, edges: dict, dep: str, key: str, saved: float = None) -> dict:
+    entry = {'from': dep, 'to': key, 'from_label': nodes[dep]['label'], 'to_label': nodes[key]['label'],
+             'kinds': sorted(edges[(dep, key)])}
+    if saved is not None:
+        entry['saves_seconds'] = saved
+    return entry
+
+def report(nodes: dict, edges: dict, weights: dict) -> dict:
+    path, makespan = critical_path(nodes, edges, weights)
+    savings = removal_savings(nodes, edges, path, makespan, weights)
+    serial = sum(weights.get(n['type'], DEFAULT_WEIGHT) for n in nodes.values())
+    return {
+        'resources': len(nodes),
+        'dependencies': len(edges),
+        'critical_seconds': makespan,
+        'serial_seconds': serial,
+        'critical_path': [{'resource': key, 'label': nodes[key]['label'], 'type': nodes[key]['type'],
+                           'seconds': weights.get(nodes[key]['type'], DEFAULT_WEIGHT)} for key in path],
+        'removable': [edge_entry(nodes, edges, dep, key, saved)
+                      for (dep, key), saved in savings if not required(edges[(dep, key)])],
+        'required': [edge_entry(nodes, edges, dep, key, saved)
+                     for (dep, key), saved in savings if required(edges[(dep, key)])],
+        'redundant_depends_on': [edge_entry(nodes, edges, dep, key) for dep, key in redundant_depends_on(edges)],
+    }
+
+def print_report(result: dict):
+    print(f'{result["resources"]} resources, {result["dependencies"]} dependencies')
+    print(f'critical path {result["critical_seconds"]:.0f}s (one after another: {result["serial_seconds"]:.0f}s)')
+    print()
+    elapsed = 0
+    for step in result['critical_path']:
+        elapsed += step['seconds']
+        print(f'{elapsed:>8.0f}s  +{step["seconds"]:<6g} {step["label"]}  ({step["type"]})')
+
+    print()
+    print('dependsOn edges on the critical path, by time saved if removed:')
+    if not result['removable']:
+        print('          none')
+    for edge in result['removable']:
+        print(f'{edge["saves_seconds"]:>8.0f}s  {edge["from_label"]} -> {edge["to_label"]}')
+
+    print()
+    print('Required dependencies on the critical path (they carry data), by time saved if restructured away:')
+    for edge in result['required']:
+        print(f'{edge["saves_seconds"]:>8.0f}s  {edge["from_label"]} -> {edge["to_label"]}  '
+              f'({", ".join(edge["kinds"])})')
+
+    if result['redundant_depends_on']:
+        print()
+        print('dependsOn edges already implied by other dependencies:')
+        for edge in result['redundant_depends_on']:
+            print(f'          {edge["from_label"]} -> {edge["to_label"]}')
+
+def write_dot(path: str, nodes: dict, edges: dict, critical: list):
+    on_path = set(zip(critical, critical[1:]))
+    with open(path, 'w') as f:
+        f.write('digraph resources {\n  rankdir=LR;\n  node [shape=box];\n')
+        for key in nodes:
+            style = ', color=red' if key in critical else ''
+            f.write(f'  "{key}" [label="{nodes[key]["label"]}\\n{nodes[key]["type"]}"{style}];\n')
+        for (dep, key), kinds in edges.items():
+            style = ', color=red' if (dep, key) in on_path else ''
+            f.write(f'  "{dep}" -> "{key}" [label="{", ".join(sorted(kinds))}"{style}];\n')
+        f.write('}\n')
+
+def main():
+    parser = argparse.ArgumentParser(description='Critical path of a workshop program\'s resource dependencies.')
+    parser.add_argument('program', help='path to the program, e.g. 3_component-resources/__main__.py')
+    parser.add_argument('--project-dir', help='directory the program runs in (default: the program\'s directory)')
+    parser.add_argument('--config', help='JSON object of extra config values for the program')
+    parser.add_argument('--weights', help='JSON file mapping resource type to seconds or to a list of durations')
+    parser.add_argument('--json', help='write the report to this file')
+    parser.add_argument('--dot', help='write the graph in Graphviz format to this file')
+    args = parser.parse_args()
+
+    capture = Capture()
+    result = run_program(args.program,
+                         project_dir=args.project_dir,
+                         config=json.loads(args.config) if args.config else None,
+                         before_run=capture.install)
+    if result['status'] != 'ok':
+        print(f'error: {result["error"]}', file=sys.stderr)
+        sys.stdout.flush()
+        os._exit(1)
+
+    nodes, edges = capture.graph(asyncio.get_event_loop())
+    weights = load_weights(args.weights)
+    analysis = report(nodes, edges, weights)
+    print_report(analysis)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(analysis, f, indent=2)
+    if args.dot:
+        write_dot(args.dot, nodes, edges, [step['resource'] for step in analysis['critical_path']])
+
+    sys.stdout.flush()
+    # Skip interpreter teardown; Pulumi's background threads can hold it up.
+    os._exit(0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+# Where does the time of a `pulumi up` go? Times every resource step from the engine's events.
+#
+# The engine reports a "resource pre" event when it starts a step on a resource (create, update, replace, ...) and a
+# "resource outputs" (or "resource operation failed") event when the step is done. The time between the two is the
+# step's duration. Events come from either:
+# - a stack run through the Automation API (see runners.py), recorded as they arrive:
+#     python -m tools.events --record 4_stack-references/base_cluster --stack dev
+# - an event log saved by the CLI (`pulumi up --event-log events.json`), whose timestamps are whole seconds:
+#     python -m tools.events --event-log events.json --label base_cluster/dev
+#
+# The run's steps are shown as a Gantt-style timeline and added to a history file (--history), one entry per run.
+# Per resource type, the durations across every recorded run are summarized as percentiles, and the wall-clock time
+# of the latest runs of the same label shows the trend. --export-weights writes the recorded create durations per
+# type in the format critical_path.py --weights takes.
+
+import argparse
+import datetime
+import json
+import os
+import statistics
+import sys
+import time
+
+from tools.runners import AutomationRunner, StackSpec
+from tools.stats import percentile
+
+DEFAULT_HISTORY = 'event-history.json'
+# Steps that don't touch the cloud; they are left out of the timeline and statistics.
+NO_OP_STEPS = ('same', 'read', 'refresh', 'discard')
+# The stack resource spans the whole run.
+STACK_TYPE = 'pulumi:pulumi:Stack'
+
+# Reads a CLI event log: one JSON event per line.
+def read_event_log(path: str) -> list:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+# An Automation API EngineEvent in the event log's JSON form. The timestamp is when it arrived, to sub-second precision.
+def event_dict(event) -> dict:
+    for key, field in (('resourcePreEvent', 'resource_pre_event'),
+                       ('resOutputsEvent', 'res_outputs_event'),
+                       ('resOpFailedEvent', 'res_op_failed_event')):
+        step = getattr(event, field)
+        if step is not None:
+            metadata = step.metadata
+            op = getattr(metadata.op, 'value', metadata.op)
+            return {'sequence': event.sequence, 'timestamp': time.time(),
+                    key: {'metadata': {'op': op, 'urn': metadata.urn, 'type': metadata.type}}}
+    return None
+
+# Pairs each step's start and end events. Returns steps with urn, name, type, op, start and end (seconds since the
+# first step started) and seconds, in start order.
+def steps(events: list) -> list:
+    started = {}
+    done = []
+    for event in events:
+        for key in ('resourcePreEvent', 'resOutputsEvent', 'resOpFailedEvent'):
+            if key in event:
+                break
+        else:
+            continue
+        metadata = event[key]['metadata']
+        if metadata['op'] in NO_OP_STEPS or metadata['type'] == STACK_TYPE:
+            continue
+        step_key = (metadata['urn'], metadata['op'])
+        if key == 'resourcePreEvent':
+            started[step_key] = event['timestamp']
+        elif step_key in started:
+            done.append({
+                'urn': metadata['urn'],
+                'name': metadata['urn'].split('::')[-1],
+                'type': metadata['type'],
+                'op': metadata['op'],
+                'failed': key == 'resOpFailedEvent',
+                'start': started.pop(step_key),
+                'end': event['timestamp'],
+            })
+    if not done:
+        return []
+    origin = min(s['start'] for s in done)
+    for s in done:
+        s['start'] = round(s['start'] - origin, 3)
+        s['end'] = round(s['end'] - origin, 3)
+        s['seconds'] = round(s['end'] - s['start'], 3)
+    return sorted(done, key=lambda s: (s['start'], s['end']))
+
+def run_entry(label: str, source: str, run_steps: list) -> dict:
+    return {
+        'label': label,
+        'source': source,
+        'recorded_at': datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'wall_seconds': max((s['end'] for s in run_steps), default=0),
+        'steps': run_steps,
+    }
+
+def load_history(path: str) -> list:
+    try:
+        with open(path) as f:
+            return json.load(f)['runs']
+    except FileNotFoundError:
+        return []
+
+def save_history(path: str, runs: list):
+    with open(path, 'w') as f:
+        json.dump({'runs': runs}, f, indent=2)
+
+# Per (type, op): the durations across the runs, summarized.
+def type_stats(runs: list) -> list:
+    durations = {}
+    for run in runs:
+        for s in run['steps']:
+            if not s['failed']:
+                durations.setdefault((s['type'], s['op']), []).append(s['seconds'])
+    return [{
+        'type': t, 'op': op, 'count': len(d),
+        'p50': percentile(d, 50), 'p90': percentile(d, 90), 'p99': percentile(d, 99), 'max': max(d),
+    } for (t, op), d in sorted(durations.items(), key=lambda i: -statistics.median(i[1]))]
+
+# Create durations per type, for critical_path.py --weights.
+def weights(runs: list) -> dict:
+    durations = {}
+    for run in runs:
+        for s in run['steps']:
+            if s['op'] == 'create' and not s['failed']:
+                durations.setdefault(s['type'], []).append(s['seconds'])
+    return dict(sorted(durations.items()))
+
+def print_gantt(run: dict, width: int = 60):
+    run_steps = run['steps']
+    wall = run['wall_seconds'] or 1
+    label_width = min(40, max(len(s['name']) for s in run_steps))
+    print(f'{run["label"]}: {len(run_steps)} steps in {run["wall_seconds"]:.1f}s')
+    for s in run_steps:
+        begin = int(s['start'] / wall * width)
+        length = max(1, int(s['end'] / wall * width) - begin)
+        bar = ' ' * begin + ('x' if s['failed'] else '#') * length
+        print(f'{s["name"][:label_width]:<{label_width}} |{bar:<{width}}| {s["seconds"]:>7.1f}s {s["op"]}')
+    print()
+
+def print_stats(stats: list, runs: int):
+    print(f'Step durations across {runs} run(s):')
+    print(f'{"type":<60} {"op":<8} {"count":>5} {"p50":>7} {"p90":>7} {"p99":>7} {"max":>7}')
+    for s in stats:
+        print(f'{s["type"]:<60} {s["op"]:<8} {s["count"]:>5} {s["p50"]:>7.1f} {s["p90"]:>7.1f} {s["p99"]:>7.1f} '
+              f'{s["max"]:>7.1f}')
+    print()
+
+def print_trend(runs: list, label: str, last: int = 10):
+    same = [r for r in runs if r['label'] == label][-last:]
+    if len(same) < 2:
+        return
+    print(f'Last {len(same)} runs of {label}:')
+    for r in same:
+        slowest = max(r['steps'], key=lambda s: s['seconds'], default=None)
+        print(f'  {r["recorded_at"]}  {r["wall_seconds"]:>8.1f}s  {len(r["steps"]):>4} steps'
+              + (f'  slowest: {slowest["name"]} {slowest["seconds"]:.1f}s' if slowest else ''))
+    print()
+
+def record(args) -> tuple:
+    spec = StackSpec(name=f'{os.path.basename(os.path.normpath(args.record))}-{args.stack}',
+                     project_dir=args.record,
+                     stack=args.stack,
+                     program=args.program)
+    events = []
+
+    def on_event(event):
+        e = event_dict(event)
+        if e is not None:
+            events.append(e)
+
+    operation = 'preview' if args.preview else 'up'
+    result = AutomationRunner(args.state_dir).run_sync(spec, operation, json.loads(args.config) if args.config else {},
+                                                       on_output=print, on_event=on_event)
+    if result['status'] != 'ok':
+        print(f'{spec.name} {operation} failed: {result["error"]}', file=sys.stderr)
+    return spec.name, f'automation:{operation}', events
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the resource steps of a stack update from its engine events.')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--record', metavar='PROJECT_DIR', help='run an update of this project and record its events')
+    source.add_argument('--event-log', help='read the events from a `pulumi up --event-log` file')
+    parser.add_argument('--stack', default='dev', help='stack to update with --record')
+    parser.add_argument('--program', help='program to run instead of the project\'s __main__.py, with --record')
+    parser.add_argument('--config', help='JSON object of config values, with --record')
+    parser.add_argument('--preview', action='store_true', help='record a preview instead of an update')
+    parser.add_argument('--state-dir', default='.pulumi-state', help='local state backend, with --record')
+    parser.add_argument('--label', help='name of the run in the history (default: the project and stack)')
+    parser.add_argument('--history', default=DEFAULT_HISTORY, help='history file the run is added to')
+    parser.add_argument('--no-save', action='store_true', help='don\'t add the run to the history')
+    parser.add_argument('--width', type=int, default=60, help='width of the timeline')
+    parser.add_argument('--export-weights', help='write the create durations per type for critical_path.py --weights')
+    parser.add_argument('--json', help='write the run and the statistics to this file')
+    args = parser.parse_args()
+
+    if args.record:
+        label, source_name, events = record(args)
+    else:
+        label, source_name, events = os.path.basename(args.event_log), 'event-log', read_event_log(args.event_log)
+    run = run_entry(args.label or label, source_name, steps(events))
+    if not run['steps']:
+        sys.exit('no resource steps in the events')
+
+    runs = load_history(args.history) + [run]
+    if not args.no_save:
+        save_history(args.history, runs)
+
+    print_gantt(run, args.width)
+    stats = type_stats(runs)
+    print_stats(stats, len(runs))
+    print_trend(runs, run['label'])
+
+    if args.export_weights:
+        with open(args.export_weights, 'w') as f:
+            json.dump(weights(runs), f, indent=2)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'run': run, 'types': stats}, f, indent=2)
+
+if __name__ == '__main__':
+    main()
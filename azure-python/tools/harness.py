@@ -0,0 +1,274 @@
+# Runs a workshop program offline under Pulumi mocks (pulumi.runtime.set_mocks) and measures it.
+#
+# No engine, cloud or cluster is involved: resource registrations and provider function calls ("invokes") are
+# answered by HarnessMocks with just enough fake state for the programs to run to completion.
+#
+# A program can only be run once per process (Pulumi's runtime state and the programs' own modules are global),
+# so run_isolated() runs each program in a fresh Python process:
+#   python -m tools.harness '{"program": "4_stack-references/base_cluster/__main__.py"}'
+
+import asyncio
+import base64
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import resource
+import runpy
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from pulumi.runtime import Mocks, MockCallArgs, MockResourceArgs, set_mocks
+from pulumi.runtime.stack import wait_for_rpcs
+
+# Config values that let every exercise and solution run. Keys are prefixed with the program's project name unless
+# they name another namespace (e.g. 'azure-native:location').
+DEFAULT_CONFIG = {
+    'base_name': 'bench',
+    'password': 'Bench-Passw0rd!',
+    'base_cluster_stack': 'organization/stack_references_base_cluster/bench',
+}
+
+# Charts the programs fetch through app/chart_cache.py. A stand-in archive is put in a private chart cache so the
+# programs run offline; the rendered objects come from HarnessMocks anyway.
+CHARTS = [
+    ('apache', '8.3.2', 'https://charts.bitnami.com/bitnami'),
+    ('ingress-nginx', '4.12.1', 'https://kubernetes.github.io/ingress-nginx'),
+    ('ingress-nginx', '3.23.0', 'https://kubernetes.github.io/ingress-nginx'),
+]
+# Names of the LoadBalancer Services of charts that don't name theirs after the release, by chart.
+SERVICE_NAMES = {
+    'ingress-nginx': '{release}-controller',
+}
+
+FAKE_KUBECONFIG = 'apiVersion: v1\nkind: Config\nclusters: []\ncontexts: []\nusers: []\n'
+
+class HarnessMocks(Mocks):
+    # template_seconds stands in for the time "helm template" takes to render a chart, and creds_seconds for the ARM
+    # round-trip of fetching a cluster's credentials, which the mocks otherwise answer instantly.
+    # capture lists resource types whose registrations (name and inputs) are kept, for tests to inspect.
+    # The mocks answer invokes on the threads the SDK calls them from, so they count how many of each token are in
+    # flight at once: more than one means the program doesn't wait for one invoke before starting the next.
+    def __init__(self, chart_objects: int = 2, template_seconds: float = 0, creds_seconds: float = 0,
+                 capture: list = None):
+        self.chart_objects = chart_objects
+        self.template_seconds = template_seconds
+        self.creds_seconds = creds_seconds
+        self.capture = set(capture or [])
+        self.captured = {}
+        self.resources = Counter()
+        self.invokes = Counter()
+        self.in_flight = Counter()
+        self.peak_in_flight = Counter()
+        self.lock = threading.Lock()
+        # Registrations per type and name. Two resources of a type with the same name and the same type of parent
+        # get the same URN, which the engine rejects and the mocks don't.
+        self.names = Counter()
+        # Size of the registered resources' inputs and outputs as JSON, roughly what they add to the stack's state.
+        self.state_bytes = 0
+
+    def new_resource(self, args: MockResourceArgs):
+        self.resources[args.typ] += 1
+        self.names[(args.typ, args.name)] += 1
+        if args.typ in self.capture:
+            self.captured.setdefault(args.typ, []).append({'name': args.name, 'inputs': args.inputs})
+        outputs = self._outputs(args)
+        self.state_bytes += len(json.dumps({'type': args.typ, 'name': args.name, 'inputs': args.inputs,
+                                            'outputs': outputs}, default=str))
+        return f'{args.name}-id', outputs
+
+    def _outputs(self, args: MockResourceArgs) -> dict:
+        outputs = dict(args.inputs)
+        outputs.setdefault('name', args.name)
+
+        if args.typ == 'pulumi:pulumi:StackReference':
+            # A base_cluster stack, which may be a pool of clusters.
+            outputs['outputs'] = {'kubeconfig': FAKE_KUBECONFIG,
+                                  'k8sVersion': '1.18.14',
+                                  'clusters': ['k8sfleet-0'],
+                                  'kubeconfigs': {'k8sfleet-0': FAKE_KUBECONFIG}}
+        elif args.typ == 'pulumi-python:dynamic:Resource' and 'clusters' in args.inputs:
+            # A ClusterClaim (app/cluster_claim.py) gets the pool's first cluster.
+            outputs['cluster'] = args.inputs['clusters'][0]
+        elif args.typ == 'kubernetes:helm.sh/v3:Release':
+            outputs['status'] = {'name': args.inputs.get('name') or args.name, 'namespace': 'default'}
+        elif args.typ == 'kubernetes:core/v1:Service':
+            outputs['status'] = {'loadBalancer': {'ingress': [{'ip': '10.0.0.1'}]}}
+        return outputs
+
+    def call(self, args: MockCallArgs):
+        with self.lock:
+            self.invokes[args.token] += 1
+            self.in_flight[args.token] += 1
+            self.peak_in_flight[args.token] = max(self.peak_in_flight[args.token], self.in_flight[args.token])
+        try:
+            return self._answer(args)
+        finally:
+            with self.lock:
+                self.in_flight[args.token] -= 1
+
+    def _answer(self, args: MockCallArgs):
+        if args.token == 'azure-native:containerservice:listManagedClusterUserCredentials':
+            time.sleep(self.creds_seconds)
+            return {'kubeconfigs': [{'name': 'clusterUser', 'value': base64.b64encode(FAKE_KUBECONFIG.encode()).decode()}]}
+        if args.token == 'azure-native:authorization:getClientConfig':
+            return {'clientId': 'bench-client', 'objectId': 'bench-object', 'subscriptionId': 'bench-subscription',
+                    'tenantId': 'bench-tenant'}
+        if args.token == 'kubernetes:helm:template':
+            time.sleep(self.template_seconds)
+            return {'result': self._chart_objects(json.loads(args.args['jsonOpts']))}
+        return {}
+
+    # The chart's LoadBalancer Service and Deployment, plus ConfigMaps up to the requested object count, in the
+    # release's namespace. Like the apache chart, the Deployment mounts the "vhostsConfigMap" value's ConfigMap.
+    def _chart_objects(self, opts: dict) -> list:
+        release = opts.get('release_name') or 'release'
+        chart = os.path.basename(opts.get('path') or '')
+        namespace = {'namespace': opts['namespace']} if opts.get('namespace') else {}
+        objects = [{'apiVersion': 'v1', 'kind': 'Service',
+                    'metadata': {'name': SERVICE_NAMES.get(chart, '{release}').format(release=release), **namespace},
+                    'spec': {'type': 'LoadBalancer', 'ports': [{'port': 80}]}}]
+        if self.chart_objects > 1:
+            vhosts = (opts.get('values') or {}).get('vhostsConfigMap')
+            volumes = [{'name': 'vhosts', 'configMap': {'name': vhosts}}] if vhosts else []
+            objects.append({'apiVersion': 'apps/v1', 'kind': 'Deployment',
+                            'metadata': {'name': release, **namespace},
+                            'spec': {'template': {'spec': {
+                                'containers': [{'name': chart or 'app', 'image': chart or 'app',
+                                                'volumeMounts': [{'name': v['name'], 'mountPath': '/vhosts'}
+                                                                 for v in volumes]}],
+                                'volumes': volumes}}}})
+        for i in range(2, self.chart_objects):
+            objects.append({'apiVersion': 'v1', 'kind': 'ConfigMap',
+                            'metadata': {'name': f'{release}-{i}', **namespace},
+                            'data': {'index': str(i)}})
+        return objects
+
+def project_name(project_dir: str) -> str:
+    # Solutions live below their project, so look for the nearest Pulumi.yaml upwards.
+    d = os.path.abspath(project_dir)
+    while True:
+        path = os.path.join(d, 'Pulumi.yaml')
+        if os.path.exists(path):
+            with open(path) as f:
+                match = re.search(r'^name:\s*(\S+)', f.read(), re.MULTILINE)
+            return match.group(1) if match else 'project'
+        if os.path.dirname(d) == d:
+            return 'project'
+        d = os.path.dirname(d)
+
+def seed_chart_cache(cache_dir: str):
+    os.makedirs(os.path.join(cache_dir, 'blobs'), exist_ok=True)
+    index = {}
+    for chart, version, repo in CHARTS:
+        buf = io.BytesIO()
+        # No timestamp in the gzip header, so the digest is the same on every run and cached manifests stay valid.
+        with gzip.GzipFile(fileobj=buf, mode='wb', mtime=0) as gz, tarfile.open(fileobj=gz, mode='w') as tar:
+            chart_yaml = f'apiVersion: v2\nname: {chart}\nversion: {version}\n'.encode()
+            info = tarfile.TarInfo(f'{chart}/Chart.yaml')
+            info.size = len(chart_yaml)
+            tar.addfile(info, io.BytesIO(chart_yaml))
+        data = buf.getvalue()
+        digest = hashlib.sha256(data).hexdigest()
+        with open(os.path.join(cache_dir, 'blobs', f'{digest}.tgz'), 'wb') as f:
+            f.write(data)
+        index[f'{repo.rstrip("/")}/{chart}:{version}'] = digest
+    with open(os.path.join(cache_dir, 'index.json'), 'w') as f:
+        json.dump(index, f)
+
+# Runs the program in this process and returns its measurements. Call at most once per process.
+# The programs' caches start empty unless cache_dir names a directory kept from an earlier run.
+def run_program(program: str,
+                project_dir: str = None,
+                config: dict = None,
+                preview: bool = False,
+                chart_objects: int = 2,
+                template_seconds: float = 0,
+                creds_seconds: float = 0,
+                capture: list = None,
+                stack: str = 'bench',
+                cache_dir: str = None,
+                before_run=None) -> dict:
+
+    program = os.path.abspath(program)
+    project_dir = os.path.abspath(project_dir or os.path.dirname(program))
+    project = project_name(project_dir)
+
+    os.environ['PULUMI_CONFIG'] = json.dumps({(k if ':' in k else f'{project}:{k}'): v if isinstance(v, str) else json.dumps(v)
+                                              for k, v in {**DEFAULT_CONFIG, **(config or {})}.items()})
+    # Keep the programs' caches out of the working tree.
+    keep_cache = cache_dir is not None
+    cache_dir = cache_dir or tempfile.mkdtemp(prefix='harness-cache-')
+    os.environ['CHART_CACHE_DIR'] = os.path.join(cache_dir, 'charts')
+    os.environ['MANIFEST_CACHE_DIR'] = os.path.join(cache_dir, 'manifests')
+    os.environ['CREDS_CACHE_DIR'] = os.path.join(cache_dir, 'creds')
+    seed_chart_cache(os.environ['CHART_CACHE_DIR'])
+
+    os.chdir(project_dir)
+    sys.path.insert(0, project_dir)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    mocks = HarnessMocks(chart_objects=chart_objects, template_seconds=template_seconds,
+                         creds_seconds=creds_seconds, capture=capture)
+    set_mocks(mocks, project=project, stack=stack, preview=preview)
+    if before_run is not None:
+        before_run()
+
+    error = None
+    start = time.perf_counter()
+    try:
+        runpy.run_path(program, run_name='__main__')
+        loop.run_until_complete(wait_for_rpcs())
+    except BaseException as e:
+        error = f'{type(e).__name__}: {e}'
+    elapsed = time.perf_counter() - start
+    if not keep_cache:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    return {
+        'program': program,
+        'status': 'error' if error else 'ok',
+        'error': error,
+        'seconds': round(elapsed, 4),
+        # ru_maxrss is in KiB on Linux.
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'resources': sum(mocks.resources.values()),
+        'invokes': sum(mocks.invokes.values()),
+        'state_kb': round(mocks.state_bytes / 1024, 1),
+        'resources_by_type': dict(mocks.resources),
+        'duplicate_names': sorted(f'{typ}::{name}' for (typ, name), n in mocks.names.items() if n > 1),
+        'captured': mocks.captured,
+        'invokes_by_token': dict(mocks.invokes),
+        # Most invokes of each token in flight at the same time.
+        'peak_invokes_by_token': dict(mocks.peak_in_flight),
+    }
+
+# Runs the program in a fresh Python process. spec holds run_program()'s keyword arguments.
+def run_isolated(spec: dict, timeout: int = 600) -> dict:
+    tools_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.run([sys.executable, '-m', 'tools.harness', json.dumps(spec)],
+                          cwd=tools_parent, capture_output=True, text=True, timeout=timeout)
+    # The result is the last line of output; anything before it is the program's own output.
+    lines = proc.stdout.strip().splitlines()
+    try:
+        return json.loads(lines[-1])
+    except (IndexError, ValueError):
+        return {'program': spec.get('program'), 'status': 'error',
+                'error': (proc.stderr.strip().splitlines() or ['no output'])[-1]}
+
+if __name__ == '__main__':
+    spec = json.loads(sys.argv[1])
+    result = run_program(**spec)
+    print(json.dumps(result))
+    sys.stdout.flush()
+    # Skip interpreter teardown; Pulumi's background threads can hold it up.
+    os._exit(0)
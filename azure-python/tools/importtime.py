@@ -0,0 +1,131 @@
+# Import-time benchmark for every workshop program (see bench.py for the list).
+#
+# Each program is run under Pulumi mocks in a fresh Python process with "-X importtime", and the modules imported
+# once the program starts (i.e. not the Pulumi SDK the language host loads anyway) are summed up per package.
+# Modules imported lazily while the program runs are included. Run from the azure-python directory:
+#   python -m tools.importtime
+#   python -m tools.importtime --only 4_ --detail 10 --json importtime.json
+#   python -m tools.importtime --compare importtime.json
+#
+# Python caches compiled modules, so the first run after an install or an edit is slower; use --repeat to take the
+# median of several runs.
+
+import argparse
+import json
+import subprocess
+import sys
+
+from tools.bench import PROGRAMS
+from tools.runners import ROOT
+
+MARKER = '--- program start ---'
+
+# Parses "-X importtime" output that follows MARKER. Returns (module, depth, self us, cumulative us) tuples.
+def parse(stderr: str) -> list:
+    entries = []
+    started = False
+    for line in stderr.splitlines():
+        if line == MARKER:
+            started = True
+            continue
+        if not started or not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        # Nested imports are indented by two spaces per level.
+        depth = (len(module) - len(module.lstrip(' ')) - 1) // 2
+        entries.append((module.strip(), depth, int(self_us), int(cumulative_us)))
+    return entries
+
+def measure(program: str, project_dir: str, config: dict = None) -> dict:
+    spec = {'program': program, 'project_dir': project_dir, 'config': config or {}}
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-m', 'tools.importtime', '--child', json.dumps(spec)],
+                          cwd=ROOT, capture_output=True, text=True, timeout=600)
+    lines = proc.stdout.strip().splitlines()
+    try:
+        result = json.loads(lines[-1])
+    except (IndexError, ValueError):
+        return {'status': 'error', 'error': ([l for l in proc.stderr.splitlines()
+                                               if not l.startswith('import time:')] or ['no output'])[-1]}
+
+    entries = parse(proc.stderr)
+    packages = {}
+    for module, _, self_us, _ in entries:
+        package = module.split('.')[0]
+        packages[package] = packages.get(package, 0) + self_us
+    return {
+        'status': result['status'],
+        'error': result['error'],
+        'import_ms': round(sum(e[2] for e in entries) / 1000, 1),
+        'modules': len(entries),
+        'packages_ms': {p: round(us / 1000, 1) for p, us in sorted(packages.items(), key=lambda p: -p[1])},
+        # Imports made directly by the program (and lazily at run time), slowest first.
+        'top_level_ms': {m: round(cum / 1000, 1) for m, depth, _, cum in sorted(entries, key=lambda e: -e[3])
+                         if depth == 0},
+    }
+
+HEADER = f'{"program":<20} {"status":<6} {"import ms":>9} {"modules":>7}  slowest packages'
+
+def print_row(label: str, result: dict, baseline: dict = None, detail: int = 0):
+    if result['status'] != 'ok':
+        print(f'{label:<20} {"error":<6} {result["error"]}')
+        return
+    slowest = ', '.join(f'{p} {ms:.0f}' for p, ms in list(result['packages_ms'].items())[:3])
+    row = f'{label:<20} {"ok":<6} {result["import_ms"]:>9.1f} {result["modules"]:>7}  {slowest}'
+    if baseline and baseline.get('status') == 'ok':
+        row += f'   ({result["import_ms"] - baseline["import_ms"]:+.1f} ms)'
+    print(row, flush=True)
+    for module, ms in list(result['top_level_ms'].items())[:detail]:
+        print(f'{"":<28} {ms:>9.1f}  {module}')
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the import time of the workshop programs.')
+    parser.add_argument('--only', nargs='*', help='only run programs whose label or path contains one of these')
+    parser.add_argument('--repeat', type=int, default=1, help='runs per program; the median import time is reported')
+    parser.add_argument('--config', help='JSON object of extra config values for the programs')
+    parser.add_argument('--detail', type=int, default=0, help='show this many of the slowest top-level imports')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--compare', help='show the change against results saved with --json')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child(json.loads(args.child))
+
+    baselines = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baselines = {r['label']: r for r in json.load(f)}
+
+    print(HEADER)
+    results = []
+    for label, program, project_dir in PROGRAMS:
+        if args.only and not any(o in label or o in program for o in args.only):
+            continue
+        runs = [measure(program, project_dir, json.loads(args.config) if args.config else None)
+                for _ in range(args.repeat)]
+        ok = sorted((r for r in runs if r['status'] == 'ok'), key=lambda r: r['import_ms'])
+        # The median run, or the last error.
+        result = ok[len(ok) // 2] if ok else runs[-1]
+        result['label'] = label
+        results.append(result)
+        print_row(label, result, baselines.get(label), args.detail)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+# Runs in the "-X importtime" process: everything imported after the marker is the program's.
+def child(spec: dict):
+    import os
+    from tools.harness import run_program
+
+    print(MARKER, file=sys.stderr, flush=True)
+    result = run_program(**spec)
+    print(json.dumps(result))
+    sys.stdout.flush()
+    sys.stderr.flush()
+    # Skip interpreter teardown; Pulumi's background threads can hold it up.
+    os._exit(0)
+
+if __name__ == '__main__':
+    main()
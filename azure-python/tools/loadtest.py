@@ -0,0 +1,277 @@
+# Load-tests a deployed app, e.g. the Apache_URL a 3_component-resources or 4_stack-references app stack exports.
+#
+# --concurrency workers each keep one HTTP/1.1 keep-alive connection and send requests back to back for --duration
+# seconds. Each request's path is drawn from the request mix, e.g. "--mix /=8 /icons/apache_pb.png=2" sends 80% of the
+# requests to / and 20% to the image. Requests in the first --warmup seconds are sent but not counted.
+#
+# The report has the throughput and p50/p95/p99 latency overall and per path, and the errors (failed requests and
+# responses with status 400 or more). It is printed and written to <report-dir>/report.json and report.txt.
+#
+# The target is a URL, a stack output (looked up through the Automation API, see runners.py), or with --local a
+# local HTTP server stand-in, to try the tool out offline. Run from the azure-python directory:
+#   python -m tools.loadtest --local --duration 5
+#   python -m tools.loadtest --url http://20.1.2.3 --concurrency 32 --duration 60
+#   python -m tools.loadtest --project-dir 4_stack-references/app --stack team-a --concurrency 32
+#
+# The client is plain asyncio, so the tool needs no HTTP library. One client process tops out at a few thousand
+# requests per second; run several to load a large deployment.
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import ssl
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from tools.stats import percentile
+
+USER_AGENT = 'workshop-loadtest'
+
+# Statuses whose responses never have a body (RFC 9110, section 6.4.1).
+BODYLESS_STATUSES = (204, 304)
+
+class Connection:
+    def __init__(self, url: str, timeout: float, method: str = 'GET'):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.ssl = ssl.create_default_context() if parts.scheme == 'https' else None
+        self.host_header = parts.netloc
+        self.timeout = timeout
+        self.method = method
+        self.reader = None
+        self.writer = None
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    # Sends a request (GET, or the connection's method) and reads the response. Returns the status and body size.
+    async def get(self, path: str) -> tuple:
+        return await asyncio.wait_for(self._get(path), self.timeout)
+
+    async def _get(self, path: str) -> tuple:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl)
+        self.writer.write(f'{self.method} {path} HTTP/1.1\r\nHost: {self.host_header}\r\n'
+                          f'User-Agent: {USER_AGENT}\r\nAccept: */*\r\n\r\n'.encode())
+        await self.writer.drain()
+
+        # Interim (1xx) responses come before the final one and have no body.
+        version, status, headers = await self._read_head()
+        while 100 <= status < 200:
+            version, status, headers = await self._read_head()
+        connection = headers.get('connection', '').lower()
+        closing = connection == 'close' or (version == 'HTTP/1.0' and connection != 'keep-alive')
+
+        if self.method == 'HEAD' or status in BODYLESS_STATUSES:
+            size = 0
+        elif 'content-length' in headers:
+            size = len(await self.reader.readexactly(int(headers['content-length'])))
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            size = 0
+            while True:
+                chunk = int((await self.reader.readline()).split(b';')[0], 16)
+                await self.reader.readexactly(chunk + 2)
+                size += chunk
+                if chunk == 0:
+                    break
+        elif closing:
+            # The body ends when the server closes the connection.
+            size = len(await self.reader.read())
+        else:
+            # Neither a length nor a closing connection: there is no body.
+            size = 0
+        if closing:
+            self.close()
+        return status, size
+
+    # Reads a status line and the headers. Returns the HTTP version, the status and the headers by lowercase name.
+    async def _read_head(self) -> tuple:
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError('connection closed by the server')
+        version, status = status_line.split()[:2]
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, _, value = line.decode('latin-1').partition(':')
+            headers[key.strip().lower()] = value.strip()
+        return version.decode('latin-1'), int(status), headers
+
+# Parses "--mix /=8 /other=2" into paths and weights.
+def parse_mix(mix: list) -> tuple:
+    paths, weights = [], []
+    for entry in mix:
+        path, _, weight = entry.partition('=')
+        paths.append(path if path.startswith('/') else '/' + path)
+        weights.append(float(weight or 1))
+    return paths, weights
+
+async def worker(url: str, paths: list, weights: list, start: float, deadline: float, timeout: float,
+                 samples: list, seed: int, method: str = 'GET'):
+    chooser = random.Random(seed)
+    connection = Connection(url, timeout, method)
+    base_path = urlsplit(url).path.rstrip('/')
+    while time.perf_counter() < deadline:
+        path = chooser.choices(paths, weights)[0]
+        sent = time.perf_counter()
+        try:
+            status, size = await connection.get(base_path + path)
+            error = f'HTTP {status}' if status >= 400 else None
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, IndexError) as e:
+            connection.close()
+            status, size, error = None, 0, type(e).__name__
+        samples.append({'path': path, 'sent': sent - start, 'seconds': time.perf_counter() - sent,
+                        'status': status, 'bytes': size, 'error': error})
+    connection.close()
+
+async def load(url: str, paths: list, weights: list, concurrency: int, duration: float, warmup: float,
+               timeout: float, method: str = 'GET') -> list:
+    samples = []
+    start = time.perf_counter()
+    deadline = start + warmup + duration
+    await asyncio.gather(*(worker(url, paths, weights, start, deadline, timeout, samples, seed, method)
+                           for seed in range(concurrency)))
+    return [s for s in samples if s['sent'] >= warmup]
+
+def summarize(samples: list, duration: float) -> dict:
+    ok = [s['seconds'] * 1000 for s in samples if s['error'] is None]
+    errors = {}
+    for s in samples:
+        if s['error'] is not None:
+            errors[s['error']] = errors.get(s['error'], 0) + 1
+    return {
+        'requests': len(samples),
+        'errors': sum(errors.values()),
+        'error_kinds': errors,
+        'rps': round(len(ok) / duration, 1),
+        'mb_per_second': round(sum(s['bytes'] for s in samples) / duration / 1e6, 3),
+        'p50_ms': round(percentile(ok, 50), 2) if ok else None,
+        'p95_ms': round(percentile(ok, 95), 2) if ok else None,
+        'p99_ms': round(percentile(ok, 99), 2) if ok else None,
+        'max_ms': round(max(ok), 2) if ok else None,
+    }
+
+# Runs a load test and returns its report.
+def load_test(url: str, mix: list = ('/',), concurrency: int = 16, duration: float = 30, warmup: float = 2,
+              timeout: float = 10, method: str = 'GET') -> dict:
+    paths, weights = parse_mix(mix)
+    options = {'concurrency': concurrency, 'duration': duration, 'warmup': warmup, 'mix': dict(zip(paths, weights)),
+               'method': method}
+    return report(url, asyncio.run(load(url, paths, weights, concurrency, duration, warmup, timeout, method)),
+                  options)
+
+def report(url: str, samples: list, options: dict) -> dict:
+    return {
+        'url': url,
+        'options': options,
+        'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'total': summarize(samples, options['duration']),
+        'paths': {path: summarize([s for s in samples if s['path'] == path], options['duration'])
+                  for path in sorted({s['path'] for s in samples})},
+    }
+
+def write_report(report_dir: str, result: dict):
+    def row(label, s):
+        if s['p50_ms'] is None:
+            return f'{label:<30} {s["requests"]:>9} {s["errors"]:>7} {s["rps"]:>9.1f}'
+        return (f'{label:<30} {s["requests"]:>9} {s["errors"]:>7} {s["rps"]:>9.1f} {s["p50_ms"]:>8.1f} '
+                f'{s["p95_ms"]:>8.1f} {s["p99_ms"]:>8.1f} {s["max_ms"]:>8.1f}')
+
+    options = result['options']
+    lines = [f'{result["url"]}: {options["concurrency"]} connections for {options["duration"]:g}s',
+             f'{"path":<30} {"requests":>9} {"errors":>7} {"req/s":>9} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} '
+             f'{"max ms":>8}']
+    lines += [row(path, s) for path, s in result['paths'].items()]
+    lines.append(row('total', result['total']))
+    if result['total']['error_kinds']:
+        lines.append('errors: ' + ', '.join(f'{k} {v}' for k, v in sorted(result['total']['error_kinds'].items())))
+
+    os.makedirs(report_dir, exist_ok=True)
+    with open(os.path.join(report_dir, 'report.json'), 'w') as f:
+        json.dump(result, f, indent=2)
+    with open(os.path.join(report_dir, 'report.txt'), 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    print('\n'.join(lines))
+
+# A stand-in for apache: answers every GET and HEAD with a small page after --local-delay milliseconds; /missing
+# with a 404 and /empty with a 204 without a body.
+def local_server(delay_ms: float) -> str:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # The headers and body are written separately; don't let Nagle's algorithm hold back the body.
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            time.sleep(delay_ms / 1000)
+            if self.path == '/empty':
+                self.send_response(204)
+                self.end_headers()
+                return
+            body = b'<html><body><h1>It works!</h1></body></html>\n'
+            self.send_response(200 if self.path != '/missing' else 404)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            if self.command != 'HEAD':
+                self.wfile.write(body)
+
+        do_HEAD = do_GET
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_address[1]}'
+
+def stack_url(project_dir: str, stack: str, output: str, state_dir: str) -> str:
+    from tools.runners import AutomationRunner, StackSpec
+
+    outputs = AutomationRunner(state_dir).outputs(StackSpec(name=f'{os.path.basename(project_dir)}-{stack}',
+                                                            project_dir=project_dir, stack=stack))
+    if output not in outputs:
+        sys.exit(f'stack {stack} has no {output} output; outputs: {", ".join(outputs) or "none"}')
+    return outputs[output]
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test a deployed workshop app.')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help='URL to load, e.g. the Apache_URL stack output')
+    target.add_argument('--stack', help='stack whose output to load (with --project-dir)')
+    target.add_argument('--local', action='store_true', help='load a local HTTP server stand-in')
+    parser.add_argument('--project-dir', default='4_stack-references/app', help='project of --stack')
+    parser.add_argument('--output', default='Apache_URL', help='stack output with the URL, with --stack')
+    parser.add_argument('--state-dir', default='.pulumi-state', help='local state backend, with --stack')
+    parser.add_argument('--local-delay', type=float, default=2, help='response time of the --local server in ms')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent connections')
+    parser.add_argument('--duration', type=float, default=30, help='seconds to measure')
+    parser.add_argument('--warmup', type=float, default=2, help='seconds to send requests before measuring')
+    parser.add_argument('--timeout', type=float, default=10, help='request timeout in seconds')
+    parser.add_argument('--method', choices=('GET', 'HEAD'), default='GET', help='request method')
+    parser.add_argument('--mix', nargs='+', default=['/'], help='request mix as path=weight, e.g. /=8 /missing=2')
+    parser.add_argument('--report-dir', default='loadtest-report', help='where the report is written')
+    args = parser.parse_args()
+
+    if args.local:
+        url = local_server(args.local_delay)
+    elif args.stack:
+        url = stack_url(args.project_dir, args.stack, args.output, args.state_dir)
+    else:
+        url = args.url
+    result = load_test(url, args.mix, args.concurrency, args.duration, args.warmup, args.timeout, args.method)
+    write_report(args.report_dir, result)
+    sys.exit(0 if result['total']['requests'] and not result['total']['errors'] else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+# Runs the stack-references stacks (base_cluster and one or more app stacks) in dependency order.
+#
+# A stack that references another stack's outputs waits for that stack; stacks that don't depend on each other
+# (e.g. several app stacks on one base cluster) run concurrently. Each line of output is prefixed with its stack's
+# name. Destroys run in the reverse order: a stack is destroyed after the stacks that reference it.
+#
+# Stacks run through the Automation API against a local file backend (--state-dir), or under Pulumi mocks with
+# --mock to try out a plan offline (see runners.py). Run from the azure-python directory:
+#   python -m tools.orchestrate --mock --apps 3
+#   python -m tools.orchestrate --plan plan.json --parallel 4
+#   python -m tools.orchestrate --plan plan.json --destroy
+#
+# A plan is a JSON list of stacks (see StackSpec in runners.py), e.g.:
+#   [{"name": "base", "project_dir": "4_stack-references/base_cluster", "stack": "dev",
+#     "config": {"nodeCount": 2, "password": {"secret": "..."}}},
+#    {"name": "app-a", "project_dir": "4_stack-references/app", "stack": "team-a",
+#     "program": "4_stack-references/solutions/exercise_1-app__main__.py",
+#     "references": {"base_cluster_stack": "base"}}]
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+from tools.runners import AutomationRunner, MockRunner, StackSpec
+
+def default_plan(apps: int) -> list:
+    base = StackSpec(name='base', project_dir='4_stack-references/base_cluster', stack='dev')
+    return [base] + [StackSpec(
+        name=f'app-{i}',
+        project_dir='4_stack-references/app',
+        stack=f'app-{i}',
+        # The app project's own program is the exercise; run its solution.
+        program='4_stack-references/solutions/exercise_1-app__main__.py',
+        references={'base_cluster_stack': base.name}) for i in range(1, apps + 1)]
+
+def load_plan(path: str) -> list:
+    with open(path) as f:
+        return [StackSpec.from_dict(d) for d in json.load(f)]
+
+# Stack name -> names of the stacks it waits for. Raises ValueError for unknown references and cycles.
+def dependencies(specs: list, operation: str) -> dict:
+    by_name = {spec.name: spec for spec in specs}
+    if len(by_name) != len(specs):
+        raise ValueError('stack names in the plan must be unique')
+
+    deps = {spec.name: set() for spec in specs}
+    for spec in specs:
+        for ref in spec.references.values():
+            if ref not in by_name:
+                raise ValueError(f"stack '{spec.name}' references unknown stack '{ref}'")
+            if operation == 'destroy':
+                deps[ref].add(spec.name)
+            else:
+                deps[spec.name].add(ref)
+
+    visiting, done = set(), set()
+
+    def check(name):
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError(f"stack references form a cycle through '{name}'")
+        visiting.add(name)
+        for dep in deps[name]:
+            check(dep)
+        visiting.discard(name)
+        done.add(name)
+
+    for name in deps:
+        check(name)
+    return deps
+
+def log(name: str, line: str):
+    print(f'[{name}] {line}', flush=True)
+
+async def orchestrate(specs: list, runner, operation: str = 'up', parallel: int = 0) -> list:
+    deps = dependencies(specs, operation)
+    by_name = {spec.name: spec for spec in specs}
+    limit = asyncio.Semaphore(parallel or len(specs))
+    tasks = {}
+
+    async def run(spec: StackSpec) -> dict:
+        if deps[spec.name]:
+            log(spec.name, f'waiting for {", ".join(sorted(deps[spec.name]))}')
+            results = await asyncio.gather(*(tasks[dep] for dep in deps[spec.name]))
+            failed = [r['name'] for r in results if r['status'] != 'ok']
+            if failed:
+                log(spec.name, f'skipped, {", ".join(failed)} failed')
+                return {'name': spec.name, 'stack': spec.qualified_name, 'operation': operation, 'status': 'skipped',
+                        'error': f'{", ".join(failed)} failed', 'seconds': 0, 'changes': {}}
+
+        config = dict(spec.config)
+        for key, ref in spec.references.items():
+            config[key] = by_name[ref].qualified_name
+
+        async with limit:
+            log(spec.name, f'{operation} {spec.qualified_name}')
+            result = await runner.run(spec, operation, config, lambda line: log(spec.name, line))
+        log(spec.name, f'{result["status"]} in {result["seconds"]:.1f}s' +
+            (f': {result["error"]}' if result['error'] else ''))
+        return result
+
+    for spec in specs:
+        tasks[spec.name] = asyncio.ensure_future(run(spec))
+    return list(await asyncio.gather(*tasks.values()))
+
+def print_summary(results: list):
+    print()
+    print(f'{"stack":<50} {"status":<8} {"seconds":>8}  changes')
+    for r in results:
+        changes = ', '.join(f'{k} {v}' for k, v in r['changes'].items())
+        print(f'{r["stack"]:<50} {r["status"]:<8} {r["seconds"]:>8.1f}  {changes}')
+
+# Load-tests the Apache_URL of every updated stack that exports one, writing a report per stack (see loadtest.py).
+def load_test_stacks(specs: list, results: list, runner: AutomationRunner, duration: float, report_dir: str):
+    from tools import loadtest
+
+    for spec, result in zip(specs, results):
+        if result['status'] != 'ok':
+            continue
+        url = runner.outputs(spec).get('Apache_URL')
+        if url is None:
+            continue
+        print()
+        report = loadtest.load_test(url, duration=duration)
+        loadtest.write_report(os.path.join(report_dir, spec.name), report)
+        result['load_test'] = report['total']
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the base_cluster and app stacks in dependency order.')
+    parser.add_argument('--plan', help='JSON file listing the stacks (default: one base_cluster stack and --apps apps)')
+    parser.add_argument('--apps', type=int, default=1, help='number of app stacks in the default plan')
+    parser.add_argument('--preview', action='store_true', help='preview instead of update')
+    parser.add_argument('--destroy', action='store_true', help='destroy the stacks, dependents first')
+    parser.add_argument('--parallel', type=int, default=0, help='most stacks to run at once (default: no limit)')
+    parser.add_argument('--mock', action='store_true', help='run the programs under Pulumi mocks instead of deploying')
+    parser.add_argument('--state-dir', default='.pulumi-state', help='local state backend and stack work directories')
+    parser.add_argument('--load-test', type=float, metavar='SECONDS',
+                        help='after an update, load-test each stack\'s Apache_URL for this many seconds')
+    parser.add_argument('--load-test-dir', default='loadtest-report', help='where the load test reports are written')
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    operation = 'destroy' if args.destroy else 'preview' if args.preview else 'up'
+    specs = load_plan(args.plan) if args.plan else default_plan(args.apps)
+    runner = MockRunner() if args.mock else AutomationRunner(args.state_dir)
+
+    try:
+        results = asyncio.run(orchestrate(specs, runner, operation, args.parallel))
+    except ValueError as e:
+        sys.exit(f'error: {e}')
+    print_summary(results)
+    if args.load_test and operation == 'up' and not args.mock:
+        load_test_stacks(specs, results, runner, args.load_test, args.load_test_dir)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    sys.exit(0 if all(r['status'] == 'ok' for r in results) else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+# Provisions many stacks of one program at once, e.g. one per workshop attendee or team.
+#
+# Stacks are created from a template (project, program and config) and updated in a pool of worker processes,
+# at most --parallel at a time. Azure Resource Manager throttles subscriptions that send too many requests
+# (HTTP 429, "SubscriptionRequestsThrottled", ...); a stack that fails that way is retried with exponential backoff,
+# honouring the Retry-After the error asks for.
+#
+# Every stack's output goes to <report-dir>/logs/<stack>.log. The per-stack results, retries and timings go to
+# <report-dir>/report.json and report.txt.
+#
+# Stacks run through the Automation API against a local file backend (see runners.py), or under Pulumi mocks with
+# --mock. --mock-throttle makes the mocks answer a share of the runs with a throttling error, to try out the backoff.
+# Run from the azure-python directory:
+#   python -m tools.provision --count 30 --mock --mock-throttle 0.3
+#   python -m tools.provision --names team-red team-blue --template template.json --parallel 8
+#
+# A template is a JSON object with "project_dir", optionally "program", and "config". In config strings, {stack} and
+# {index} are replaced with the stack's name and number, and {password} with a password generated for the stack.
+# Use {"secret": "..."} for secret values. The default template deploys 2_stack-advanced-topics exercise 4:
+#   {"project_dir": "2_stack-advanced-topics/solutions/exercise-4",
+#    "config": {"password": {"secret": "{password}"}}}
+
+import argparse
+import json
+import os
+import random
+import re
+import secrets
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from tools.runners import AutomationRunner, MockRunner, StackSpec
+
+DEFAULT_TEMPLATE = {
+    'project_dir': '2_stack-advanced-topics/solutions/exercise-4',
+    'config': {'password': {'secret': '{password}'}},
+}
+
+# Error text ARM (and the providers reporting its errors) use when a subscription is throttled.
+THROTTLING = re.compile(r'\b429\b|TooManyRequests|SubscriptionRequestsThrottled|RequestsThrottled|throttl', re.IGNORECASE)
+RETRY_AFTER = re.compile(r'Retry-After\D{0,5}(\d+)', re.IGNORECASE)
+
+# Replaces the placeholders only, so that other braces in the values (e.g. JSON) are kept as they are.
+def expand(value, values: dict):
+    if isinstance(value, str):
+        for key, replacement in values.items():
+            value = value.replace(f'{{{key}}}', str(replacement))
+        return value
+    if isinstance(value, dict):
+        return {k: expand(v, values) for k, v in value.items()}
+    if isinstance(value, list):
+        return [expand(v, values) for v in value]
+    return value
+
+def stack_specs(template: dict, names: list) -> list:
+    specs = []
+    for index, name in enumerate(names, start=1):
+        values = {'stack': name, 'index': index, 'password': secrets.token_urlsafe(16) + '-Aa1'}
+        specs.append(StackSpec(name=name,
+                               project_dir=template['project_dir'],
+                               stack=name,
+                               program=template.get('program'),
+                               config=expand(template.get('config') or {}, values)))
+    return specs
+
+def backoff(attempt: int, error: str, base: float, cap: float) -> float:
+    retry_after = RETRY_AFTER.search(error or '')
+    if retry_after:
+        return min(cap, float(retry_after.group(1)))
+    # "Full jitter": spread the retries of stacks throttled at the same time.
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+# Runs one stack in a worker process, retrying while it is throttled.
+def provision(spec: StackSpec, options: dict) -> dict:
+    runner = MockRunner() if options['mock'] else AutomationRunner(options['state_dir'])
+    log_path = os.path.join(options['report_dir'], 'logs', f'{spec.name}.log')
+    start = time.perf_counter()
+    waited = 0.0
+
+    with open(log_path, 'w') as log:
+        def on_output(line):
+            log.write(line + '\n')
+            log.flush()
+
+        for attempt in range(1, options['retries'] + 2):
+            on_output(f'--- attempt {attempt}')
+            result = _mock_throttled(spec, attempt, options['mock_throttle'])
+            if result is None:
+                result = runner.run_sync(spec, options['operation'], spec.config, on_output)
+            if result['status'] == 'ok' or not THROTTLING.search(result['error'] or ''):
+                break
+            if attempt > options['retries']:
+                break
+            delay = backoff(attempt, result['error'], options['backoff'], options['backoff_cap'])
+            on_output(f'--- throttled, retrying in {delay:.1f}s: {result["error"]}')
+            time.sleep(delay)
+            waited += delay
+
+    result.update({
+        'attempts': attempt,
+        'throttle_wait_seconds': round(waited, 2),
+        'seconds': round(time.perf_counter() - start, 2),
+        'log': log_path,
+    })
+    return result
+
+# The mocks stand-in for ARM throttling: fail this share of attempts the way ARM does.
+def _mock_throttled(spec: StackSpec, attempt: int, rate: float) -> dict:
+    if not rate or random.Random(f'{spec.name}:{attempt}').random() >= rate:
+        return None
+    return {'name': spec.name, 'stack': spec.qualified_name, 'status': 'error', 'seconds': 0, 'changes': {},
+            'error': 'azure-native:resources:ResourceGroup: Status=429 Code="SubscriptionRequestsThrottled" '
+                     'Message="Number of requests for subscription exceeded the limit." Retry-After: 1'}
+
+def write_report(report_dir: str, results: list, wall_seconds: float, parallel: int):
+    total = sum(r['seconds'] for r in results)
+    summary = {
+        'stacks': len(results),
+        'succeeded': sum(r['status'] == 'ok' for r in results),
+        'failed': sum(r['status'] != 'ok' for r in results),
+        'retries': sum(r['attempts'] - 1 for r in results),
+        'wall_seconds': round(wall_seconds, 2),
+        'stack_seconds': round(total, 2),
+        'throttle_wait_seconds': round(sum(r['throttle_wait_seconds'] for r in results), 2),
+        'parallel': parallel,
+    }
+    with open(os.path.join(report_dir, 'report.json'), 'w') as f:
+        json.dump({'summary': summary, 'stacks': results}, f, indent=2)
+
+    lines = [f'{"stack":<30} {"status":<6} {"attempts":>8} {"seconds":>8} {"waited":>8}  changes / error']
+    for r in sorted(results, key=lambda r: r['name']):
+        detail = r['error'] or ', '.join(f'{k} {v}' for k, v in r['changes'].items())
+        lines.append(f'{r["name"]:<30} {r["status"]:<6} {r["attempts"]:>8} {r["seconds"]:>8.1f} '
+                     f'{r["throttle_wait_seconds"]:>8.1f}  {detail}')
+    lines.append('')
+    lines.append(f'{summary["succeeded"]}/{summary["stacks"]} stacks ok, {summary["retries"]} retries, '
+                 f'{summary["wall_seconds"]:.1f}s wall clock for {summary["stack_seconds"]:.1f}s of stack time '
+                 f'({parallel} at a time)')
+    with open(os.path.join(report_dir, 'report.txt'), 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    print('\n'.join(lines))
+
+def main():
+    parser = argparse.ArgumentParser(description='Provision many stacks of a workshop program in parallel.')
+    names = parser.add_mutually_exclusive_group(required=True)
+    names.add_argument('--count', type=int, help='number of stacks, named <prefix>-01, <prefix>-02, ...')
+    names.add_argument('--names', nargs='+', help='stack names')
+    parser.add_argument('--prefix', default='team', help='stack name prefix for --count')
+    parser.add_argument('--template', help='JSON template file (default: 2_stack-advanced-topics exercise 4)')
+    parser.add_argument('--parallel', type=int, default=4, help='most stacks to run at once')
+    parser.add_argument('--retries', type=int, default=5, help='retries of a throttled stack')
+    parser.add_argument('--backoff', type=float, default=10, help='base backoff in seconds, doubled on every retry')
+    parser.add_argument('--backoff-cap', type=float, default=300, help='longest wait between retries in seconds')
+    parser.add_argument('--preview', action='store_true', help='preview instead of update')
+    parser.add_argument('--destroy', action='store_true', help='destroy the stacks')
+    parser.add_argument('--mock', action='store_true', help='run the programs under Pulumi mocks instead of deploying')
+    parser.add_argument('--mock-throttle', type=float, default=0, help='share of mock runs to fail with throttling')
+    parser.add_argument('--state-dir', default='.pulumi-state', help='local state backend and stack work directories')
+    parser.add_argument('--report-dir', default='provision-report', help='where the report and logs are written')
+    args = parser.parse_args()
+
+    template = DEFAULT_TEMPLATE
+    if args.template:
+        with open(args.template) as f:
+            template = json.load(f)
+    width = len(str(args.count or 0))
+    stack_names = args.names or [f'{args.prefix}-{i:0{max(2, width)}d}' for i in range(1, args.count + 1)]
+    specs = stack_specs(template, stack_names)
+
+    os.makedirs(os.path.join(args.report_dir, 'logs'), exist_ok=True)
+    options = {
+        'operation': 'destroy' if args.destroy else 'preview' if args.preview else 'up',
+        'mock': args.mock,
+        'mock_throttle': args.mock_throttle if args.mock else 0,
+        'state_dir': args.state_dir,
+        'report_dir': args.report_dir,
+        'retries': args.retries,
+        'backoff': args.backoff,
+        'backoff_cap': args.backoff_cap,
+    }
+
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.parallel) as pool:
+        futures = {pool.submit(provision, spec, options): spec for spec in specs}
+        for future in as_completed(futures):
+            spec = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {'name': spec.name, 'stack': spec.qualified_name, 'status': 'error', 'changes': {},
+                          'error': f'{type(e).__name__}: {e}', 'attempts': 1, 'seconds': 0,
+                          'throttle_wait_seconds': 0}
+            results.append(result)
+            print(f'[{len(results)}/{len(specs)}] {result["name"]} {result["status"]} in {result["seconds"]:.1f}s'
+                  + (f' after {result["attempts"]} attempts' if result['attempts'] > 1 else ''), flush=True)
+    print()
+    write_report(args.report_dir, results, time.perf_counter() - start, args.parallel)
+    sys.exit(0 if all(r['status'] == 'ok' for r in results) else 1)
+
+if __name__ == '__main__':
+    main()
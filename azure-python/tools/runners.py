@@ -0,0 +1,190 @@
+# Runs one stack of a workshop program, for the orchestrator (orchestrate.py) and other tools that run many stacks.
+#
+# - AutomationRunner runs a real preview, update or destroy through the Pulumi Automation API, against a local file
+#   backend (no Pulumi Cloud account needed). It needs the Pulumi CLI and, for Azure programs, Azure credentials.
+# - MockRunner runs the program under Pulumi mocks in a separate process (see harness.py). Nothing is deployed, so
+#   it works offline, e.g. to try out a plan.
+#
+# Both stream the program's output line by line through on_output and return a result dict with the stack's name,
+# status ('ok' or 'error'), error, seconds and a summary of the changes. run() is for asyncio, run_sync() blocks.
+# AutomationRunner also passes the engine events to on_event (see events.py).
+
+import asyncio
+import json
+import os
+import shutil
+import sys
+import time
+
+from tools.harness import project_name, run_isolated
+
+# Directory that paths in stack specs are relative to (azure-python).
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class StackSpec:
+    def __init__(self,
+                 name: str,
+                 project_dir: str,
+                 stack: str,
+                 # Program to run instead of the project's __main__.py, e.g. a solution.
+                 program: str = None,
+                 # Config values. Use {"secret": "value"} for a secret value.
+                 config: dict = None,
+                 # Config key -> name of another spec whose stack this one references. The key is set to that stack's
+                 # fully qualified name, and this stack waits for it.
+                 references: dict = None):
+
+        self.name = name
+        self.project_dir = project_dir
+        self.stack = stack
+        self.program = program
+        self.config = config or {}
+        self.references = references or {}
+
+    @property
+    def project(self) -> str:
+        return project_name(os.path.join(ROOT, self.project_dir))
+
+    @property
+    def qualified_name(self) -> str:
+        # Stacks in a file backend belong to the built-in "organization".
+        return f'organization/{self.project}/{self.stack}'
+
+    @staticmethod
+    def from_dict(d: dict) -> 'StackSpec':
+        return StackSpec(name=d['name'],
+                         project_dir=d['project_dir'],
+                         stack=d['stack'],
+                         program=d.get('program'),
+                         config=d.get('config'),
+                         references=d.get('references'))
+
+def _result(spec: StackSpec, operation: str, start: float, error: str = None, changes: dict = None) -> dict:
+    return {
+        'name': spec.name,
+        'stack': spec.qualified_name,
+        'operation': operation,
+        'status': 'error' if error else 'ok',
+        'error': error,
+        'seconds': round(time.perf_counter() - start, 2),
+        'changes': changes or {},
+    }
+
+class AutomationRunner:
+    def __init__(self, state_dir: str = '.pulumi-state'):
+        self.state_dir = os.path.abspath(state_dir)
+
+    async def run(self, spec: StackSpec, operation: str, config: dict, on_output) -> dict:
+        # The Automation API blocks while the CLI runs, so run it in a thread and keep the event loop free.
+        return await asyncio.get_running_loop().run_in_executor(None, self.run_sync, spec, operation, config, on_output)
+
+    def run_sync(self, spec: StackSpec, operation: str, config: dict, on_output=None, on_event=None) -> dict:
+        from pulumi import automation as auto
+
+        start = time.perf_counter()
+        try:
+            os.makedirs(os.path.join(self.state_dir, 'backend'), exist_ok=True)
+            stack = auto.create_or_select_stack(spec.stack, work_dir=self._stage(spec),
+                                                opts=self._workspace_options(auto, spec))
+            stack.set_all_config({key: _config_value(auto, value) for key, value in config.items()})
+
+            if operation == 'up':
+                changes = stack.up(on_output=on_output, on_event=on_event).summary.resource_changes
+            elif operation == 'preview':
+                changes = stack.preview(on_output=on_output, on_event=on_event).change_summary
+            else:
+                changes = stack.destroy(on_output=on_output, on_event=on_event).summary.resource_changes
+        except Exception as e:
+            return _result(spec, operation, start, error=f'{type(e).__name__}: {e}')
+        return _result(spec, operation, start, changes={str(k): v for k, v in (changes or {}).items()})
+
+    # The outputs of a deployed stack, e.g. the URL to load-test (see loadtest.py).
+    def outputs(self, spec: StackSpec) -> dict:
+        from pulumi import automation as auto
+
+        stack = auto.select_stack(spec.stack, work_dir=self._stage(spec), opts=self._workspace_options(auto, spec))
+        return {key: output.value for key, output in stack.outputs().items()}
+
+    def _workspace_options(self, auto, spec: StackSpec):
+        return auto.LocalWorkspaceOptions(
+            project_settings=auto.ProjectSettings(name=spec.project, runtime='python'),
+            secrets_provider='passphrase',
+            env_vars={
+                'PULUMI_BACKEND_URL': 'file://' + os.path.join(self.state_dir, 'backend'),
+                'PULUMI_CONFIG_PASSPHRASE': os.environ.get('PULUMI_CONFIG_PASSPHRASE', ''),
+                # Run the program with this interpreter and its packages rather than a per-project virtualenv.
+                'PULUMI_PYTHON_CMD': sys.executable,
+            })
+
+    # The CLI runs the program from its project directory, so give each stack a copy of its project (and the program
+    # to run as __main__.py) instead of touching the workshop folders. Caches in the copy are kept between runs.
+    def _stage(self, spec: StackSpec) -> str:
+        work_dir = os.path.join(self.state_dir, 'work', spec.name)
+        shutil.copytree(os.path.join(ROOT, spec.project_dir), work_dir, dirs_exist_ok=True,
+                        ignore=shutil.ignore_patterns('venv', '.cache', '__pycache__', 'Pulumi.*.yaml'))
+        if spec.program:
+            shutil.copyfile(os.path.join(ROOT, spec.program), os.path.join(work_dir, '__main__.py'))
+        return work_dir
+
+def _config_value(auto, value):
+    if isinstance(value, dict) and set(value) == {'secret'}:
+        return auto.ConfigValue(value=_config_string(value['secret']), secret=True)
+    return auto.ConfigValue(value=_config_string(value))
+
+def _config_string(value) -> str:
+    return value if isinstance(value, str) else json.dumps(value)
+
+class MockRunner:
+    def __init__(self, chart_objects: int = 2):
+        self.chart_objects = chart_objects
+
+    def _harness_spec(self, spec: StackSpec, operation: str, config: dict) -> dict:
+        return {
+            'program': spec.program or os.path.join(spec.project_dir, '__main__.py'),
+            'project_dir': spec.project_dir,
+            'config': {key: value['secret'] if isinstance(value, dict) and set(value) == {'secret'} else value
+                       for key, value in config.items()},
+            'preview': operation == 'preview',
+            'chart_objects': self.chart_objects,
+            'stack': spec.stack,
+        }
+
+    @staticmethod
+    def _measured(spec: StackSpec, operation: str, start: float, measured: dict) -> dict:
+        if measured['status'] != 'ok':
+            return _result(spec, operation, start, error=measured['error'])
+        # Every resource is new to the mocks.
+        return _result(spec, operation, start, changes={'create': measured['resources']})
+
+    async def run(self, spec: StackSpec, operation: str, config: dict, on_output) -> dict:
+        start = time.perf_counter()
+        if operation == 'destroy':
+            # Nothing was deployed.
+            return _result(spec, operation, start)
+
+        harness_spec = self._harness_spec(spec, operation, config)
+        proc = await asyncio.create_subprocess_exec(sys.executable, '-m', 'tools.harness', json.dumps(harness_spec),
+                                                    cwd=ROOT,
+                                                    stdout=asyncio.subprocess.PIPE,
+                                                    stderr=asyncio.subprocess.STDOUT)
+
+        # The harness prints its result as the last line; everything before it is the program's output.
+        last = None
+        async for line in proc.stdout:
+            if last is not None:
+                on_output(last)
+            last = line.decode(errors='replace').rstrip('\n')
+        await proc.wait()
+
+        try:
+            measured = json.loads(last)
+        except (TypeError, ValueError):
+            return _result(spec, operation, start, error=last or f'harness exited with {proc.returncode}')
+        return self._measured(spec, operation, start, measured)
+
+    # The program's output isn't passed to on_output here; only the result is.
+    def run_sync(self, spec: StackSpec, operation: str, config: dict, on_output=None) -> dict:
+        start = time.perf_counter()
+        if operation == 'destroy':
+            return _result(spec, operation, start)
+        return self._measured(spec, operation, start, run_isolated(self._harness_spec(spec, operation, config)))
@@ -0,0 +1,9 @@
+# Summary statistics shared by the tools. Standard library only, so tools that don't run Pulumi programs (e.g.
+# loadtest.py) can use them without the Pulumi SDK installed.
+
+import math
+
+def percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    # Nearest rank: the smallest value with at least p percent of the values at or below it.
+    return values[max(0, math.ceil(p * len(values) / 100) - 1)]